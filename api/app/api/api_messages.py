@@ -1,3 +1,4 @@
+JWT_ERROR_INVALID_FORMAT = "Token subject is not a valid user id"
 JWT_ERROR_USER_REMOVED = "User removed"
 PASSWORD_INVALID = "Incorrect email or password"
 REFRESH_TOKEN_NOT_FOUND = "Refresh token not found"
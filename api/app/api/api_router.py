@@ -1,7 +1,15 @@
 from fastapi import APIRouter
 
 from app.api import api_messages
-from app.api.endpoints import auth, leaderboard, summoners, users
+from app.api.endpoints import (
+    auth,
+    events,
+    leaderboard,
+    matches,
+    metrics,
+    summoners,
+    users,
+)
 
 auth_router = APIRouter()
 auth_router.include_router(auth.router, prefix="/auth", tags=["auth"])
@@ -36,3 +44,6 @@ api_router.include_router(summoners.router, prefix="/summoners", tags=["summoner
 api_router.include_router(
     leaderboard.router, prefix="/leaderboard", tags=["leaderboard"]
 )
+api_router.include_router(matches.router, prefix="/matches", tags=["matches"])
+api_router.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
+api_router.include_router(events.router, prefix="/events", tags=["events"])
@@ -1,16 +1,24 @@
-from collections.abc import AsyncGenerator
+from collections.abc import AsyncIterator, Callable
 from typing import Annotated
 
-from bson import ObjectId
-from fastapi import Depends, HTTPException, status
+from bson import ObjectId, Timestamp
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from motor.motor_asyncio import AsyncIOMotorDatabase
+from motor.motor_asyncio import AsyncIOMotorClientSession, AsyncIOMotorDatabase
 from pulsefire.clients import RiotAPIClient
 
 from app.api import api_messages
-from app.core.database import get_database
-from app.core.riot_client import get_riot_api_client
+from app.core.config import get_settings
+from app.core.database import (
+    ReadRoute,
+    get_database,
+    get_read_client,
+    get_read_database,
+    parse_operation_time,
+)
+from app.core.riot_client import get_shared_riot_client
 from app.core.security.jwt import verify_jwt_token
+from app.core.security.principal_cache import get_principal_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/access-token")
 
@@ -19,9 +27,62 @@ def get_db() -> AsyncIOMotorDatabase:
     return get_database()
 
 
-async def get_riot_client() -> AsyncGenerator[RiotAPIClient, None]:
-    async with get_riot_api_client() as client:
-        yield client
+def _read_db(route: ReadRoute) -> Callable[[], AsyncIOMotorDatabase]:
+    def get_read_db() -> AsyncIOMotorDatabase:
+        return get_read_database(route)
+
+    return get_read_db
+
+
+# Read preference and pool per endpoint class, auth and writes use `get_db`
+get_leaderboard_db = _read_db("leaderboard")
+get_listings_db = _read_db("listings")
+get_history_db = _read_db("history")
+
+
+def get_read_after(
+    x_read_after: Annotated[str | None, Header()] = None,
+) -> Timestamp | None:
+    if x_read_after is None:
+        return None
+    try:
+        return parse_operation_time(x_read_after)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Invalid X-Read-After header",
+        )
+
+
+def _read_session(
+    route: ReadRoute,
+) -> Callable[..., AsyncIterator[AsyncIOMotorClientSession | None]]:
+    async def get_read_session(
+        read_after: Timestamp | None = Depends(get_read_after),
+    ) -> AsyncIterator[AsyncIOMotorClientSession | None]:
+        """
+        Causally consistent session when the client sent `X-Read-After`.
+
+        Reads in it wait until the node has applied the client's own write,
+        even on a lagging secondary.
+        """
+        if read_after is None:
+            yield None
+            return
+
+        client = get_read_client(route)
+        async with await client.start_session(causal_consistency=True) as session:
+            session.advance_operation_time(read_after)
+            yield session
+
+    return get_read_session
+
+
+get_listings_session = _read_session("listings")
+
+
+def get_riot_client() -> RiotAPIClient:
+    return get_shared_riot_client()
 
 
 async def get_current_user(
@@ -38,6 +99,11 @@ async def get_current_user(
             detail=api_messages.JWT_ERROR_INVALID_FORMAT,
         )
 
+    principal_cache = get_principal_cache()
+    user = principal_cache.get(user_id)
+    if user is not None:
+        return user
+
     user = await db.users.find_one({"_id": user_id})
 
     if user is None:
@@ -45,4 +111,17 @@ async def get_current_user(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=api_messages.JWT_ERROR_USER_REMOVED,
         )
+
+    principal_cache.set(user_id, user)
     return user
+
+
+async def get_current_admin_user(
+    current_user: dict = Depends(get_current_user),
+) -> dict:
+    if current_user["email"] != get_settings().security.root_username:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=api_messages.ADMIN_ONLY,
+        )
+    return current_user
@@ -1,4 +1,3 @@
-import secrets
 import time
 from typing import Any
 
@@ -11,10 +10,14 @@ from app.api import api_messages, deps
 from app.core.config import get_settings
 from app.core.security.jwt import create_jwt_token
 from app.core.security.password import (
-    DUMMY_PASSWORD,
+    get_dummy_password_hash,
     get_password_hash,
     verify_password,
 )
+from app.core.security.refresh_token import (
+    create_refresh_token,
+    use_refresh_token,
+)
 from app.schemas.requests import RefreshTokenRequest, UserCreateRequest
 from app.schemas.responses import AccessTokenResponse, UserResponse
 
@@ -72,14 +75,14 @@ async def login_access_token(
 
     if user is None:
         # this is naive method to not return early
-        verify_password(form_data.password, DUMMY_PASSWORD)
+        await verify_password(form_data.password, await get_dummy_password_hash())
 
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=api_messages.PASSWORD_INVALID,
         )
 
-    if not verify_password(form_data.password, user["hashed_password"]):
+    if not await verify_password(form_data.password, user["hashed_password"]):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=api_messages.PASSWORD_INVALID,
@@ -87,20 +90,13 @@ async def login_access_token(
 
     jwt_token = create_jwt_token(user_id=str(user["_id"]))
 
-    refresh_token = {
-        "user_id": user["_id"],
-        "refresh_token": secrets.token_urlsafe(32),
-        "exp": int(time.time() + get_settings().security.refresh_token_expire_secs),
-        "used": False,
-    }
-
-    await db.refresh_tokens.insert_one(refresh_token)
+    refresh_token, refresh_token_exp = await create_refresh_token(db, user["_id"])
 
     return AccessTokenResponse(
         access_token=jwt_token.access_token,
         expires_at=jwt_token.payload.exp,
-        refresh_token=refresh_token["refresh_token"],
-        refresh_token_expires_at=refresh_token["exp"],
+        refresh_token=refresh_token,
+        refresh_token_expires_at=refresh_token_exp,
     )
 
 
@@ -114,31 +110,21 @@ async def refresh_token(
     data: RefreshTokenRequest,
     db: AsyncIOMotorDatabase = Depends(deps.get_db),
 ) -> AccessTokenResponse:
-    # Use findOneAndUpdate to atomically find and mark the token as used
-    token = await db.refresh_tokens.find_one_and_update(
-        {
-            "refresh_token": data.refresh_token,
-            "used": False,
-        },
-        {"$set": {"used": True}},
-        return_document=True,
-    )
+    # Atomically mark the token as used, the previous state tells why it failed
+    token = await use_refresh_token(db, data.refresh_token)
 
     if token is None:
-        # Check if token exists but was already used
-        existing_token = await db.refresh_tokens.find_one(
-            {"refresh_token": data.refresh_token}
-        )
-        if existing_token and existing_token.get("used"):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=api_messages.REFRESH_TOKEN_ALREADY_USED,
-            )
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=api_messages.REFRESH_TOKEN_NOT_FOUND,
         )
 
+    if token["used"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=api_messages.REFRESH_TOKEN_ALREADY_USED,
+        )
+
     if time.time() > token["exp"]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -147,20 +133,15 @@ async def refresh_token(
 
     jwt_token = create_jwt_token(user_id=str(token["user_id"]))
 
-    new_refresh_token = {
-        "user_id": token["user_id"],
-        "refresh_token": secrets.token_urlsafe(32),
-        "exp": int(time.time() + get_settings().security.refresh_token_expire_secs),
-        "used": False,
-    }
-
-    await db.refresh_tokens.insert_one(new_refresh_token)
+    new_refresh_token, new_refresh_token_exp = await create_refresh_token(
+        db, token["user_id"]
+    )
 
     return AccessTokenResponse(
         access_token=jwt_token.access_token,
         expires_at=jwt_token.payload.exp,
-        refresh_token=new_refresh_token["refresh_token"],
-        refresh_token_expires_at=new_refresh_token["exp"],
+        refresh_token=new_refresh_token,
+        refresh_token_expires_at=new_refresh_token_exp,
     )
 
 
@@ -189,7 +170,7 @@ async def register_new_user(
 
     user = {
         "email": new_user.email,
-        "hashed_password": get_password_hash(new_user.password),
+        "hashed_password": await get_password_hash(new_user.password),
     }
 
     try:
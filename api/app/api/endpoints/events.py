@@ -0,0 +1,56 @@
+from collections.abc import AsyncIterator
+
+import orjson
+from fastapi import APIRouter, Header, status
+from fastapi.responses import StreamingResponse
+
+from app.core.config import get_settings
+from app.core.events import get_event_broker
+
+router = APIRouter()
+
+
+async def _server_sent_events(
+    events: AsyncIterator[tuple[str, dict] | None],
+) -> AsyncIterator[bytes]:
+    async for item in events:
+        if item is None:
+            # Comment line, keeps proxies from closing an idle connection
+            yield b": keep-alive\n\n"
+            continue
+
+        event_id, event = item
+        yield (
+            b"id: "
+            + event_id.encode()
+            + b"\nevent: "
+            + event["type"].encode()
+            + b"\ndata: "
+            + orjson.dumps(event)
+            + b"\n\n"
+        )
+
+
+@router.get(
+    "",
+    response_class=StreamingResponse,
+    responses={status.HTTP_200_OK: {"content": {"text/event-stream": {}}}},
+    description=(
+        "Server-sent events for new matches of tracked summoners (`match`), league entry "
+        "changes (`league`) and added or removed summoners (`summoner_added`, "
+        "`summoner_removed`). Reconnect with `Last-Event-ID` or `after` to resume; "
+        "a `reset` event means events were missed and state has to be reloaded"
+    ),
+)
+async def stream_events(
+    after: str | None = None,
+    last_event_id: str | None = Header(default=None),
+) -> StreamingResponse:
+    events = get_event_broker().stream(
+        last_event_id or after, get_settings().events.heartbeat_secs
+    )
+    return StreamingResponse(
+        _server_sent_events(events),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
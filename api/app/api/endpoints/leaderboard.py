@@ -2,20 +2,33 @@ from fastapi import APIRouter, Depends
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 from app.api import deps
+from app.core.leaderboard_snapshots import get_movement
+from app.core.player_matches import PLAYER_MATCHES_COLLECTION
+from app.core.timing import timed
 from app.core.utils import serialize_mongo_doc
 from app.schemas.requests import QueueType
+from app.schemas.responses import SummonerResponse
 
 router = APIRouter()
 
+# Allow-list, summoner documents also carry credentials and bookkeeping fields
+SUMMONER_PROJECTION = {
+    "_id": "$_id",
+    **{field: f"${field}" for field in SummonerResponse.model_fields},
+}
+
 
 @router.get(
     "",
     response_model=list[dict],
-    description="Get a leaderboard of all summoners in the database",
+    description=(
+        "Get a leaderboard of all summoners in the database. "
+        "`movement` compares the latest leaderboard snapshot with the one of a day earlier"
+    ),
 )
 async def get_leaderboard(
     queue_type: QueueType,
-    db: AsyncIOMotorDatabase = Depends(deps.get_db),
+    db: AsyncIOMotorDatabase = Depends(deps.get_leaderboard_db),
 ) -> list[dict]:
     if queue_type == QueueType.SOLO:
         queue_id = 420
@@ -80,87 +93,32 @@ async def get_leaderboard(
                 },
             }
         },
-        {"$sort": {"tierScore": -1, "rankScore": -1, "league.leaguePoints": -1}},
+        {
+            "$sort": {
+                "tierScore": -1,
+                "rankScore": -1,
+                "league.leaguePoints": -1,
+                # Same tie-break as the snapshots, so movement matches positions
+                "_id": 1,
+            }
+        },
         {
             "$project": {
                 "_id": 1,
-                "summoner": {
-                    "$mergeObjects": [
-                        {
-                            "$arrayToObject": {
-                                "$filter": {
-                                    "input": {"$objectToArray": "$$ROOT"},
-                                    "cond": {
-                                        "$and": [
-                                            {"$ne": ["$$this.k", "tierScore"]},
-                                            {"$ne": ["$$this.k", "rankScore"]},
-                                            {"$ne": ["$$this.k", "league"]},
-                                            {"$ne": ["$$this.k", "matches"]},
-                                        ]
-                                    },
-                                }
-                            }
-                        }
-                    ]
-                },
+                "summoner": SUMMONER_PROJECTION,
                 "league": "$league",
             }
         },
         {
             "$lookup": {
-                "from": "matches",
-                "foreignField": "ref_summoners",
-                "localField": "_id",
-                "let": {"summoner_puuid": "$summoner.puuid"},
+                "from": PLAYER_MATCHES_COLLECTION,
+                "localField": "summoner.puuid",
+                "foreignField": "puuid",
+                # Served by player_matches_history_idx
                 "pipeline": [
-                    {"$match": {"info.queueId": queue_id}},
-                    {"$sort": {"info.gameEndTimestamp": -1}},
+                    {"$match": {"queueId": queue_id}},
+                    {"$sort": {"gameEndTimestamp": -1}},
                     {"$limit": 20},
-                    {
-                        "$project": {
-                            "_id": 0,
-                            "metadata.matchId": 1,
-                            "info.gameEndTimestamp": 1,
-                            "info.gameDuration": 1,
-                            "participant": {
-                                "$let": {
-                                    "vars": {
-                                        "participant": {
-                                            "$arrayElemAt": [
-                                                {
-                                                    "$filter": {
-                                                        "input": "$info.participants",
-                                                        "cond": {
-                                                            "$eq": [
-                                                                "$$this.puuid",
-                                                                "$$summoner_puuid",
-                                                            ]
-                                                        },
-                                                    }
-                                                },
-                                                0,
-                                            ]
-                                        }
-                                    },
-                                    "in": {
-                                        "championId": "$$participant.championId",
-                                        "win": "$$participant.win",
-                                        "kills": "$$participant.kills",
-                                        "deaths": "$$participant.deaths",
-                                        "assists": "$$participant.assists",
-                                        "teamPosition": "$$participant.teamPosition",
-                                        "individualPosition": "$$participant.individualPosition",
-                                        "gameEndedInEarlySurrender": "$$participant.gameEndedInEarlySurrender",
-                                        "league": {
-                                            "leaguePoints": "$$participant.league.leaguePoints",
-                                            "tier": "$$participant.league.tier",
-                                            "rank": "$$participant.league.rank",
-                                        },
-                                    },
-                                }
-                            },
-                        }
-                    },
                 ],
                 "as": "matches",
             }
@@ -175,27 +133,31 @@ async def get_leaderboard(
                         "input": "$matches",
                         "as": "match",
                         "in": {
-                            "matchId": "$$match.metadata.matchId",
-                            "gameEndTimestamp": "$$match.info.gameEndTimestamp",
+                            "matchId": "$$match.matchId",
+                            "gameEndTimestamp": "$$match.gameEndTimestamp",
                             "remake": {
                                 "$and": [
-                                    {"$lt": ["$$match.info.gameDuration", "300"]},
+                                    {"$lt": ["$$match.gameDuration", "300"]},
                                     {
                                         "$eq": [
-                                            "$$match.participant.gameEndedInEarlySurrender",
+                                            "$$match.gameEndedInEarlySurrender",
                                             True,
                                         ]
                                     },
                                 ]
                             },
-                            "championId": "$$match.participant.championId",
-                            "win": "$$match.participant.win",
-                            "kills": "$$match.participant.kills",
-                            "deaths": "$$match.participant.deaths",
-                            "assists": "$$match.participant.assists",
-                            "teamPosition": "$$match.participant.teamPosition",
-                            "individualPosition": "$$match.participant.individualPosition",
-                            "league": "$$match.participant.league",
+                            "championId": "$$match.championId",
+                            "win": "$$match.win",
+                            "kills": "$$match.kills",
+                            "deaths": "$$match.deaths",
+                            "assists": "$$match.assists",
+                            "teamPosition": "$$match.teamPosition",
+                            "individualPosition": "$$match.individualPosition",
+                            "league": {
+                                "leaguePoints": "$$match.league.leaguePoints",
+                                "tier": "$$match.league.tier",
+                                "rank": "$$match.league.rank",
+                            },
                         },
                     }
                 },
@@ -204,4 +166,15 @@ async def get_leaderboard(
     ]
 
     result = await db.summoners.aggregate(pipeline).to_list(length=None)
-    return serialize_mongo_doc(result)
+
+    # Precomputed by the snapshotter, see `app.core.leaderboard_snapshots`
+    movement = await get_movement(db, queue_type.value)
+    for entry in result:
+        summoner_movement = movement and movement["summoners"].get(str(entry["_id"]))
+        entry["movement"] = (
+            {"since": movement["since"], **summoner_movement}
+            if summoner_movement
+            else None
+        )
+    with timed("serialize"):
+        return serialize_mongo_doc(result)
@@ -0,0 +1,72 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.api import deps
+from app.core.export import (
+    DEFAULT_COLUMNS,
+    ExportOptions,
+    build_query,
+    iter_row_batches,
+    parquet_available,
+    stream_ndjson,
+    stream_parquet,
+    user_watermark,
+)
+from app.schemas.requests import ExportFormat, MatchExportQuery
+
+router = APIRouter()
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={
+        status.HTTP_200_OK: {
+            "content": {
+                "application/x-ndjson": {},
+                "application/vnd.apache.parquet": {},
+            }
+        },
+        status.HTTP_501_NOT_IMPLEMENTED: {"description": "Parquet is not available"},
+    },
+    description=(
+        "Stream matches flattened to one row per participant. "
+        "With `watermark` only matches stored since your last export of that name are returned"
+    ),
+)
+async def export_matches(
+    params: Annotated[MatchExportQuery, Query()],
+    db: AsyncIOMotorDatabase = Depends(deps.get_history_db),
+    primary_db: AsyncIOMotorDatabase = Depends(deps.get_db),
+    current_user: dict = Depends(deps.get_current_user),
+) -> StreamingResponse:
+    if params.format == ExportFormat.PARQUET and not parquet_available():
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Parquet export requires the optional pyarrow package",
+        )
+
+    options = ExportOptions(
+        columns=params.columns.split(",") if params.columns else DEFAULT_COLUMNS,
+        query=build_query(start=params.start, end=params.end, queues=params.queues),
+        tracked_only=params.tracked_only,
+        watermark=user_watermark(current_user["_id"], params.watermark)
+        if params.watermark is not None
+        else None,
+    )
+    batches = iter_row_batches(
+        # A lagging secondary could move a watermark past matches it lacks
+        primary_db if params.watermark is not None else db,
+        options,
+    )
+
+    if params.format == ExportFormat.PARQUET:
+        return StreamingResponse(
+            stream_parquet(batches, options.columns),
+            media_type="application/vnd.apache.parquet",
+            headers={"Content-Disposition": 'attachment; filename="matches.parquet"'},
+        )
+    return StreamingResponse(stream_ndjson(batches), media_type="application/x-ndjson")
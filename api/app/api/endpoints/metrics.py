@@ -0,0 +1,100 @@
+from bson import ObjectId
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.api import deps
+from app.core.freshness import get_lag_percentiles, get_stalest_summoners
+from app.core.profiling import REQUEST_PROFILES_COLLECTION
+from app.core.rate_limit import get_rate_limit_stats
+from app.core.security.password import get_password_hasher_stats
+from app.schemas.requests import Platform
+from app.schemas.responses import FreshnessResponse, RequestProfileResponse
+
+router = APIRouter()
+
+
+@router.get(
+    "",
+    response_model=dict,
+    description="Get internal runtime metrics of this worker (admin only)",
+)
+async def get_metrics(
+    current_user: dict = Depends(deps.get_current_admin_user),
+) -> dict:
+    return {
+        "password_hasher": get_password_hasher_stats(),
+        "rate_limit": get_rate_limit_stats(),
+    }
+
+
+@router.get(
+    "/freshness",
+    response_model=FreshnessResponse,
+    description=(
+        "Get match ingestion lag percentiles over the last hour, day and week, "
+        "overall and per platform, and the summoners checked least recently (admin only)"
+    ),
+)
+async def get_freshness(
+    stalest: int = Query(20, ge=1, le=500),
+    platform: Platform | None = None,
+    current_user: dict = Depends(deps.get_current_admin_user),
+    db: AsyncIOMotorDatabase = Depends(deps.get_db),
+) -> FreshnessResponse:
+    platform = platform.value if platform else None
+    return FreshnessResponse(
+        lag=await get_lag_percentiles(db, platform),
+        stalest_summoners=await get_stalest_summoners(db, stalest, platform),
+    )
+
+
+@router.get(
+    "/profiles",
+    response_model=list[RequestProfileResponse],
+    description=(
+        "List the latest request profiles, taken for requests of the root user "
+        "sent with an `X-Profile: 1` header (admin only)"
+    ),
+)
+async def list_request_profiles(
+    limit: int = Query(20, ge=1, le=200),
+    current_user: dict = Depends(deps.get_current_admin_user),
+    db: AsyncIOMotorDatabase = Depends(deps.get_db),
+) -> list[RequestProfileResponse]:
+    profiles = (
+        await db[REQUEST_PROFILES_COLLECTION]
+        .find({}, {"folded": 0})
+        .sort("$natural", -1)
+        .limit(limit)
+        .to_list(length=None)
+    )
+    return [
+        RequestProfileResponse(profile_id=str(profile.pop("_id")), **profile)
+        for profile in profiles
+    ]
+
+
+@router.get(
+    "/profiles/{profile_id}",
+    response_class=PlainTextResponse,
+    description=(
+        "Get a request profile as folded stacks, "
+        "open it with speedscope or flamegraph.pl (admin only)"
+    ),
+)
+async def get_request_profile(
+    profile_id: str,
+    current_user: dict = Depends(deps.get_current_admin_user),
+    db: AsyncIOMotorDatabase = Depends(deps.get_db),
+) -> PlainTextResponse:
+    profile = None
+    if ObjectId.is_valid(profile_id):
+        profile = await db[REQUEST_PROFILES_COLLECTION].find_one(
+            {"_id": ObjectId(profile_id)}, {"folded": 1}
+        )
+    if profile is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found"
+        )
+    return PlainTextResponse(profile["folded"])
@@ -1,31 +1,75 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from motor.motor_asyncio import AsyncIOMotorDatabase
+import csv
+import io
+import re
+from collections import Counter
+
+import orjson
+from bson import ObjectId
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+    status,
+)
+from motor.motor_asyncio import AsyncIOMotorClientSession, AsyncIOMotorDatabase
 from pulsefire.clients import RiotAPIClient
+from pydantic import ValidationError
 
 from app.api import deps
-from app.schemas.requests import AddSummonerRequest
-from app.schemas.responses import SummonerResponse
+from app.core.config import get_settings
+from app.core.database import (
+    READ_AFTER_HEADER,
+    causal_write_session,
+    format_operation_time,
+)
+from app.core.events import (
+    publish_event,
+    summoner_added_event,
+    summoner_removed_event,
+)
+from app.core.riot_client import fetch_new_summoner
+from app.core.roster import (
+    SUMMONER_RESPONSE_PROJECTION,
+    bump_roster_version,
+    get_roster_version,
+    riot_id_key,
+)
+from app.core.timing import timed
+from app.jobs.summoner_deletion import (
+    SUMMONER_DELETION_JOBS_COLLECTION,
+    create_summoner_deletion_job,
+)
+from app.jobs.summoner_import import (
+    SUMMONER_IMPORT_JOBS_COLLECTION,
+    create_summoner_import_job,
+)
+from app.schemas.requests import (
+    AddSummonerRequest,
+    ImportSummonersRequest,
+    LookupSummonersRequest,
+    Platform,
+)
+from app.schemas.responses import (
+    SummonerDeletionJobResponse,
+    SummonerImportEntryResponse,
+    SummonerImportJobResponse,
+    SummonerResponse,
+)
 
 router = APIRouter()
 
-PLATFORM_TO_REGION = {
-    "br1": "americas",
-    "eun1": "europe",
-    "euw1": "europe",
-    "jp1": "asia",
-    "kr": "asia",
-    "la1": "americas",
-    "la2": "americas",
-    "na1": "americas",
-    "oc1": "sea",
-    "tr1": "europe",
-    "ru": "europe",
-    "ph2": "sea",
-    "sg2": "sea",
-    "th2": "sea",
-    "tw2": "sea",
-    "vn2": "sea",
-}
+
+def _set_read_after(response: Response, session: AsyncIOMotorClientSession) -> None:
+    """Let the client read its own write from a secondary, see `get_read_session`."""
+    # Standalone servers don't report operation times
+    if session.operation_time is not None:
+        response.headers[READ_AFTER_HEADER] = format_operation_time(
+            session.operation_time
+        )
 
 
 @router.post(
@@ -36,6 +80,7 @@ PLATFORM_TO_REGION = {
 )
 async def add_summoner(
     request: AddSummonerRequest,
+    response: Response,
     db: AsyncIOMotorDatabase = Depends(deps.get_db),
     riot_client: RiotAPIClient = Depends(deps.get_riot_client),
     current_user: dict = Depends(deps.get_current_user),
@@ -43,11 +88,10 @@ async def add_summoner(
     # Check if summoner already exists
     existing_summoner = await db.summoners.find_one(
         {
-            "gameName": request.game_name,
-            "tagLine": request.tag_line,
+            "riot_id_key": riot_id_key(request.game_name, request.tag_line),
             "platform": request.platform.lower(),
         },
-        collation={"locale": "en", "strength": 2},
+        {"_id": 1},
     )
 
     if existing_summoner:
@@ -57,28 +101,18 @@ async def add_summoner(
         )
 
     try:
-        # Get account info
-        account = await riot_client.get_account_v1_by_riot_id(
-            region=PLATFORM_TO_REGION[request.platform.lower()],
+        new_summoner = await fetch_new_summoner(
+            riot_client,
             game_name=request.game_name,
             tag_line=request.tag_line,
+            platform=request.platform.lower(),
         )
 
-        # Get summoner info
-        summoner = await riot_client.get_lol_summoner_v4_by_puuid(
-            region=request.platform.lower(), puuid=account["puuid"]
-        )
-
-        # Merge account and summoner info
-        new_summoner = {
-            "gameName": account["gameName"],
-            "tagLine": account["tagLine"],
-            "platform": request.platform.lower(),
-            **summoner,
-            "initial_rank_fetched": False,
-        }
-
-        await db.summoners.insert_one(new_summoner)
+        async with causal_write_session() as session:
+            await db.summoners.insert_one(new_summoner, session=session)
+            await bump_roster_version(db, session)
+            _set_read_after(response, session)
+        await publish_event(db, summoner_added_event(new_summoner))
 
         return SummonerResponse(**new_summoner)
 
@@ -86,77 +120,316 @@ async def add_summoner(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
+def _import_job_response(job: dict) -> SummonerImportJobResponse:
+    return SummonerImportJobResponse(
+        job_id=str(job["_id"]),
+        status=job["status"],
+        total=len(job["results"]),
+        counts=Counter(entry["status"] for entry in job["results"]),
+        results=[SummonerImportEntryResponse(**entry) for entry in job["results"]],
+        error=job.get("error"),
+        created_at=job["created_at"],
+        updated_at=job["updated_at"],
+    )
+
+
+def _parse_import_csv(content: str) -> list[AddSummonerRequest]:
+    """
+    Parse `gameName,tagLine,platform` or `gameName#tagLine,platform` rows.
+
+    A header row is skipped when present.
+    """
+    requests = []
+    for line_number, raw_row in enumerate(csv.reader(io.StringIO(content)), start=1):
+        cells = [cell.strip() for cell in raw_row]
+        if not any(cells):
+            continue
+        if line_number == 1 and cells[0].lower() in (
+            "gamename",
+            "game_name",
+            "riot_id",
+        ):
+            continue
+
+        match cells:
+            case [riot_id, platform] if "#" in riot_id:
+                game_name, tag_line = riot_id.rsplit("#", 1)
+            case [game_name, tag_line, platform]:
+                pass
+            case _:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail=f"Line {line_number}: expected gameName,tagLine,platform",
+                )
+
+        try:
+            requests.append(
+                AddSummonerRequest(
+                    game_name=game_name, tag_line=tag_line, platform=platform.lower()
+                )
+            )
+        except ValidationError as e:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Line {line_number}: {e.errors()[0]['msg']}",
+            )
+    return requests
+
+
+async def _start_import(
+    db: AsyncIOMotorDatabase, summoners: list[AddSummonerRequest]
+) -> SummonerImportJobResponse:
+    max_entries = get_settings().jobs.summoner_import_max_entries
+    if not summoners or len(summoners) > max_entries:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"An import must contain between 1 and {max_entries} summoners",
+        )
+
+    job = await create_summoner_import_job(
+        db,
+        [
+            {
+                "game_name": summoner.game_name,
+                "tag_line": summoner.tag_line,
+                "platform": summoner.platform.lower(),
+            }
+            for summoner in summoners
+        ],
+    )
+    return _import_job_response(job)
+
+
+@router.post(
+    "/import",
+    response_model=SummonerImportJobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    description="Import many summoners at once. Riot IDs are resolved in the background",
+)
+async def import_summoners(
+    request: ImportSummonersRequest,
+    db: AsyncIOMotorDatabase = Depends(deps.get_db),
+    current_user: dict = Depends(deps.get_current_user),
+) -> SummonerImportJobResponse:
+    return await _start_import(db, request.summoners)
+
+
+@router.post(
+    "/import/csv",
+    response_model=SummonerImportJobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    description="Import summoners from a CSV file with `gameName,tagLine,platform` or `gameName#tagLine,platform` rows",
+)
+async def import_summoners_csv(
+    file: UploadFile,
+    db: AsyncIOMotorDatabase = Depends(deps.get_db),
+    current_user: dict = Depends(deps.get_current_user),
+) -> SummonerImportJobResponse:
+    content = (await file.read()).decode("utf-8-sig")
+    return await _start_import(db, _parse_import_csv(content))
+
+
+@router.get(
+    "/imports/{job_id}",
+    response_model=SummonerImportJobResponse,
+    responses={status.HTTP_404_NOT_FOUND: {"description": "Import job not found"}},
+    description="Get the per-entry outcome of a summoner import job",
+)
+async def get_summoner_import_job(
+    job_id: str,
+    db: AsyncIOMotorDatabase = Depends(deps.get_db),
+    current_user: dict = Depends(deps.get_current_user),
+) -> SummonerImportJobResponse:
+    job = None
+    if ObjectId.is_valid(job_id):
+        job = await db[SUMMONER_IMPORT_JOBS_COLLECTION].find_one(
+            {"_id": ObjectId(job_id)}
+        )
+
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Import job not found",
+        )
+
+    return _import_job_response(job)
+
+
 @router.get(
     "",
     response_model=list[SummonerResponse],
-    description="Get a list of all tracked summoners",
+    responses={
+        status.HTTP_304_NOT_MODIFIED: {
+            "description": "The roster did not change since the given ETag"
+        }
+    },
+    description=(
+        "Get a page of tracked summoners ordered by insertion. "
+        "The cursor of the next page is returned in the `X-Next-Cursor` header"
+    ),
 )
 async def get_all_summoners(
-    db: AsyncIOMotorDatabase = Depends(deps.get_db),
-) -> list[SummonerResponse]:
-    summoners = await db.summoners.find().to_list(length=None)
-    return [SummonerResponse(**summoner) for summoner in summoners]
+    request: Request,
+    after: str | None = None,
+    limit: int = Query(default=100, ge=1, le=1000),
+    db: AsyncIOMotorDatabase = Depends(deps.get_listings_db),
+    session: AsyncIOMotorClientSession | None = Depends(deps.get_listings_session),
+) -> Response:
+    etag = f'W/"{await get_roster_version(db, session)}-{after}-{limit}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+        )
+
+    query = {}
+    if after is not None:
+        if not ObjectId.is_valid(after):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Invalid cursor",
+            )
+        query["_id"] = {"$gt": ObjectId(after)}
+
+    # _id is only fetched to build the cursor, it is not part of the response
+    summoners = (
+        await db.summoners.find(
+            query, {**SUMMONER_RESPONSE_PROJECTION, "_id": 1}, session=session
+        )
+        .sort("_id", 1)
+        .limit(limit)
+        .to_list(length=None)
+    )
+
+    headers = {"ETag": etag}
+    if len(summoners) == limit:
+        headers["X-Next-Cursor"] = str(summoners[-1]["_id"])
+    for summoner in summoners:
+        del summoner["_id"]
+
+    with timed("serialize"):
+        content = orjson.dumps(summoners)
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
+@router.post(
+    "/lookup",
+    response_model=list[SummonerResponse],
+    description="Get the tracked summoners with the given puuids, unknown puuids are skipped",
+)
+async def lookup_summoners(
+    request: LookupSummonersRequest,
+    db: AsyncIOMotorDatabase = Depends(deps.get_listings_db),
+    session: AsyncIOMotorClientSession | None = Depends(deps.get_listings_session),
+) -> Response:
+    summoners = await db.summoners.find(
+        {"puuid": {"$in": request.puuids}},
+        SUMMONER_RESPONSE_PROJECTION,
+        session=session,
+    ).to_list(length=None)
+
+    with timed("serialize"):
+        content = orjson.dumps(summoners)
+    return Response(content=content, media_type="application/json")
+
+
+@router.get(
+    "/search",
+    response_model=list[SummonerResponse],
+    description=(
+        "Search tracked summoners by the start of their Riot ID (`gameName#tagLine`), "
+        "case-insensitive, ordered by Riot ID"
+    ),
+)
+async def search_summoners(
+    q: str = Query(min_length=1, max_length=32),
+    platform: Platform | None = None,
+    limit: int = Query(default=10, ge=1, le=50),
+    db: AsyncIOMotorDatabase = Depends(deps.get_listings_db),
+    session: AsyncIOMotorClientSession | None = Depends(deps.get_listings_session),
+) -> Response:
+    # An anchored regex without flags is a range scan on summoners_riot_id_idx
+    query: dict = {"riot_id_key": {"$regex": f"^{re.escape(q.casefold())}"}}
+    if platform is not None:
+        query["platform"] = platform.value
+    summoners = (
+        await db.summoners.find(query, SUMMONER_RESPONSE_PROJECTION, session=session)
+        .sort("riot_id_key", 1)
+        .limit(limit)
+        .to_list(length=None)
+    )
+
+    with timed("serialize"):
+        content = orjson.dumps(summoners)
+    return Response(content=content, media_type="application/json")
+
+
+def _deletion_job_response(job: dict) -> SummonerDeletionJobResponse:
+    return SummonerDeletionJobResponse(
+        job_id=str(job["_id"]),
+        puuid=job["puuid"],
+        status=job["status"],
+        matches_processed=job["matches_processed"],
+        matches_deleted=job["matches_deleted"],
+        league_entries_deleted=job["league_entries_deleted"],
+        error=job.get("error"),
+        created_at=job["created_at"],
+        updated_at=job["updated_at"],
+    )
 
 
 @router.delete(
     "/{summoner_puuid}",
-    status_code=status.HTTP_204_NO_CONTENT,
+    response_model=SummonerDeletionJobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
     responses={status.HTTP_404_NOT_FOUND: {"description": "Summoner not found"}},
-    description="Delete a summoner",
+    description="Delete a summoner. The cleanup of its matches and league entries runs in the background",
 )
 async def delete_summoner(
     summoner_puuid: str,
+    response: Response,
     db: AsyncIOMotorDatabase = Depends(deps.get_db),
     current_user: dict = Depends(deps.get_current_user),
-):
-    try:
-        # 1. Find summoner by puuid
-        summoner_doc = await db.summoners.find_one(
-            {"puuid": summoner_puuid}
+) -> SummonerDeletionJobResponse:
+    summoner_doc = await db.summoners.find_one({"puuid": summoner_puuid})
+    if not summoner_doc:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Summoner not found",
         )
-        if not summoner_doc:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Summoner not found",
-            )
 
-        summoner_doc_id = summoner_doc["_id"]
+    job = await create_summoner_deletion_job(db, summoner_doc)
 
-        # 1. Delete 'orphan' match documents
-        await db.matches.delete_many(
-            {
-                "ref_summoners": [summoner_doc_id]
-            },
-        )
-
-        # 2. Update 'shared' match documents: Pull summoner's ID from ref_summoners array
-        await db.matches.update_many(
-            {
-                "ref_summoners": summoner_doc_id
-            },
-            {"$pull": {"ref_summoners": summoner_doc_id}},
-        )
+    # Hide the summoner right away, the job removes everything else
+    async with causal_write_session() as session:
+        await db.summoners.delete_one({"_id": summoner_doc["_id"]}, session=session)
+        await bump_roster_version(db, session)
+        _set_read_after(response, session)
+    await publish_event(db, summoner_removed_event(summoner_doc["_id"]))
 
-        # 3. Update 'shared' match documents: Unset the league field from the participant's data
-        await db.matches.update_many(
-            {
-                "info.participants.puuid": summoner_puuid
-            },
-            {"$unset": {"info.participants.$.league": ""}},
-        )
+    return _deletion_job_response(job)
 
-        # Delete Summoner Document
-        await db.summoners.delete_one({"_id": summoner_doc_id})
 
-        # Delete League Entries
-        await db.league_entries.delete_many(
-            {"ref_summoner": summoner_doc_id}
+@router.get(
+    "/deletions/{job_id}",
+    response_model=SummonerDeletionJobResponse,
+    responses={status.HTTP_404_NOT_FOUND: {"description": "Deletion job not found"}},
+    description="Get the progress of a summoner deletion job",
+)
+async def get_summoner_deletion_job(
+    job_id: str,
+    db: AsyncIOMotorDatabase = Depends(deps.get_db),
+    current_user: dict = Depends(deps.get_current_user),
+) -> SummonerDeletionJobResponse:
+    job = None
+    if ObjectId.is_valid(job_id):
+        job = await db[SUMMONER_DELETION_JOBS_COLLECTION].find_one(
+            {"_id": ObjectId(job_id)}
         )
 
-    except HTTPException as http_exc:
-        raise http_exc
-    except Exception as e:
+    if job is None:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"An error occurred during the transaction: {e}",
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Deletion job not found",
         )
+
+    return _deletion_job_response(job)
@@ -3,6 +3,7 @@ from motor.motor_asyncio import AsyncIOMotorDatabase
 
 from app.api import deps
 from app.core.security.password import get_password_hash
+from app.core.security.principal_cache import invalidate_principal
 from app.schemas.requests import UserUpdatePasswordRequest
 from app.schemas.responses import UserResponse
 
@@ -34,6 +35,7 @@ async def delete_current_user(
     await db.users.delete_one({"_id": current_user["_id"]})
     # Also delete associated refresh tokens
     await db.refresh_tokens.delete_many({"user_id": current_user["_id"]})
+    await invalidate_principal(db, current_user["_id"])
 
 
 @router.post(
@@ -48,9 +50,16 @@ async def reset_current_user_password(
 ) -> None:
     await db.users.update_one(
         {"_id": current_user["_id"]},
-        {"$set": {"hashed_password": get_password_hash(user_update_password.password)}},
+        {
+            "$set": {
+                "hashed_password": await get_password_hash(
+                    user_update_password.password
+                )
+            }
+        },
     )
     # invalidate all refresh tokens for this user when password is changed
     await db.refresh_tokens.update_many(
         {"user_id": current_user["_id"], "used": False}, {"$set": {"used": True}}
     )
+    await invalidate_principal(db, current_user["_id"])
@@ -0,0 +1,32 @@
+"""
+Write the `player_matches` documents of matches stored before the watcher did.
+
+Usage (from the `api` directory):
+    uv run python -m app.commands.backfill_player_matches
+"""
+
+import argparse
+import asyncio
+import time
+
+from app.core.database import close_mongo_connection, get_database, init_db
+from app.core.player_matches import backfill_player_matches
+
+
+async def backfill(args: argparse.Namespace) -> None:
+    # Creates the player_matches indexes if the API never started
+    await init_db()
+    started = time.perf_counter()
+    written = await backfill_player_matches(get_database(), args.batch_size)
+    print(f"Wrote {written} player matches in {time.perf_counter() - started:.1f}s")
+    await close_mongo_connection()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Backfill player_matches")
+    parser.add_argument("--batch-size", type=int, default=500)
+    asyncio.run(backfill(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
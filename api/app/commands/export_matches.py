@@ -0,0 +1,75 @@
+"""
+Export matches flattened per participant to a NDJSON or Parquet file.
+
+Usage (from the `api` directory):
+    uv run python -m app.commands.export_matches matches.parquet --queues 420,440
+    uv run python -m app.commands.export_matches new.ndjson --watermark analysts
+"""
+
+import argparse
+import asyncio
+from datetime import datetime
+
+from app.core.database import close_mongo_connection, get_database
+from app.core.export import (
+    DEFAULT_COLUMNS,
+    ExportOptions,
+    build_query,
+    iter_row_batches,
+    stream_ndjson,
+    stream_parquet,
+)
+
+
+def to_timestamp_ms(value: str) -> int:
+    return int(datetime.fromisoformat(value).timestamp() * 1000)
+
+
+async def export(args: argparse.Namespace) -> None:
+    options = ExportOptions(
+        columns=args.columns.split(",") if args.columns else DEFAULT_COLUMNS,
+        query=build_query(
+            start=args.start,
+            end=args.end,
+            queues=[int(q) for q in args.queues.split(",")] if args.queues else None,
+        ),
+        tracked_only=args.tracked_only,
+        batch_size=args.batch_size,
+        watermark=args.watermark,
+    )
+    batches = iter_row_batches(get_database(), options)
+
+    fmt = args.format or ("parquet" if args.output.endswith(".parquet") else "ndjson")
+    stream = (
+        stream_parquet(batches, options.columns)
+        if fmt == "parquet"
+        else stream_ndjson(batches)
+    )
+
+    written = 0
+    with open(args.output, "wb") as f:
+        async for chunk in stream:
+            f.write(chunk)
+            written += len(chunk)
+    print(f"Wrote {written} bytes to {args.output}")
+    await close_mongo_connection()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export matches per participant")
+    parser.add_argument("output")
+    parser.add_argument("--format", choices=["ndjson", "parquet"])
+    parser.add_argument("--columns", help="Comma separated, defaults to a core set")
+    parser.add_argument("--start", type=to_timestamp_ms, help="ISO date, inclusive")
+    parser.add_argument("--end", type=to_timestamp_ms, help="ISO date, exclusive")
+    parser.add_argument("--queues", help="Comma separated queue ids")
+    parser.add_argument("--tracked-only", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument(
+        "--watermark", help="Continue after the previous export with this name"
+    )
+    asyncio.run(export(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
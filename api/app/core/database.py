@@ -1,26 +1,51 @@
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
-from pymongo import ASCENDING, DESCENDING, IndexModel
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Literal
+
+from bson import Timestamp
+from motor.motor_asyncio import (
+    AsyncIOMotorClient,
+    AsyncIOMotorClientSession,
+    AsyncIOMotorDatabase,
+)
+from pymongo import ASCENDING, DESCENDING, IndexModel, UpdateOne
 from pymongo.errors import DuplicateKeyError
 
-from app.core.config import get_settings
+from app.core.config import MongoReadRoute, get_settings
+from app.core.player_matches import PLAYER_MATCHES_COLLECTION
+from app.core.roster import riot_id_key
 from app.core.security.password import get_password_hash
+from app.core.security.refresh_token import init_refresh_tokens
+from app.core.timing import MongoTimingListener
+
+# Endpoint classes that may read from secondaries, see `MongoDB` settings
+ReadRoute = Literal["leaderboard", "listings", "history"]
+
+# Header carrying the operation time of a write, reads sent with it see the write
+READ_AFTER_HEADER = "X-Read-After"
 
 _MONGO_CLIENT: AsyncIOMotorClient | None = None
 _MONGO_DB: AsyncIOMotorDatabase | None = None
+_MONGO_READ_CLIENTS: dict[str, AsyncIOMotorClient] = {}
+
+
+def _create_mongo_client(pool_size: int, **options) -> AsyncIOMotorClient:
+    return AsyncIOMotorClient(
+        get_settings().mongodb.uri,
+        maxPoolSize=pool_size,
+        minPoolSize=1,
+        maxIdleTimeMS=30000,  # 30 seconds
+        connectTimeoutMS=30000,  # 30 seconds
+        serverSelectionTimeoutMS=30000,  # 30 seconds
+        event_listeners=[MongoTimingListener()],
+        **options,
+    )
 
 
 def get_mongo_client() -> AsyncIOMotorClient:
     global _MONGO_CLIENT
     if _MONGO_CLIENT is None:
-        settings = get_settings()
-        _MONGO_CLIENT = AsyncIOMotorClient(
-            settings.mongodb.uri,
-            maxPoolSize=5,
-            minPoolSize=1,
-            maxIdleTimeMS=30000,  # 30 seconds
-            connectTimeoutMS=30000,  # 30 seconds
-            serverSelectionTimeoutMS=30000,  # 30 seconds
-        )
+        _MONGO_CLIENT = _create_mongo_client(get_settings().mongodb.pool_size)
     return _MONGO_CLIENT
 
 
@@ -33,11 +58,49 @@ def get_database() -> AsyncIOMotorDatabase:
     return _MONGO_DB
 
 
+def get_read_client(route: ReadRoute) -> AsyncIOMotorClient:
+    """Client with its own pool and read preference for one class of read endpoints."""
+    if route not in _MONGO_READ_CLIENTS:
+        route_settings: MongoReadRoute = getattr(get_settings().mongodb, route)
+        options = {"readPreference": route_settings.read_preference}
+        if route_settings.read_preference != "primary":
+            options["maxStalenessSeconds"] = route_settings.max_staleness_secs
+        _MONGO_READ_CLIENTS[route] = _create_mongo_client(
+            route_settings.pool_size, **options
+        )
+    return _MONGO_READ_CLIENTS[route]
+
+
+def get_read_database(route: ReadRoute) -> AsyncIOMotorDatabase:
+    return get_read_client(route)[get_settings().mongodb.database]
+
+
+@asynccontextmanager
+async def causal_write_session() -> AsyncIterator[AsyncIOMotorClientSession]:
+    """Session on the primary, its operation time is handed out as `X-Read-After`."""
+    async with await get_mongo_client().start_session(
+        causal_consistency=True
+    ) as session:
+        yield session
+
+
+def format_operation_time(operation_time: Timestamp) -> str:
+    return f"{operation_time.time}.{operation_time.inc}"
+
+
+def parse_operation_time(value: str) -> Timestamp:
+    time, inc = value.split(".")
+    return Timestamp(int(time), int(inc))
+
+
 async def close_mongo_connection() -> None:
     global _MONGO_CLIENT
     if _MONGO_CLIENT is not None:
         _MONGO_CLIENT.close()
         _MONGO_CLIENT = None
+    for client in _MONGO_READ_CLIENTS.values():
+        client.close()
+    _MONGO_READ_CLIENTS.clear()
 
 
 async def init_db() -> None:
@@ -45,6 +108,8 @@ async def init_db() -> None:
 
     await db["users"].create_indexes([IndexModel([("email", ASCENDING)], unique=True)])
 
+    await init_refresh_tokens(db)
+
     await db["league_entries"].create_indexes(
         [
             # Single compound index that covers both the lookup and sorting
@@ -61,6 +126,103 @@ async def init_db() -> None:
         ]
     )
 
+    await db["summoners"].create_indexes(
+        [
+            IndexModel([("puuid", ASCENDING)], name="summoners_puuid_idx"),
+            # Duplicate checks and prefix search on the case-insensitive Riot ID
+            IndexModel(
+                [("riot_id_key", ASCENDING), ("platform", ASCENDING)],
+                name="summoners_riot_id_idx",
+            ),
+            # Stalest summoners first, set by the watcher after every check
+            IndexModel(
+                [("last_checked_at", ASCENDING)], name="summoners_last_checked_idx"
+            ),
+        ]
+    )
+
+    # Summoners added before riot_id_key existed
+    missing_keys = (
+        await db["summoners"]
+        .find({"riot_id_key": {"$exists": False}}, {"gameName": 1, "tagLine": 1})
+        .to_list(length=None)
+    )
+    if missing_keys:
+        await db["summoners"].bulk_write(
+            [
+                UpdateOne(
+                    {"_id": summoner["_id"]},
+                    {
+                        "$set": {
+                            "riot_id_key": riot_id_key(
+                                summoner["gameName"], summoner["tagLine"]
+                            )
+                        }
+                    },
+                )
+                for summoner in missing_keys
+            ],
+            ordered=False,
+        )
+
+    await db["matches"].create_indexes(
+        [
+            # Walks a summoner's matches in _id order, used by deletion jobs
+            IndexModel(
+                [("ref_summoners", ASCENDING), ("_id", ASCENDING)],
+                name="matches_ref_summoners_idx",
+            ),
+            # Oldest matches first, used by the archiver
+            IndexModel(
+                [("info.gameEndTimestamp", ASCENDING)],
+                name="matches_game_end_idx",
+            ),
+        ]
+    )
+
+    await db[PLAYER_MATCHES_COLLECTION].create_indexes(
+        [
+            # A player's recent games of a queue, newest first
+            IndexModel(
+                [
+                    ("puuid", ASCENDING),
+                    ("queueId", ASCENDING),
+                    ("gameEndTimestamp", DESCENDING),
+                ],
+                name="player_matches_history_idx",
+            ),
+            # Upsert key of the watcher and the backfill
+            IndexModel(
+                [("matchId", ASCENDING), ("puuid", ASCENDING)],
+                unique=True,
+                name="player_matches_match_idx",
+            ),
+            # A player's latest game, used by the watcher to detect new matches
+            IndexModel(
+                [("puuid", ASCENDING), ("gameEndTimestamp", DESCENDING)],
+                name="player_matches_latest_idx",
+            ),
+        ]
+    )
+
+    await db["summoner_deletion_jobs"].create_indexes(
+        [
+            IndexModel(
+                [("status", ASCENDING), ("created_at", ASCENDING)],
+                name="summoner_deletion_jobs_claim_idx",
+            )
+        ]
+    )
+
+    await db["summoner_import_jobs"].create_indexes(
+        [
+            IndexModel(
+                [("status", ASCENDING), ("created_at", ASCENDING)],
+                name="summoner_import_jobs_claim_idx",
+            )
+        ]
+    )
+
     settings = get_settings()
     try:
         await db["users"].update_one(
@@ -68,7 +230,7 @@ async def init_db() -> None:
             {
                 "$setOnInsert": {
                     "email": settings.security.root_username,
-                    "hashed_password": get_password_hash(
+                    "hashed_password": await get_password_hash(
                         settings.security.root_password.get_secret_value()
                     ),
                 }
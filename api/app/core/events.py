@@ -0,0 +1,360 @@
+"""
+Live feed of ingestion events.
+
+Events are small dicts with a `type` of `match`, `league`, `summoner_added` or
+`summoner_removed`. They come from one of two sources (`events.source`):
+
+- `change_stream`: a change stream on `matches`, `league_entries` and
+  `summoners`, needs a replica set. Event ids are resume tokens.
+- `outbox`: the watcher and the API insert events into the capped
+  `events_outbox` collection, which is tailed. Event ids are the server
+  assigned insertion timestamps.
+
+One `EventBroker` per worker reads the source and fans events out to all
+connected clients. Recent events are kept in memory so a reconnecting client
+resumes right after its last event id, older ids are replayed from the source.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from collections.abc import AsyncIterator
+from functools import lru_cache
+
+from bson import ObjectId, Timestamp
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, PyMongoError
+
+from app.core.config import get_settings
+from app.core.database import get_database
+
+logger = logging.getLogger(__name__)
+
+EVENTS_OUTBOX_COLLECTION = "events_outbox"
+
+# Tells a client that events were missed and it has to reload its state
+RESET_EVENT = {"type": "reset"}
+
+_MATCH_FIELDS = [
+    "metadata.matchId",
+    "info.queueId",
+    "info.gameEndTimestamp",
+    "ref_summoners",
+]
+_LEAGUE_FIELDS = [
+    "ref_summoner",
+    "queueType",
+    "tier",
+    "rank",
+    "leaguePoints",
+    "wins",
+    "losses",
+]
+_SUMMONER_FIELDS = ["puuid", "gameName", "tagLine", "platform"]
+
+CHANGE_STREAM_PIPELINE = [
+    {
+        "$match": {
+            "$or": [
+                {"ns.coll": "matches", "operationType": {"$in": ["insert", "replace"]}},
+                # A tracked summoner was linked to an existing match, enrichment
+                # updates of the participants are not interesting. The watcher's
+                # $addToSet appends (`ref_summoners.<n>`), the $pull of deletion
+                # jobs rewrites or truncates the array and is not an event.
+                {
+                    "ns.coll": "matches",
+                    "operationType": "update",
+                    "updateDescription.truncatedArrays.0": {"$exists": False},
+                    "$expr": {
+                        "$anyElementTrue": {
+                            "$map": {
+                                "input": {
+                                    "$objectToArray": "$updateDescription.updatedFields"
+                                },
+                                "in": {
+                                    "$regexMatch": {
+                                        "input": "$$this.k",
+                                        "regex": r"^ref_summoners\.\d+$",
+                                    }
+                                },
+                            }
+                        }
+                    },
+                },
+                {
+                    "ns.coll": "league_entries",
+                    "operationType": {"$in": ["insert", "update", "replace"]},
+                },
+                {
+                    "ns.coll": "summoners",
+                    "operationType": {"$in": ["insert", "delete"]},
+                },
+            ]
+        }
+    },
+    # Matches are large, only ship what the events carry
+    {
+        "$project": {
+            "operationType": 1,
+            "ns": 1,
+            "documentKey": 1,
+            **{
+                f"fullDocument.{field}": 1
+                for field in [*_MATCH_FIELDS, *_LEAGUE_FIELDS, *_SUMMONER_FIELDS]
+            },
+        }
+    },
+]
+
+
+def match_event(match: dict) -> dict:
+    return {
+        "type": "match",
+        "matchId": match["metadata"]["matchId"],
+        "queueId": match["info"].get("queueId"),
+        "gameEndTimestamp": match["info"].get("gameEndTimestamp"),
+        "summoners": [str(summoner_id) for summoner_id in match["ref_summoners"]],
+    }
+
+
+def league_event(entry: dict) -> dict:
+    return {
+        "type": "league",
+        "summoner": str(entry["ref_summoner"]),
+        **{field: entry.get(field) for field in _LEAGUE_FIELDS[1:]},
+    }
+
+
+def summoner_added_event(summoner: dict) -> dict:
+    return {
+        "type": "summoner_added",
+        "summoner": str(summoner["_id"]),
+        **{field: summoner.get(field) for field in _SUMMONER_FIELDS},
+    }
+
+
+def summoner_removed_event(summoner_id: ObjectId) -> dict:
+    return {"type": "summoner_removed", "summoner": str(summoner_id)}
+
+
+def change_to_event(change: dict) -> dict | None:
+    collection = change["ns"]["coll"]
+    if collection == "summoners" and change["operationType"] == "delete":
+        return summoner_removed_event(change["documentKey"]["_id"])
+
+    document = change.get("fullDocument")
+    if document is None:
+        # Deleted before the update could be looked up
+        return None
+    if collection == "matches":
+        return match_event(document)
+    if collection == "league_entries":
+        return league_event(document)
+    return summoner_added_event(document)
+
+
+def _outbox_event_id(ts: Timestamp) -> str:
+    return f"{ts.time}-{ts.inc}"
+
+
+def _parse_outbox_event_id(event_id: str) -> Timestamp:
+    time, inc = event_id.split("-")
+    return Timestamp(int(time), int(inc))
+
+
+async def init_events_outbox(db: AsyncIOMotorDatabase) -> None:
+    """Create the capped outbox, the watcher does the same on its side."""
+    if EVENTS_OUTBOX_COLLECTION in await db.list_collection_names():
+        return
+
+    try:
+        await db.create_collection(
+            EVENTS_OUTBOX_COLLECTION,
+            capped=True,
+            size=get_settings().events.outbox_size_bytes,
+        )
+    except CollectionInvalid:
+        # Created concurrently
+        return
+    # A tailable cursor dies on an empty capped collection, seed it once
+    await db[EVENTS_OUTBOX_COLLECTION].insert_one(
+        {"ts": Timestamp(0, 0), "event": None}
+    )
+
+
+async def publish_event(db: AsyncIOMotorDatabase, event: dict) -> None:
+    """Write an event to the outbox, change streams pick up the write itself."""
+    if get_settings().events.source != "outbox":
+        return
+
+    # An empty timestamp is replaced by a unique, increasing one by the server
+    await db[EVENTS_OUTBOX_COLLECTION].insert_one(
+        {"ts": Timestamp(0, 0), "event": event}
+    )
+
+
+class EventBroker:
+    """Reads the event source once and fans events out to subscribed clients."""
+
+    def __init__(
+        self,
+        db: AsyncIOMotorDatabase,
+        source: str,
+        buffer_size: int,
+        client_queue_size: int,
+    ) -> None:
+        self.db = db
+        self.source = source
+        self.client_queue_size = client_queue_size
+        self._buffer: deque[tuple[str, dict]] = deque(maxlen=buffer_size)
+        self._subscribers: set[asyncio.Queue] = set()
+
+    async def run(self) -> None:
+        """Consume the source for the lifetime of the app, one task per worker."""
+        last_event_id = None
+        while True:
+            try:
+                async for event_id, event in self._read(last_event_id, follow=True):
+                    last_event_id = event_id
+                    self._publish(event_id, event)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Event source failed, restarting")
+            await asyncio.sleep(1)
+
+    def _read(self, after: str | None, follow: bool) -> AsyncIterator[tuple[str, dict]]:
+        """
+        Events after `after` (or from now), follows the source when `follow`.
+
+        Otherwise stops at the current end of the source, used to replay.
+        """
+        if self.source == "change_stream":
+            return self._watch_changes(after, follow)
+        return self._tail_outbox(after, follow)
+
+    async def _watch_changes(
+        self, after: str | None, follow: bool
+    ) -> AsyncIterator[tuple[str, dict]]:
+        async with self.db.watch(
+            CHANGE_STREAM_PIPELINE,
+            full_document="updateLookup",
+            resume_after={"_data": after} if after else None,
+        ) as stream:
+            if follow:
+                async for change in stream:
+                    event = change_to_event(change)
+                    if event is not None:
+                        yield change["_id"]["_data"], event
+                return
+
+            # Replaying, stop at the current end of the stream
+            while (change := await stream.try_next()) is not None:
+                event = change_to_event(change)
+                if event is not None:
+                    yield change["_id"]["_data"], event
+
+    async def _tail_outbox(
+        self, after: str | None, follow: bool
+    ) -> AsyncIterator[tuple[str, dict]]:
+        collection = self.db[EVENTS_OUTBOX_COLLECTION]
+        if after is not None:
+            last_ts = _parse_outbox_event_id(after)
+        else:
+            last = await collection.find_one({}, sort=[("$natural", -1)])
+            last_ts = last["ts"] if last else Timestamp(0, 0)
+
+        while True:
+            # Capped collections return documents in insertion order
+            cursor = collection.find(
+                {"ts": {"$gt": last_ts}},
+                cursor_type=CursorType.TAILABLE_AWAIT
+                if follow
+                else CursorType.NON_TAILABLE,
+            )
+            while cursor.alive:
+                async for doc in cursor:
+                    last_ts = doc["ts"]
+                    if doc["event"] is not None:
+                        yield _outbox_event_id(doc["ts"]), doc["event"]
+                if not follow:
+                    return
+            await asyncio.sleep(1)
+
+    def _publish(self, event_id: str, event: dict) -> None:
+        self._buffer.append((event_id, event))
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait((event_id, event))
+            except asyncio.QueueFull:
+                # Too slow, end its stream right after the last event it got,
+                # it reconnects with that id and catches up without a gap
+                self._subscribers.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+    async def _backlog(
+        self, last_event_id: str, seen: set[str]
+    ) -> AsyncIterator[tuple[str, dict]]:
+        """Events after `last_event_id`, replayed ones are added to `seen`."""
+        buffered = [event_id for event_id, _ in self._buffer]
+        if last_event_id in buffered:
+            start = buffered.index(last_event_id) + 1
+            for event_id, event in list(self._buffer)[start:]:
+                yield event_id, event
+            return
+
+        try:
+            async for event_id, event in self._read(last_event_id, follow=False):
+                seen.add(event_id)
+                yield event_id, event
+        except (PyMongoError, ValueError):
+            logger.info(f"Can't resume events after {last_event_id}")
+            yield "", RESET_EVENT
+
+    async def stream(
+        self, last_event_id: str | None, heartbeat_secs: float
+    ) -> AsyncIterator[tuple[str, dict] | None]:
+        """
+        Events for one client, starting after `last_event_id` if given.
+
+        Yields None when nothing happened for `heartbeat_secs`. Ends when the
+        client can't keep up, it then reconnects with its last event id.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.client_queue_size)
+        # Subscribed before the backlog is read so nothing falls in between
+        self._subscribers.add(queue)
+        try:
+            seen: set[str] = set()
+            if last_event_id is not None:
+                async for event_id, event in self._backlog(last_event_id, seen):
+                    yield event_id, event
+
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), heartbeat_secs)
+                except TimeoutError:
+                    yield None
+                    continue
+                if item is None:
+                    return
+                if item[0] in seen:
+                    continue
+                # Live events are past everything replayed from here on
+                seen.clear()
+                yield item
+        finally:
+            self._subscribers.discard(queue)
+
+
+@lru_cache(maxsize=1)
+def get_event_broker() -> EventBroker:
+    settings = get_settings()
+    return EventBroker(
+        get_database(),
+        source=settings.events.source,
+        buffer_size=settings.events.buffer_size,
+        client_queue_size=settings.events.client_queue_size,
+    )
@@ -0,0 +1,334 @@
+"""
+Streaming export of matches flattened to one row per participant.
+
+Rows are read from a cursor in batches and written as NDJSON or Parquet row
+groups, so memory stays bounded by the batch size. Parquet needs the optional
+`pyarrow` package. Archived matches are read too, merged in `_id` order.
+
+The Parquet schema is fixed before the first row, from the match-v5 types of
+the selected columns, so it doesn't depend on which values a batch happens
+to hold. Columns without a scalar type are written as JSON strings.
+"""
+
+import time
+import typing
+from collections.abc import AsyncIterator, Iterator
+from dataclasses import dataclass, field
+from functools import cache
+
+import orjson
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pulsefire.schemas import RiotAPISchema
+
+from app.core.player_matches import summoner_puuids
+from app.core.retention import MATCH_COLLECTIONS, drop_duplicate_copies, merge_by_id
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+EXPORT_WATERMARKS_COLLECTION = "export_watermarks"
+
+# Export column -> match document path, everything else is a participant field
+MATCH_COLUMNS = {
+    "matchId": "metadata.matchId",
+    "platformId": "info.platformId",
+    "queueId": "info.queueId",
+    "gameVersion": "info.gameVersion",
+    "gameStartTimestamp": "info.gameStartTimestamp",
+    "gameEndTimestamp": "info.gameEndTimestamp",
+    "gameDuration": "info.gameDuration",
+}
+
+DEFAULT_COLUMNS = [
+    "matchId",
+    "queueId",
+    "gameEndTimestamp",
+    "gameDuration",
+    "puuid",
+    "teamId",
+    "championId",
+    "teamPosition",
+    "win",
+    "kills",
+    "deaths",
+    "assists",
+    "goldEarned",
+    "totalDamageDealtToChampions",
+    "visionScore",
+    "league.tier",
+    "league.rank",
+    "league.leaguePoints",
+]
+
+
+# Participant fields Realm-Warp adds to the match-v5 payload
+EXTRA_COLUMN_TYPES = {
+    "league.tier": str,
+    "league.rank": str,
+    "league.leaguePoints": int,
+}
+
+
+class ExportFormatUnavailable(Exception):
+    pass
+
+
+def _get_path(doc: dict, path: str):
+    for key in path.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(key)
+    return doc
+
+
+@cache
+def column_type(column: str) -> type:
+    """Scalar type of a column from the match-v5 schema, `str` if it has none."""
+    if column in EXTRA_COLUMN_TYPES:
+        return EXTRA_COLUMN_TYPES[column]
+    if column in MATCH_COLUMNS:
+        hint, path = RiotAPISchema.LolMatchV5Match, MATCH_COLUMNS[column]
+    else:
+        hint, path = RiotAPISchema.LolMatchV5MatchInfoParticipant, column
+
+    keys = path.split(".")
+    for key in keys:
+        if not typing.is_typeddict(hint):
+            return str
+        hint = typing.get_type_hints(hint).get(key)
+    if hint is int and len(keys) > 1 and column not in MATCH_COLUMNS:
+        # Riot sends fractions for some integer challenges
+        return float
+    return hint if hint in (bool, int, float, str) else str
+
+
+def to_column_value(value, python_type: type):
+    """`value` as `python_type`, None if it doesn't fit instead of failing the export."""
+    if value is None:
+        return None
+    if python_type is str:
+        return value if isinstance(value, str) else orjson.dumps(value).decode()
+    # A bool is an int too, only bool columns take them
+    fits = isinstance(value, int | float) and isinstance(value, bool) == (
+        python_type is bool
+    )
+    if fits and python_type is int and isinstance(value, float):
+        fits = value.is_integer()
+    return python_type(value) if fits else None
+
+
+def build_projection(columns: list[str]) -> dict:
+    projection: dict = {"_id": 1}
+    for column in columns:
+        if column in MATCH_COLUMNS:
+            projection[MATCH_COLUMNS[column]] = 1
+        else:
+            projection[f"info.participants.{column}"] = 1
+    # Needed to filter tracked participants and to drop duplicate copies
+    projection["info.participants.puuid"] = 1
+    projection["metadata.matchId"] = 1
+    return projection
+
+
+def build_query(
+    start: int | None = None,
+    end: int | None = None,
+    queues: list[int] | None = None,
+    after_id: ObjectId | None = None,
+) -> dict:
+    query: dict = {}
+    if start is not None or end is not None:
+        query["info.gameEndTimestamp"] = {
+            **({"$gte": start} if start is not None else {}),
+            **({"$lt": end} if end is not None else {}),
+        }
+    if queues:
+        query["info.queueId"] = {"$in": queues}
+    if after_id is not None:
+        query["_id"] = {"$gt": after_id}
+    return query
+
+
+def flatten_match(
+    match: dict, columns: list[str], puuids: set[str] | None = None
+) -> Iterator[dict]:
+    match_values = {
+        column: _get_path(match, MATCH_COLUMNS[column])
+        for column in columns
+        if column in MATCH_COLUMNS
+    }
+    participant_columns = [c for c in columns if c not in MATCH_COLUMNS]
+
+    for participant in match.get("info", {}).get("participants", []):
+        if puuids is not None and participant.get("puuid") not in puuids:
+            continue
+        row = dict(match_values)
+        for column in participant_columns:
+            row[column] = _get_path(participant, column)
+        yield {column: row[column] for column in columns}
+
+
+def user_watermark(user_id: ObjectId, name: str) -> str:
+    """Watermark name of an API user, users can't move each other's watermarks."""
+    return f"user:{user_id}:{name}"
+
+
+async def get_watermark(db: AsyncIOMotorDatabase, name: str) -> ObjectId | None:
+    doc = await db[EXPORT_WATERMARKS_COLLECTION].find_one({"_id": name})
+    return doc["last_id"] if doc else None
+
+
+async def save_watermark(
+    db: AsyncIOMotorDatabase, name: str, last_id: ObjectId
+) -> None:
+    await db[EXPORT_WATERMARKS_COLLECTION].update_one(
+        {"_id": name},
+        {"$set": {"last_id": last_id, "updated_at": time.time()}},
+        upsert=True,
+    )
+
+
+@dataclass
+class ExportOptions:
+    columns: list[str] = field(default_factory=lambda: list(DEFAULT_COLUMNS))
+    # Match filter, see `build_query`
+    query: dict = field(default_factory=dict)
+    # Only rows of tracked summoners
+    tracked_only: bool = False
+    batch_size: int = 500
+    watermark: str | None = None
+
+
+async def iter_row_batches(
+    db: AsyncIOMotorDatabase, options: ExportOptions
+) -> AsyncIterator[list[dict]]:
+    """
+    Yield lists of flattened rows, reading `batch_size` matches at a time.
+
+    Matches of both tiers are read in `_id` order. With `watermark` the export continues
+    after the last match of the previous export with that name and saves the
+    new position once every batch has been consumed.
+    """
+    query = options.query
+    if options.watermark is not None:
+        after_id = await get_watermark(db, options.watermark)
+        if after_id is not None:
+            query = {**query, "_id": {"$gt": after_id}}
+
+    puuids = None
+    if options.tracked_only:
+        puuids = set()
+        async for doc in db.summoners.find({}, {"puuid": 1, "puuids": 1}):
+            puuids |= summoner_puuids(doc)
+
+    cursors = [
+        db[collection]
+        .find(query, build_projection(options.columns))
+        .sort("_id", 1)
+        .batch_size(options.batch_size)
+        for collection in MATCH_COLLECTIONS
+    ]
+
+    async def to_rows(matches: list[dict]) -> list[dict]:
+        return [
+            row
+            for match in await drop_duplicate_copies(db, matches)
+            for row in flatten_match(match, options.columns, puuids)
+        ]
+
+    last_id = None
+    matches: list[dict] = []
+    async for match in merge_by_id(cursors):
+        matches.append(match)
+        last_id = match["_id"]
+        if len(matches) >= options.batch_size:
+            yield await to_rows(matches)
+            matches = []
+    if matches:
+        yield await to_rows(matches)
+
+    if options.watermark is not None and last_id is not None:
+        await save_watermark(db, options.watermark, last_id)
+
+
+async def stream_ndjson(batches: AsyncIterator[list[dict]]) -> AsyncIterator[bytes]:
+    async for rows in batches:
+        yield b"".join(
+            orjson.dumps(row, option=orjson.OPT_APPEND_NEWLINE) for row in rows
+        )
+
+
+class _ChunkSink:
+    """Write-only file object collecting what pyarrow writes between flushes."""
+
+    def __init__(self) -> None:
+        self.chunks: list[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+async def stream_parquet(
+    batches: AsyncIterator[list[dict]], columns: list[str]
+) -> AsyncIterator[bytes]:
+    """Yield a Parquet file of `columns`, one row group per batch."""
+    if pq is None:
+        raise ExportFormatUnavailable(
+            "Parquet export requires the optional pyarrow package"
+        )
+
+    arrow_types = {
+        bool: pa.bool_(),
+        int: pa.int64(),
+        float: pa.float64(),
+        str: pa.string(),
+    }
+    types = {column: column_type(column) for column in columns}
+    schema = pa.schema(
+        [(column, arrow_types[python_type]) for column, python_type in types.items()]
+    )
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema)
+    async for rows in batches:
+        if not rows:
+            continue
+        table = pa.Table.from_pydict(
+            {
+                column: [to_column_value(row[column], python_type) for row in rows]
+                for column, python_type in types.items()
+            },
+            schema=schema,
+        )
+        writer.write_table(table)
+        yield sink.drain()
+
+    writer.close()
+    yield sink.drain()
+
+
+def parquet_available() -> bool:
+    return pq is not None
@@ -0,0 +1,103 @@
+from datetime import UTC, datetime, timedelta
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+# Written by the watcher, a time series collection with `platform` as meta field
+INGESTION_LAG_COLLECTION = "ingestion_lag"
+
+LAG_WINDOWS = {
+    "1h": timedelta(hours=1),
+    "24h": timedelta(hours=24),
+    "7d": timedelta(days=7),
+}
+LAG_PERCENTILES = [0.5, 0.9, 0.99]
+
+
+def _lag_group(group_id: str | None) -> dict:
+    return {
+        "$group": {
+            "_id": group_id,
+            "count": {"$sum": 1},
+            "percentiles": {
+                "$percentile": {
+                    "input": "$lag_ms",
+                    "p": LAG_PERCENTILES,
+                    "method": "approximate",
+                }
+            },
+            "max": {"$max": "$lag_ms"},
+        }
+    }
+
+
+def _lag_row(window: str, platform: str | None, group: dict) -> dict:
+    p50, p90, p99 = group["percentiles"]
+    return {
+        "window": window,
+        "platform": platform,
+        "count": group["count"],
+        "p50_ms": p50,
+        "p90_ms": p90,
+        "p99_ms": p99,
+        "max_ms": group["max"],
+    }
+
+
+async def get_lag_percentiles(
+    db: AsyncIOMotorDatabase, platform: str | None = None
+) -> list[dict]:
+    """Lag percentiles per window, overall first and then per platform."""
+    now = datetime.now(UTC)
+    rows = []
+    for window, delta in LAG_WINDOWS.items():
+        query = {"ts": {"$gte": now - delta}}
+        if platform:
+            query["platform"] = platform
+        pipeline = [
+            {"$match": query},
+            {
+                "$facet": {
+                    "overall": [_lag_group(None)],
+                    "platforms": [_lag_group("$platform"), {"$sort": {"_id": 1}}],
+                }
+            },
+        ]
+        result = await db[INGESTION_LAG_COLLECTION].aggregate(pipeline).to_list(1)
+        facets = result[0] if result else {"overall": [], "platforms": []}
+        rows.extend(_lag_row(window, None, group) for group in facets["overall"])
+        rows.extend(
+            _lag_row(window, group["_id"], group) for group in facets["platforms"]
+        )
+    return rows
+
+
+async def get_stalest_summoners(
+    db: AsyncIOMotorDatabase, limit: int, platform: str | None = None
+) -> list[dict]:
+    """Summoners whose last successful check is oldest, never checked ones first."""
+    query = {"platform": platform} if platform else {}
+    cursor = (
+        db["summoners"]
+        .find(
+            query,
+            {
+                "_id": 0,
+                "gameName": 1,
+                "tagLine": 1,
+                "platform": 1,
+                "puuid": 1,
+                "last_checked_at": 1,
+            },
+        )
+        .sort("last_checked_at", 1)
+        .limit(limit)
+    )
+    summoners = []
+    async for summoner in cursor:
+        # Motor returns naive datetimes in UTC
+        last_checked_at = summoner.get("last_checked_at")
+        summoner["last_checked_at"] = (
+            last_checked_at.replace(tzinfo=UTC).timestamp() if last_checked_at else None
+        )
+        summoners.append(summoner)
+    return summoners
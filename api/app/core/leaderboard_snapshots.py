@@ -0,0 +1,230 @@
+"""
+Periodic leaderboard snapshots and the rank movement derived from them.
+
+Every `leaderboard_snapshots.interval_secs` the ordering of each queue is
+stored in `leaderboard_snapshots` as two binary fields: the summoner ids
+concatenated in position order, and the scores as varints of the difference
+to the previous position (non-negative, the list is sorted). A thousand
+summoners take about 13 KB. Snapshots expire after `retention_days`.
+
+Right after a snapshot, movement against the one taken `baseline_hours`
+earlier (the oldest one while there is none that old) is computed for every
+summoner and stored as one `leaderboard_movement` document per queue, which
+the leaderboard endpoint merges into its response without aggregating.
+"""
+
+import asyncio
+import logging
+from datetime import UTC, datetime, timedelta
+
+from bson import Binary, ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from app.core.config import LeaderboardSnapshots, get_settings
+from app.jobs.base import acquire_lease
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_SNAPSHOTS_COLLECTION = "leaderboard_snapshots"
+LEADERBOARD_MOVEMENT_COLLECTION = "leaderboard_movement"
+
+SNAPSHOTTER_LEASE_ID = "leaderboard_snapshotter"
+
+QUEUE_TYPES = ["RANKED_SOLO_5x5", "RANKED_FLEX_SR"]
+
+# Same scale as the leaderboard's tierScore + rankScore + LP
+TIER_SCORES = {
+    "IRON": 0,
+    "BRONZE": 400,
+    "SILVER": 800,
+    "GOLD": 1200,
+    "PLATINUM": 1600,
+    "EMERALD": 2000,
+    "DIAMOND": 2400,
+    "MASTER": 2800,
+    "GRANDMASTER": 2800,
+    "CHALLENGER": 2800,
+}
+RANK_SCORES = {"IV": 0, "III": 100, "II": 200, "I": 300}
+
+OBJECT_ID_SIZE = 12
+VARINT_PAYLOAD_BITS = 7
+VARINT_CONTINUE = 0x80
+
+
+def league_score(entry: dict) -> int:
+    return (
+        TIER_SCORES.get(entry.get("tier"), 0)
+        + RANK_SCORES.get(entry.get("rank"), 0)
+        + (entry.get("leaguePoints") or 0)
+    )
+
+
+def _write_varint(buffer: bytearray, value: int) -> None:
+    while value >= VARINT_CONTINUE:
+        buffer.append(value & 0x7F | VARINT_CONTINUE)
+        value >>= VARINT_PAYLOAD_BITS
+    buffer.append(value)
+
+
+def _read_varints(data: bytes) -> list[int]:
+    values = []
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & VARINT_CONTINUE:
+            shift += VARINT_PAYLOAD_BITS
+        else:
+            values.append(value)
+            value = shift = 0
+    return values
+
+
+def encode_ordering(ordering: list[tuple[ObjectId, int]]) -> dict:
+    """Encode (summoner id, score) pairs sorted by descending score."""
+    scores = bytearray()
+    previous = None
+    for _, score in ordering:
+        _write_varint(scores, score if previous is None else previous - score)
+        previous = score
+    return {
+        "ids": Binary(b"".join(summoner_id.binary for summoner_id, _ in ordering)),
+        "scores": Binary(bytes(scores)),
+    }
+
+
+def decode_ordering(snapshot: dict) -> list[tuple[ObjectId, int]]:
+    ids = snapshot["ids"]
+    ordering = []
+    score = 0
+    for index, delta in enumerate(_read_varints(snapshot["scores"])):
+        score = delta if index == 0 else score - delta
+        start = index * OBJECT_ID_SIZE
+        ordering.append((ObjectId(ids[start : start + OBJECT_ID_SIZE]), score))
+    return ordering
+
+
+async def init_leaderboard_snapshots(db: AsyncIOMotorDatabase) -> None:
+    await db[LEADERBOARD_SNAPSHOTS_COLLECTION].create_indexes(
+        [
+            IndexModel(
+                [("queueType", ASCENDING), ("taken_at", DESCENDING)],
+                name="leaderboard_snapshots_queue_idx",
+            ),
+            IndexModel(
+                [("taken_at", ASCENDING)],
+                expireAfterSeconds=int(
+                    get_settings().leaderboard_snapshots.retention_days * 24 * 3600
+                ),
+                name="leaderboard_snapshots_ttl_idx",
+            ),
+        ]
+    )
+
+
+async def current_ordering(
+    db: AsyncIOMotorDatabase, queue_type: str
+) -> list[tuple[ObjectId, int]]:
+    """Tracked summoners of the queue by descending score, ties by summoner id."""
+    entries = await db.league_entries.find(
+        {"queueType": queue_type},
+        {"ref_summoner": 1, "tier": 1, "rank": 1, "leaguePoints": 1},
+    ).to_list(length=None)
+    ordering = [(entry["ref_summoner"], league_score(entry)) for entry in entries]
+    ordering.sort(key=lambda item: (-item[1], item[0]))
+    return ordering
+
+
+def compute_movement(
+    current: list[tuple[ObjectId, int]], baseline: list[tuple[ObjectId, int]]
+) -> dict[str, dict]:
+    """Movement per summoner id, a positive `positionChange` means it climbed."""
+    previous = {
+        summoner_id: (position, score)
+        for position, (summoner_id, score) in enumerate(baseline, start=1)
+    }
+    movement = {}
+    for position, (summoner_id, score) in enumerate(current, start=1):
+        before = previous.get(summoner_id)
+        movement[str(summoner_id)] = {
+            "position": position,
+            "previousPosition": before[0] if before else None,
+            "positionChange": before[0] - position if before else None,
+            "scoreChange": score - before[1] if before else None,
+        }
+    return movement
+
+
+def _epoch_ms(value: datetime) -> int:
+    return int(value.replace(tzinfo=UTC).timestamp() * 1000)
+
+
+async def take_snapshot(db: AsyncIOMotorDatabase, queue_type: str) -> None:
+    """Store the queue's ordering and replace its precomputed movement."""
+    settings: LeaderboardSnapshots = get_settings().leaderboard_snapshots
+    snapshots = db[LEADERBOARD_SNAPSHOTS_COLLECTION]
+    now = datetime.now(UTC)
+
+    ordering = await current_ordering(db, queue_type)
+    await snapshots.insert_one(
+        {
+            "queueType": queue_type,
+            "taken_at": now,
+            "count": len(ordering),
+            **encode_ordering(ordering),
+        }
+    )
+
+    baseline = await snapshots.find_one(
+        {
+            "queueType": queue_type,
+            "taken_at": {"$lte": now - timedelta(hours=settings.baseline_hours)},
+        },
+        sort=[("taken_at", DESCENDING)],
+    ) or await snapshots.find_one(
+        {"queueType": queue_type}, sort=[("taken_at", ASCENDING)]
+    )
+
+    await db[LEADERBOARD_MOVEMENT_COLLECTION].replace_one(
+        {"_id": queue_type},
+        {
+            # Epoch milliseconds like gameEndTimestamp, Mongo returns naive datetimes
+            "since": _epoch_ms(baseline["taken_at"]),
+            "taken_at": _epoch_ms(now),
+            "summoners": compute_movement(ordering, decode_ordering(baseline)),
+        },
+        upsert=True,
+    )
+
+
+async def get_movement(db: AsyncIOMotorDatabase, queue_type: str) -> dict | None:
+    return await db[LEADERBOARD_MOVEMENT_COLLECTION].find_one({"_id": queue_type})
+
+
+async def snapshot_due(db: AsyncIOMotorDatabase, queue_type: str) -> bool:
+    latest = await db[LEADERBOARD_SNAPSHOTS_COLLECTION].find_one(
+        {"queueType": queue_type}, {"taken_at": 1}, sort=[("taken_at", DESCENDING)]
+    )
+    if latest is None:
+        return True
+    age = datetime.now(UTC) - latest["taken_at"].replace(tzinfo=UTC)
+    return age >= timedelta(seconds=get_settings().leaderboard_snapshots.interval_secs)
+
+
+async def run_leaderboard_snapshotter(db: AsyncIOMotorDatabase) -> None:
+    """Snapshot every queue once per `interval_secs`, across restarts and workers."""
+    settings: LeaderboardSnapshots = get_settings().leaderboard_snapshots
+    owner = ObjectId()
+
+    while True:
+        try:
+            if await acquire_lease(
+                db, SNAPSHOTTER_LEASE_ID, owner, settings.lease_secs
+            ):
+                for queue_type in QUEUE_TYPES:
+                    if await snapshot_due(db, queue_type):
+                        await take_snapshot(db, queue_type)
+        except Exception:
+            logger.exception("Leaderboard snapshot failed")
+        await asyncio.sleep(settings.check_interval_secs)
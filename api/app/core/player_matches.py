@@ -0,0 +1,131 @@
+"""
+Slim per-player match documents, one per (match, tracked participant).
+
+The watcher writes them next to every match it stores (`watcher/player_matches.py`,
+same shape). Matches stored before that are filled in by
+`app.commands.backfill_player_matches`.
+"""
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+from app.core.retention import MATCH_COLLECTIONS
+
+PLAYER_MATCHES_COLLECTION = "player_matches"
+
+# Participant fields copied to the slim document
+PARTICIPANT_FIELDS = [
+    "championId",
+    "win",
+    "kills",
+    "deaths",
+    "assists",
+    "teamPosition",
+    "individualPosition",
+    "gameEndedInEarlySurrender",
+    "goldEarned",
+    "totalMinionsKilled",
+    "totalDamageDealtToChampions",
+    "visionScore",
+]
+
+
+def summoner_puuids(summoner: dict) -> set[str]:
+    """
+    Every puuid of a summoner, the canonical `puuid` and the ones per API key.
+
+    Puuids are encrypted per key and a match carries the ones of the key it
+    was fetched with, which may not be the key the summoner is pinned to.
+    """
+    return {summoner["puuid"], *summoner.get("puuids", {}).values()}
+
+
+def player_match_doc(
+    match: dict, summoner_id: ObjectId, puuid: str, puuids: set[str]
+) -> dict | None:
+    """
+    Slim document of a tracked participant, None if the summoner didn't play.
+
+    The participant is found by any of `puuids`, the document always carries
+    the canonical `puuid` the API resolves summoners with.
+    """
+    for participant in match["info"]["participants"]:
+        if participant["puuid"] in puuids:
+            break
+    else:
+        return None
+
+    return {
+        "matchId": match["metadata"]["matchId"],
+        "puuid": puuid,
+        "ref_summoner": summoner_id,
+        "queueId": match["info"]["queueId"],
+        "gameEndTimestamp": match["info"].get("gameEndTimestamp"),
+        "gameDuration": match["info"].get("gameDuration"),
+        **{field: participant.get(field) for field in PARTICIPANT_FIELDS},
+        "league": participant.get("league"),
+    }
+
+
+async def backfill_player_matches(
+    db: AsyncIOMotorDatabase, batch_size: int = 500
+) -> int:
+    """
+    Upsert the slim documents of all stored matches, archived ones included,
+    returns how many were written.
+
+    Safe to re-run and to run while the watcher writes, both upsert the same
+    documents from the same match.
+    """
+    summoners = {
+        summoner["_id"]: summoner
+        async for summoner in db.summoners.find({}, {"puuid": 1, "puuids": 1})
+    }
+    projection = {
+        "metadata.matchId": 1,
+        "info.queueId": 1,
+        "info.gameEndTimestamp": 1,
+        "info.gameDuration": 1,
+        "info.participants.puuid": 1,
+        "info.participants.league": 1,
+        **{f"info.participants.{field}": 1 for field in PARTICIPANT_FIELDS},
+        "ref_summoners": 1,
+    }
+
+    written = 0
+    operations: list[UpdateOne] = []
+    for collection in MATCH_COLLECTIONS:
+        cursor = (
+            db[collection]
+            .find({"ref_summoners.0": {"$exists": True}}, projection)
+            .batch_size(batch_size)
+        )
+        async for match in cursor:
+            for summoner_id in match["ref_summoners"]:
+                summoner = summoners.get(summoner_id)
+                if summoner is None:
+                    # Deleted, its deletion job detaches it from the match
+                    continue
+                doc = player_match_doc(
+                    match, summoner_id, summoner["puuid"], summoner_puuids(summoner)
+                )
+                if doc is not None:
+                    operations.append(
+                        UpdateOne(
+                            {"matchId": doc["matchId"], "puuid": doc["puuid"]},
+                            {"$set": doc},
+                            upsert=True,
+                        )
+                    )
+            if len(operations) >= batch_size:
+                await db[PLAYER_MATCHES_COLLECTION].bulk_write(
+                    operations, ordered=False
+                )
+                written += len(operations)
+                operations = []
+
+    if operations:
+        await db[PLAYER_MATCHES_COLLECTION].bulk_write(operations, ordered=False)
+        written += len(operations)
+    return written
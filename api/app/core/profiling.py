@@ -0,0 +1,170 @@
+"""
+On-demand sampling profiles of single requests.
+
+A request of the root user (`security.root_username`) with an `X-Profile: 1`
+header is profiled: a background thread samples the stacks of the event loop
+and the worker threads (bcrypt, motor) every `profiling.interval_ms` until the
+response is sent. The samples are stored as folded stacks, the input format of
+flamegraph.pl and speedscope, in the capped `request_profiles` collection and
+the response carries their id in `X-Profile-Id`.
+
+The sampler sees the whole process, so requests running concurrently on the
+same worker show up in the profile too. One request is profiled at a time per
+worker, the header is ignored while another profile runs.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import CollectionInvalid
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import Profiling, get_settings
+from app.core.database import get_database
+from app.core.security.jwt import get_bearer_token, verify_jwt_token
+from app.core.security.principal_cache import get_principal_cache
+
+REQUEST_PROFILES_COLLECTION = "request_profiles"
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+
+class StackSampler:
+    """Counts the folded stacks of all other threads at a fixed interval."""
+
+    def __init__(self, interval_secs: float) -> None:
+        self.interval_secs = interval_secs
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="stack-sampler", daemon=True
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_secs):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self._thread.ident or _is_idle(frame):
+                    continue
+                self.stacks[_fold(names.get(thread_id, str(thread_id)), frame)] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.items())
+
+
+def _is_idle(frame: FrameType) -> bool:
+    """Pool threads waiting for work, the event loop waiting for I/O is kept."""
+    code = frame.f_code
+    # Executor threads block in the C queue below `_worker`
+    return (code.co_name, os.path.basename(code.co_filename)) in {
+        ("wait", "threading.py"),
+        ("_worker", "thread.py"),
+    }
+
+
+def _fold(thread_name: str, frame: FrameType | None) -> str:
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(
+            f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        )
+        frame = frame.f_back
+    # Root first, frames separated by semicolons
+    return ";".join([thread_name, *reversed(frames)])
+
+
+async def init_request_profiles(db: AsyncIOMotorDatabase) -> None:
+    if REQUEST_PROFILES_COLLECTION in await db.list_collection_names():
+        return
+    try:
+        await db.create_collection(
+            REQUEST_PROFILES_COLLECTION,
+            capped=True,
+            size=get_settings().profiling.max_stored_bytes,
+        )
+    except CollectionInvalid:
+        # Created concurrently
+        pass
+
+
+async def _is_root_user(scope: Scope) -> bool:
+    token = get_bearer_token(scope["headers"])
+    if token is None:
+        return False
+    try:
+        user_id = ObjectId(verify_jwt_token(token).sub)
+    except (HTTPException, InvalidId):
+        return False
+
+    user = get_principal_cache().get(user_id)
+    if user is None:
+        user = await get_database().users.find_one({"_id": user_id}, {"email": 1})
+    return user is not None and user["email"] == get_settings().security.root_username
+
+
+class ProfilingMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.settings: Profiling = get_settings().profiling
+        self._running = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or not self.settings.enabled
+            or self._running
+            or (PROFILE_HEADER, b"1") not in scope["headers"]
+            or not await _is_root_user(scope)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = ObjectId()
+
+        async def send_with_profile_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append(PROFILE_ID_HEADER, str(profile_id))
+            await send(message)
+
+        self._running = True
+        sampler = StackSampler(self.settings.interval_ms / 1000)
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            sampler.stop()
+            self._running = False
+            await get_database()[REQUEST_PROFILES_COLLECTION].insert_one(
+                {
+                    "_id": profile_id,
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "query_string": scope["query_string"].decode("latin-1"),
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+                    "interval_ms": self.settings.interval_ms,
+                    "samples": sampler.samples,
+                    "folded": sampler.folded(),
+                    "created_at": time.time(),
+                }
+            )
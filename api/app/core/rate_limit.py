@@ -0,0 +1,306 @@
+"""
+Per-client rate limiting and load shedding.
+
+Every client (user id of a valid bearer token, otherwise its IP address) has a
+token bucket of `rate_limit.burst` tokens refilled at `rate_limit.refill_per_sec`.
+Requests take `RouteRule.cost` tokens and are answered with 429 and
+`Retry-After` when the bucket runs dry. Buckets live in memory per worker, or
+in the `rate_limit_buckets` collection to share them between workers.
+
+Expensive routes additionally share `rate_limit.expensive_concurrency` slots
+per worker, so a burst of aggregations can't take every pooled connection.
+Without a free slot they are answered with 503 right away.
+
+This is a plain ASGI middleware rather than a dependency, so slots are held
+until a streamed response has been sent completely.
+"""
+
+import logging
+import math
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+
+from fastapi import HTTPException, status
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import ASCENDING, IndexModel, ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import RateLimit, get_settings
+from app.core.database import get_database
+from app.core.security.jwt import get_bearer_token, verify_jwt_token
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_BUCKETS_COLLECTION = "rate_limit_buckets"
+
+
+@dataclass(frozen=True)
+class RouteRule:
+    method: str
+    # Matches the path itself and everything below it
+    path: str
+    cost: float
+    # Takes one of the worker's expensive request slots
+    expensive: bool = False
+
+    def matches(self, method: str, path: str) -> bool:
+        return method == self.method and (
+            path == self.path or path.startswith(f"{self.path}/")
+        )
+
+
+# First match wins, other requests cost DEFAULT_COST
+ROUTE_RULES = [
+    RouteRule("GET", "/leaderboard", cost=10, expensive=True),
+    RouteRule("GET", "/matches/export", cost=20, expensive=True),
+    RouteRule("GET", "/metrics/freshness", cost=5, expensive=True),
+    RouteRule("POST", "/summoners/import", cost=20),
+    RouteRule("POST", "/summoners/lookup", cost=2),
+    # Resolves the Riot ID against the Riot API
+    RouteRule("POST", "/summoners", cost=5),
+    # bcrypt
+    RouteRule("POST", "/auth/access-token", cost=5),
+    RouteRule("POST", "/auth/register", cost=5),
+]
+DEFAULT_COST = 1.0
+
+# Docs and the schema are static
+EXEMPT_PATHS = {"/", "/openapi.json", "/docs/oauth2-redirect"}
+
+
+class MemoryTokenBuckets:
+    """Token buckets of one worker, least recently seen clients are dropped first."""
+
+    def __init__(self, burst: float, refill_per_sec: float, max_clients: int) -> None:
+        self.burst = burst
+        self.refill_per_sec = refill_per_sec
+        self.max_clients = max_clients
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def take(self, key: str, cost: float) -> float:
+        """Take `cost` tokens, returns 0 or the seconds until they are available."""
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated_at) * self.refill_per_sec)
+
+        retry_after = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            retry_after = (cost - tokens) / self.refill_per_sec
+
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+
+class MongoTokenBuckets:
+    """
+    Token buckets shared by all workers.
+
+    Refill and take happen in one pipeline update on the server clock, so
+    concurrent requests of a client on different workers can't overspend.
+    """
+
+    def __init__(
+        self, collection: AsyncIOMotorCollection, burst: float, refill_per_sec: float
+    ) -> None:
+        self.collection = collection
+        self.burst = burst
+        self.refill_per_sec = refill_per_sec
+
+    def _pipeline(self, cost: float) -> list[dict]:
+        elapsed_secs = {
+            "$divide": [
+                {"$subtract": ["$$NOW", {"$ifNull": ["$updated_at", "$$NOW"]}]},
+                1000,
+            ]
+        }
+        return [
+            {
+                "$set": {
+                    "available": {
+                        "$min": [
+                            self.burst,
+                            {
+                                "$add": [
+                                    {"$ifNull": ["$tokens", self.burst]},
+                                    {"$multiply": [elapsed_secs, self.refill_per_sec]},
+                                ]
+                            },
+                        ]
+                    }
+                }
+            },
+            {"$set": {"allowed": {"$gte": ["$available", cost]}}},
+            {
+                "$set": {
+                    "tokens": {
+                        "$cond": [
+                            "$allowed",
+                            {"$subtract": ["$available", cost]},
+                            "$available",
+                        ]
+                    },
+                    "updated_at": "$$NOW",
+                    # A bucket left alone this long is full again, same as none
+                    "expires_at": {
+                        "$add": [
+                            "$$NOW",
+                            math.ceil(self.burst / self.refill_per_sec * 1000),
+                        ]
+                    },
+                }
+            },
+            {"$unset": "available"},
+        ]
+
+    async def take(self, key: str, cost: float) -> float:
+        try:
+            bucket = await self.collection.find_one_and_update(
+                {"_id": key},
+                self._pipeline(cost),
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # Upserted concurrently, it exists now
+            bucket = await self.collection.find_one_and_update(
+                {"_id": key},
+                self._pipeline(cost),
+                return_document=ReturnDocument.AFTER,
+            )
+        if bucket["allowed"]:
+            return 0.0
+        return (cost - bucket["tokens"]) / self.refill_per_sec
+
+
+async def init_rate_limit_buckets(db: AsyncIOMotorDatabase) -> None:
+    await db[RATE_LIMIT_BUCKETS_COLLECTION].create_indexes(
+        [
+            IndexModel(
+                [("expires_at", ASCENDING)],
+                expireAfterSeconds=0,
+                name="rate_limit_buckets_ttl_idx",
+            )
+        ]
+    )
+
+
+# Decisions per route since the worker started, see `get_rate_limit_stats`
+_DECISIONS: Counter[tuple[str, str]] = Counter()
+_EXPENSIVE_IN_FLIGHT = 0
+
+
+def get_rate_limit_stats() -> dict:
+    decisions: dict[str, dict[str, int]] = {}
+    for (route, decision), count in _DECISIONS.items():
+        decisions.setdefault(decision, {})[route] = count
+    return {
+        "decisions": decisions,
+        "expensive_in_flight": _EXPENSIVE_IN_FLIGHT,
+    }
+
+
+@lru_cache(maxsize=1)
+def get_token_buckets() -> MemoryTokenBuckets | MongoTokenBuckets:
+    settings: RateLimit = get_settings().rate_limit
+    if settings.store == "mongodb":
+        return MongoTokenBuckets(
+            get_database()[RATE_LIMIT_BUCKETS_COLLECTION],
+            burst=settings.burst,
+            refill_per_sec=settings.refill_per_sec,
+        )
+    return MemoryTokenBuckets(
+        burst=settings.burst,
+        refill_per_sec=settings.refill_per_sec,
+        max_clients=settings.max_clients,
+    )
+
+
+def _client_key(scope: Scope) -> str:
+    token = get_bearer_token(scope["headers"])
+    if token is not None:
+        try:
+            return f"user:{verify_jwt_token(token).sub}"
+        except HTTPException:
+            # Rejected by the endpoint itself, if it needs a user at all
+            pass
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+def _rejection(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        {"detail": detail},
+        status_code=status_code,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class RateLimitMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.settings: RateLimit = get_settings().rate_limit
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        global _EXPENSIVE_IN_FLIGHT
+
+        if (
+            scope["type"] != "http"
+            or not self.settings.enabled
+            or scope["path"] in EXEMPT_PATHS
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        rule = next(
+            (r for r in ROUTE_RULES if r.matches(scope["method"], scope["path"])),
+            None,
+        )
+        route = f"{rule.method} {rule.path}" if rule else "default"
+        expensive = rule is not None and rule.expensive
+
+        if expensive and _EXPENSIVE_IN_FLIGHT >= self.settings.expensive_concurrency:
+            _DECISIONS[route, "shed"] += 1
+            response = _rejection(
+                status.HTTP_503_SERVICE_UNAVAILABLE,
+                "Server busy, retry shortly",
+                self.settings.shed_retry_after_secs,
+            )
+            await response(scope, receive, send)
+            return
+
+        if expensive:
+            _EXPENSIVE_IN_FLIGHT += 1
+        try:
+            cost = min(rule.cost if rule else DEFAULT_COST, self.settings.burst)
+            try:
+                retry_after = await get_token_buckets().take(_client_key(scope), cost)
+            except PyMongoError:
+                # Fail open, a broken limiter must not take the API down with it
+                logger.exception("Rate limit bucket update failed")
+                _DECISIONS[route, "error"] += 1
+                retry_after = 0.0
+
+            if retry_after > 0:
+                _DECISIONS[route, "limited"] += 1
+                response = _rejection(
+                    status.HTTP_429_TOO_MANY_REQUESTS,
+                    "Rate limit exceeded",
+                    retry_after,
+                )
+                await response(scope, receive, send)
+                return
+
+            _DECISIONS[route, "allowed"] += 1
+            await self.app(scope, receive, send)
+        finally:
+            if expensive:
+                _EXPENSIVE_IN_FLIGHT -= 1
@@ -0,0 +1,189 @@
+"""
+Age-based tiering of `matches` into the `matches_archive` collection.
+
+Matches that ended more than `retention.max_age_days` ago are moved to the
+archive in batches of `retention.batch_size`, pausing between batches so the
+watcher's writes aren't starved. The archive is created with its own block
+compressor (zstd by default) and only carries the index deletion jobs need.
+
+`player_matches` stays in the hot tier, so per-player history is unaffected.
+Exports, deletion jobs and the player_matches backfill read both collections.
+The watcher links matches it finds archived there instead of storing them
+again, a match is archived by `metadata.matchId` in case it was anyway.
+One worker of the deployment archives at a time, holding a lease in `metadata`.
+"""
+
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCursor, AsyncIOMotorDatabase
+from pymongo import ASCENDING, DeleteOne, IndexModel, UpdateOne
+from pymongo.errors import CollectionInvalid
+
+from app.core.config import Retention, get_settings
+from app.jobs.base import acquire_lease
+
+logger = logging.getLogger(__name__)
+
+MATCHES_ARCHIVE_COLLECTION = "matches_archive"
+# Hot tier first
+MATCH_COLLECTIONS = ["matches", MATCHES_ARCHIVE_COLLECTION]
+
+ARCHIVER_LEASE_ID = "match_archiver"
+
+
+async def init_matches_archive(db: AsyncIOMotorDatabase) -> None:
+    if MATCHES_ARCHIVE_COLLECTION not in await db.list_collection_names():
+        try:
+            await db.create_collection(
+                MATCHES_ARCHIVE_COLLECTION,
+                storageEngine={
+                    "wiredTiger": {
+                        "configString": (
+                            f"block_compressor={get_settings().retention.compressor}"
+                        )
+                    }
+                },
+            )
+        except CollectionInvalid:
+            # Created concurrently
+            pass
+
+    await db[MATCHES_ARCHIVE_COLLECTION].create_indexes(
+        [
+            # Same as matches_ref_summoners_idx, used by deletion jobs
+            IndexModel(
+                [("ref_summoners", ASCENDING), ("_id", ASCENDING)],
+                name="matches_archive_ref_summoners_idx",
+            ),
+            # Archiving merges by match id, exports drop hot copies through it
+            IndexModel(
+                [("metadata.matchId", ASCENDING)],
+                name="matches_archive_match_id_idx",
+            ),
+        ]
+    )
+
+
+def archive_cutoff_ms(max_age_days: float) -> int:
+    return int((time.time() - max_age_days * 24 * 3600) * 1000)
+
+
+async def archive_batch(db: AsyncIOMotorDatabase, cutoff_ms: int, limit: int) -> int:
+    """
+    Move up to `limit` matches that ended before `cutoff_ms`, returns how many moved.
+
+    A match is merged by `metadata.matchId` into its archived copy, which
+    keeps its first `_id`: the watcher may store a match again, with a new
+    `_id`, while it is archived. It is only removed from `matches` if its
+    `ref_summoners` didn't change meanwhile, otherwise the next batch moves it.
+    """
+    matches = (
+        await db.matches.find({"info.gameEndTimestamp": {"$lt": cutoff_ms}})
+        .sort("info.gameEndTimestamp", 1)
+        .limit(limit)
+        .to_list(length=None)
+    )
+    if not matches:
+        return 0
+
+    archive_operations = []
+    delete_operations = []
+    for match in matches:
+        match_id = match.pop("_id")
+        # None also matches a missing field in the delete filter
+        ref_summoners = match.pop("ref_summoners", None)
+        archive_operations.append(
+            UpdateOne(
+                {"metadata.matchId": match["metadata"]["matchId"]},
+                {
+                    "$setOnInsert": {"_id": match_id, **match},
+                    "$addToSet": {"ref_summoners": {"$each": ref_summoners or []}},
+                },
+                upsert=True,
+            )
+        )
+        delete_operations.append(
+            DeleteOne({"_id": match_id, "ref_summoners": ref_summoners})
+        )
+
+    await db[MATCHES_ARCHIVE_COLLECTION].bulk_write(archive_operations, ordered=False)
+    result = await db.matches.bulk_write(delete_operations, ordered=False)
+    return result.deleted_count
+
+
+async def archive_old_matches(db: AsyncIOMotorDatabase, owner: ObjectId) -> int:
+    """Move every match past the retention age, one throttled batch at a time."""
+    settings: Retention = get_settings().retention
+    cutoff_ms = archive_cutoff_ms(settings.max_age_days)
+    archived = 0
+    while await acquire_lease(db, ARCHIVER_LEASE_ID, owner, settings.lease_secs):
+        moved = await archive_batch(db, cutoff_ms, settings.batch_size)
+        archived += moved
+        if moved < settings.batch_size:
+            break
+        await asyncio.sleep(settings.batch_pause_secs)
+    return archived
+
+
+async def run_match_archiver(db: AsyncIOMotorDatabase) -> None:
+    """Archive old matches every `retention.interval_secs` until cancelled."""
+    settings: Retention = get_settings().retention
+    owner = ObjectId()
+
+    while True:
+        try:
+            archived = await archive_old_matches(db, owner)
+            if archived:
+                logger.info(f"Archived {archived} matches")
+        except Exception:
+            logger.exception("Archiving matches failed")
+        await asyncio.sleep(settings.interval_secs)
+
+
+async def merge_by_id(cursors: list[AsyncIOMotorCursor]) -> AsyncIterator[dict]:
+    """
+    Merge cursors sorted by `_id` into one stream in `_id` order.
+
+    A match archived while it is read can show up in both tiers with the same
+    `_id`, only its first copy is yielded. Copies with different `_id`s are
+    dropped by `drop_duplicate_copies`.
+    """
+    heads: list[dict | None] = [await anext(cursor, None) for cursor in cursors]
+    last_id = None
+    while True:
+        candidates = [i for i, head in enumerate(heads) if head is not None]
+        if not candidates:
+            return
+        index = min(candidates, key=lambda i: heads[i]["_id"])
+        doc = heads[index]
+        heads[index] = await anext(cursors[index], None)
+        if doc["_id"] != last_id:
+            last_id = doc["_id"]
+            yield doc
+
+
+async def drop_duplicate_copies(
+    db: AsyncIOMotorDatabase, matches: list[dict]
+) -> list[dict]:
+    """
+    Drop the copies of matches that are also archived under another `_id`.
+
+    The archived copy with the lowest `_id` is kept, wherever it is in the
+    stream. Needs `metadata.matchId` in the documents, costs one query per call.
+    """
+    match_ids = [match["metadata"]["matchId"] for match in matches]
+    archived: dict[str, ObjectId] = {}
+    async for doc in db[MATCHES_ARCHIVE_COLLECTION].find(
+        {"metadata.matchId": {"$in": match_ids}}, {"metadata.matchId": 1}
+    ):
+        match_id = doc["metadata"]["matchId"]
+        archived[match_id] = min(archived.get(match_id, doc["_id"]), doc["_id"])
+    return [
+        match
+        for match in matches
+        if archived.get(match["metadata"]["matchId"], match["_id"]) == match["_id"]
+    ]
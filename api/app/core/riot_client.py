@@ -1,5 +1,6 @@
 from contextlib import asynccontextmanager
 
+import aiohttp
 import orjson
 from pulsefire.clients import RiotAPIClient
 from pulsefire.middlewares import (
@@ -10,15 +11,38 @@ from pulsefire.middlewares import (
 from pulsefire.ratelimiters import RiotAPIRateLimiter
 
 from app.core.config import get_settings
+from app.core.roster import riot_id_key
+from app.core.timing import riot_timing_middleware
 
+_RIOT_CLIENT: RiotAPIClient | None = None
 
-@asynccontextmanager
-async def get_riot_api_client():
+PLATFORM_TO_REGION = {
+    "br1": "americas",
+    "eun1": "europe",
+    "euw1": "europe",
+    "jp1": "asia",
+    "kr": "asia",
+    "la1": "americas",
+    "la2": "americas",
+    "na1": "americas",
+    "oc1": "sea",
+    "tr1": "europe",
+    "ru": "europe",
+    "ph2": "sea",
+    "sg2": "sea",
+    "th2": "sea",
+    "tw2": "sea",
+    "vn2": "sea",
+}
+
+
+def _build_riot_api_client() -> RiotAPIClient:
     settings = get_settings()
 
-    async with RiotAPIClient(
+    return RiotAPIClient(
         default_headers={"X-Riot-Token": settings.riot.api_key.get_secret_value()},
         middlewares=[
+            riot_timing_middleware(),
             json_response_middleware(orjson.loads),
             http_error_middleware(3),
             rate_limiter_middleware(
@@ -27,5 +51,69 @@ async def get_riot_api_client():
                 )
             ),
         ],
-    ) as client:
+    )
+
+
+@asynccontextmanager
+async def get_riot_api_client():
+    async with _build_riot_api_client() as client:
         yield client
+
+
+async def init_riot_client() -> RiotAPIClient:
+    """
+    Create the application wide Riot client with a pooled keep-alive session.
+
+    The session is attached directly instead of entering the client, because
+    pulsefire's own `__aenter__` does not allow configuring the connector.
+    """
+    global _RIOT_CLIENT
+    if _RIOT_CLIENT is None:
+        settings = get_settings()
+        client = _build_riot_api_client()
+        client.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=settings.riot.http_pool_size,
+                keepalive_timeout=settings.riot.http_keepalive_secs,
+            )
+        )
+        _RIOT_CLIENT = client
+    return _RIOT_CLIENT
+
+
+def get_shared_riot_client() -> RiotAPIClient:
+    if _RIOT_CLIENT is None:
+        raise RuntimeError("Riot client is not initialized, call init_riot_client()")
+    return _RIOT_CLIENT
+
+
+async def close_riot_client() -> None:
+    global _RIOT_CLIENT
+    if _RIOT_CLIENT is not None:
+        if _RIOT_CLIENT.session is not None:
+            await _RIOT_CLIENT.session.close()
+            _RIOT_CLIENT.session = None
+        _RIOT_CLIENT = None
+
+
+async def fetch_new_summoner(
+    client: RiotAPIClient, game_name: str, tag_line: str, platform: str
+) -> dict:
+    """Resolve a Riot ID to the summoner document stored for tracked summoners."""
+    account = await client.get_account_v1_by_riot_id(
+        region=PLATFORM_TO_REGION[platform],
+        game_name=game_name,
+        tag_line=tag_line,
+    )
+    summoner = await client.get_lol_summoner_v4_by_puuid(
+        region=platform, puuid=account["puuid"]
+    )
+
+    return {
+        "gameName": account["gameName"],
+        "tagLine": account["tagLine"],
+        "platform": platform,
+        **summoner,
+        "riot_id_key": riot_id_key(account["gameName"], account["tagLine"]),
+        "initial_rank_fetched": False,
+    }
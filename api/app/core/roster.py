@@ -0,0 +1,47 @@
+from motor.motor_asyncio import AsyncIOMotorClientSession, AsyncIOMotorDatabase
+
+METADATA_COLLECTION = "metadata"
+ROSTER_VERSION_ID = "roster"
+
+# Projection matching `SummonerResponse`, keeps listings small on the wire
+SUMMONER_RESPONSE_PROJECTION = {
+    "_id": 0,
+    "gameName": 1,
+    "tagLine": 1,
+    "platform": 1,
+    "puuid": 1,
+    "profileIconId": 1,
+    "summonerLevel": 1,
+    "revisionDate": 1,
+}
+
+
+def riot_id_key(game_name: str, tag_line: str) -> str:
+    """
+    Case-insensitive `gameName#tagLine`, stored as `riot_id_key` on summoners.
+
+    Indexed for duplicate checks and prefix search, the watcher keeps it in sync
+    when a Riot ID changes.
+    """
+    return f"{game_name}#{tag_line}".casefold()
+
+
+async def get_roster_version(
+    db: AsyncIOMotorDatabase, session: AsyncIOMotorClientSession | None = None
+) -> int:
+    """Version that changes whenever a tracked summoner is added, changed or removed."""
+    doc = await db[METADATA_COLLECTION].find_one(
+        {"_id": ROSTER_VERSION_ID}, session=session
+    )
+    return doc["version"] if doc else 0
+
+
+async def bump_roster_version(
+    db: AsyncIOMotorDatabase, session: AsyncIOMotorClientSession | None = None
+) -> None:
+    await db[METADATA_COLLECTION].update_one(
+        {"_id": ROSTER_VERSION_ID},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        session=session,
+    )
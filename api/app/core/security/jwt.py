@@ -1,4 +1,5 @@
 import time
+from functools import lru_cache
 
 import jwt
 from fastapi import HTTPException, status
@@ -23,12 +24,29 @@ class JWTToken(BaseModel):
     access_token: str
 
 
+class JWTConfig(BaseModel):
+    secret_key: str
+    issuer: str
+    access_token_expire_secs: int
+
+
+@lru_cache(maxsize=1)
+def get_jwt_config() -> JWTConfig:
+    security = get_settings().security
+    return JWTConfig(
+        secret_key=security.jwt_secret_key.get_secret_value(),
+        issuer=security.jwt_issuer,
+        access_token_expire_secs=security.jwt_access_token_expire_secs,
+    )
+
+
 def create_jwt_token(user_id: str) -> JWTToken:
+    config = get_jwt_config()
     iat = int(time.time())
-    exp = iat + get_settings().security.jwt_access_token_expire_secs
+    exp = iat + config.access_token_expire_secs
 
     token_payload = JWTTokenPayload(
-        iss=get_settings().security.jwt_issuer,
+        iss=config.issuer,
         sub=user_id,
         exp=exp,
         iat=iat,
@@ -36,7 +54,7 @@ def create_jwt_token(user_id: str) -> JWTToken:
 
     access_token = jwt.encode(
         token_payload.model_dump(),
-        key=get_settings().security.jwt_secret_key.get_secret_value(),
+        key=config.secret_key,
         algorithm=JWT_ALGORITHM,
     )
 
@@ -51,14 +69,15 @@ def verify_jwt_token(token: str) -> JWTTokenPayload:
     # be major security risk - not validating tokens at all.
     # If unsure, jump into jwt.decode code, make sure tests are passing
     # https://pyjwt.readthedocs.io/en/stable/usage.html#encoding-decoding-tokens-with-hs256
+    config = get_jwt_config()
 
     try:
         raw_payload = jwt.decode(
             token,
-            get_settings().security.jwt_secret_key.get_secret_value(),
+            config.secret_key,
             algorithms=[JWT_ALGORITHM],
             options={"verify_signature": True},
-            issuer=get_settings().security.jwt_issuer,
+            issuer=config.issuer,
         )
     except jwt.InvalidTokenError as e:
         raise HTTPException(
@@ -67,3 +86,12 @@ def verify_jwt_token(token: str) -> JWTTokenPayload:
         )
 
     return JWTTokenPayload(**raw_payload)
+
+
+def get_bearer_token(headers: list[tuple[bytes, bytes]]) -> str | None:
+    """Token of an `Authorization: Bearer` header in raw ASGI headers."""
+    for name, value in headers:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            return token if scheme.lower() == "bearer" and token else None
+    return None
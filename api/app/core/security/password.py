@@ -1,19 +1,106 @@
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+
 import bcrypt
 
 from app.core.config import get_settings
+from app.core.timing import timed
+
+_EXECUTOR: ThreadPoolExecutor | None = None
+_DUMMY_PASSWORD: str | None = None
+
+
+@dataclass
+class PasswordHasherStats:
+    queued: int = 0
+    running: int = 0
+    completed: int = 0
+    max_queue_depth: int = 0
+
+
+_STATS = PasswordHasherStats()
+_STATS_LOCK = threading.Lock()
+
+
+def get_password_executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        _EXECUTOR = ThreadPoolExecutor(
+            max_workers=get_settings().security.password_hash_workers,
+            thread_name_prefix="bcrypt",
+        )
+    return _EXECUTOR
+
+
+def shutdown_password_executor() -> None:
+    global _EXECUTOR
+    if _EXECUTOR is not None:
+        _EXECUTOR.shutdown(wait=False, cancel_futures=True)
+        _EXECUTOR = None
+
 
+def get_password_hasher_stats() -> dict[str, int]:
+    with _STATS_LOCK:
+        return asdict(_STATS)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+
+def _checkpw(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(
         plain_password.encode("utf-8"), hashed_password.encode("utf-8")
     )
 
 
-def get_password_hash(password: str) -> str:
+def _hashpw(password: str) -> str:
     return bcrypt.hashpw(
         password.encode(),
         bcrypt.gensalt(get_settings().security.password_bcrypt_rounds),
     ).decode()
 
 
-DUMMY_PASSWORD = get_password_hash("")
+def _run_tracked(fn, *args):
+    with _STATS_LOCK:
+        _STATS.queued -= 1
+        _STATS.running += 1
+    try:
+        return fn(*args)
+    finally:
+        with _STATS_LOCK:
+            _STATS.running -= 1
+            _STATS.completed += 1
+
+
+def _untrack_cancelled(future: Future) -> None:
+    # a future can only be cancelled before it starts, so _run_tracked never
+    # got to take it off the queue (request cancelled or executor shut down)
+    if future.cancelled():
+        with _STATS_LOCK:
+            _STATS.queued -= 1
+
+
+async def _run_in_executor(fn, *args):
+    # bcrypt releases the GIL, so the pool size is the real concurrency cap
+    with _STATS_LOCK:
+        _STATS.queued += 1
+        _STATS.max_queue_depth = max(_STATS.max_queue_depth, _STATS.queued)
+    future = get_password_executor().submit(_run_tracked, fn, *args)
+    future.add_done_callback(_untrack_cancelled)
+    with timed("bcrypt"):
+        return await asyncio.wrap_future(future)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await _run_in_executor(_checkpw, plain_password, hashed_password)
+
+
+async def get_password_hash(password: str) -> str:
+    return await _run_in_executor(_hashpw, password)
+
+
+async def get_dummy_password_hash() -> str:
+    """Hash used to keep login timing constant for unknown users, built on first use."""
+    global _DUMMY_PASSWORD
+    if _DUMMY_PASSWORD is None:
+        _DUMMY_PASSWORD = await get_password_hash("")
+    return _DUMMY_PASSWORD
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import CursorType
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+PRINCIPAL_INVALIDATIONS_COLLECTION = "principal_invalidations"
+
+
+class PrincipalCache:
+    """
+    Bounded LRU cache of user documents keyed by user id.
+
+    Entries expire after `ttl_secs`, so a user removed by another worker is
+    rejected at the latest one TTL later even without shared invalidation.
+    """
+
+    def __init__(self, max_size: int, ttl_secs: float) -> None:
+        self.max_size = max_size
+        self.ttl_secs = ttl_secs
+        self._entries: OrderedDict[ObjectId, tuple[float, dict]] = OrderedDict()
+
+    def get(self, user_id: ObjectId) -> dict | None:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+
+        expires_at, user = entry
+        if time.monotonic() > expires_at:
+            del self._entries[user_id]
+            return None
+
+        self._entries.move_to_end(user_id)
+        return user
+
+    def set(self, user_id: ObjectId, user: dict) -> None:
+        if self.max_size <= 0:
+            return
+
+        self._entries[user_id] = (time.monotonic() + self.ttl_secs, user)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: ObjectId) -> None:
+        self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+@lru_cache(maxsize=1)
+def get_principal_cache() -> PrincipalCache:
+    settings = get_settings()
+    return PrincipalCache(
+        max_size=settings.security.principal_cache_size,
+        ttl_secs=settings.security.principal_cache_ttl_secs,
+    )
+
+
+async def invalidate_principal(db: AsyncIOMotorDatabase, user_id: ObjectId) -> None:
+    """Drop a user from the local cache and, if enabled, from all other workers."""
+    get_principal_cache().invalidate(user_id)
+
+    if get_settings().security.principal_cache_shared_invalidation:
+        await db[PRINCIPAL_INVALIDATIONS_COLLECTION].insert_one(
+            {"user_id": user_id, "ts": time.time()}
+        )
+
+
+async def init_principal_invalidations(db: AsyncIOMotorDatabase) -> None:
+    """Create the capped collection used to broadcast invalidations."""
+    if PRINCIPAL_INVALIDATIONS_COLLECTION in await db.list_collection_names():
+        return
+
+    await db.create_collection(
+        PRINCIPAL_INVALIDATIONS_COLLECTION, capped=True, size=1024 * 1024
+    )
+    # A tailable cursor dies on an empty capped collection, seed it once
+    await db[PRINCIPAL_INVALIDATIONS_COLLECTION].insert_one(
+        {"user_id": None, "ts": time.time()}
+    )
+
+
+async def watch_principal_invalidations(db: AsyncIOMotorDatabase) -> None:
+    """
+    Tail the capped invalidation collection and evict matching cache entries.
+
+    Runs for the lifetime of the app, one task per worker.
+    """
+    collection = db[PRINCIPAL_INVALIDATIONS_COLLECTION]
+    cache = get_principal_cache()
+
+    while True:
+        cursor = collection.find(
+            {"ts": {"$gte": time.time()}},
+            cursor_type=CursorType.TAILABLE_AWAIT,
+        )
+        try:
+            while cursor.alive:
+                async for invalidation in cursor:
+                    if invalidation["user_id"] is not None:
+                        cache.invalidate(invalidation["user_id"])
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Principal invalidation cursor failed, restarting")
+            # Anything missed while the cursor was down may be stale
+            cache.clear()
+        await asyncio.sleep(1)
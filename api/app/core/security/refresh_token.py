@@ -0,0 +1,89 @@
+import hashlib
+import secrets
+import time
+from datetime import UTC, datetime
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, IndexModel, ReturnDocument
+
+from app.core.config import get_settings
+
+REFRESH_TOKENS_COLLECTION = "refresh_tokens"
+
+
+def hash_refresh_token(refresh_token: str) -> str:
+    # Tokens are random 256 bit values, a fast unsalted hash is sufficient
+    return hashlib.sha256(refresh_token.encode()).hexdigest()
+
+
+async def create_refresh_token(
+    db: AsyncIOMotorDatabase, user_id: ObjectId
+) -> tuple[str, int]:
+    """Store a new refresh token for the user, returns the token and its expiry."""
+    refresh_token = secrets.token_urlsafe(32)
+    exp = int(time.time() + get_settings().security.refresh_token_expire_secs)
+
+    await db[REFRESH_TOKENS_COLLECTION].insert_one(
+        {
+            "user_id": user_id,
+            "token_hash": hash_refresh_token(refresh_token),
+            "exp": exp,
+            # Date copy of `exp` for the TTL index
+            "expires_at": datetime.fromtimestamp(exp, UTC),
+            "used": False,
+        }
+    )
+    return refresh_token, exp
+
+
+async def use_refresh_token(
+    db: AsyncIOMotorDatabase, refresh_token: str
+) -> dict | None:
+    """
+    Mark the token as used and return the document as it was before.
+
+    A returned document with `used` already set means the token was replayed,
+    `None` means it does not exist, both decided with a single query.
+    """
+    return await db[REFRESH_TOKENS_COLLECTION].find_one_and_update(
+        {"token_hash": hash_refresh_token(refresh_token)},
+        {"$set": {"used": True}},
+        return_document=ReturnDocument.BEFORE,
+    )
+
+
+async def init_refresh_tokens(db: AsyncIOMotorDatabase) -> None:
+    collection = db[REFRESH_TOKENS_COLLECTION]
+
+    # Hash tokens stored in plain text before the unique index is built
+    async for legacy in collection.find({"refresh_token": {"$exists": True}}):
+        await collection.update_one(
+            {"_id": legacy["_id"]},
+            {
+                "$set": {
+                    "token_hash": hash_refresh_token(legacy["refresh_token"]),
+                    "expires_at": datetime.fromtimestamp(legacy["exp"], UTC),
+                },
+                "$unset": {"refresh_token": ""},
+            },
+        )
+
+    await collection.create_indexes(
+        [
+            IndexModel(
+                [("token_hash", ASCENDING)],
+                unique=True,
+                name="refresh_tokens_token_hash_idx",
+            ),
+            IndexModel(
+                [("expires_at", ASCENDING)],
+                expireAfterSeconds=0,
+                name="refresh_tokens_ttl_idx",
+            ),
+            IndexModel(
+                [("user_id", ASCENDING), ("used", ASCENDING)],
+                name="refresh_tokens_user_idx",
+            ),
+        ]
+    )
@@ -0,0 +1,122 @@
+"""
+`Server-Timing` headers splitting a request's time into phases.
+
+The middleware puts a `RequestTimings` into a context variable for every
+request. Mongo commands are timed by a pymongo command listener (motor runs
+them in threads with a copy of the caller's context), Riot calls by a
+pulsefire middleware, and serialization and bcrypt by `timed` blocks.
+
+Only time until the response starts is covered, the body of a streamed
+response is produced after the header has been sent.
+"""
+
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from pymongo import monitoring
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import get_settings
+
+
+@dataclass
+class Phase:
+    duration_secs: float = 0.0
+    count: int = 0
+
+
+class RequestTimings:
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.phases: dict[str, Phase] = {}
+        # Mongo commands finish on motor's executor threads
+        self._lock = threading.Lock()
+
+    def add(self, phase: str, duration_secs: float) -> None:
+        with self._lock:
+            entry = self.phases.setdefault(phase, Phase())
+            entry.duration_secs += duration_secs
+            entry.count += 1
+
+    def header(self) -> str:
+        metrics = [
+            f'{name};dur={phase.duration_secs * 1000:.1f};desc="{phase.count}x"'
+            for name, phase in self.phases.items()
+        ]
+        metrics.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(metrics)
+
+
+_REQUEST_TIMINGS: ContextVar[RequestTimings | None] = ContextVar(
+    "request_timings", default=None
+)
+
+
+def record(phase: str, duration_secs: float) -> None:
+    """Add time to a phase of the current request, no-op outside of one."""
+    timings = _REQUEST_TIMINGS.get()
+    if timings is not None:
+        timings.add(phase, duration_secs)
+
+
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(phase, time.perf_counter() - started)
+
+
+class MongoTimingListener(monitoring.CommandListener):
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        record("mongo", event.duration_micros / 1e6)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        record("mongo", event.duration_micros / 1e6)
+
+
+def riot_timing_middleware():
+    """Pulsefire middleware, outermost so rate limiter waits count as Riot time."""
+
+    def constructor(next):
+        async def middleware(invocation):
+            with timed("riot"):
+                return await next(invocation)
+
+        return middleware
+
+    return constructor
+
+
+class ServerTimingMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.enabled = get_settings().profiling.server_timing
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _REQUEST_TIMINGS.set(timings)
+
+        async def send_with_timings(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", timings.header())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timings)
+        finally:
+            _REQUEST_TIMINGS.reset(token)
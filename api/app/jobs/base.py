@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from enum import Enum
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
+
+from app.core.config import get_settings
+from app.core.roster import METADATA_COLLECTION
+
+logger = logging.getLogger(__name__)
+
+
+class JobStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+async def claim_job(collection: AsyncIOMotorCollection) -> dict | None:
+    """
+    Atomically claim the oldest pending job, or a running job whose lease expired.
+
+    An expired lease means the worker that held it crashed or was redeployed,
+    the job is picked up again from its last saved progress.
+    """
+    now = time.time()
+    return await collection.find_one_and_update(
+        {
+            "$or": [
+                {"status": JobStatus.PENDING.value},
+                {"status": JobStatus.RUNNING.value, "lease_until": {"$lt": now}},
+            ]
+        },
+        {
+            "$set": {
+                "status": JobStatus.RUNNING.value,
+                "lease_until": now + get_settings().jobs.lease_secs,
+                "updated_at": now,
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("created_at", 1)],
+        return_document=True,
+    )
+
+
+async def save_job_progress(
+    collection: AsyncIOMotorCollection,
+    job: dict,
+    set_fields: dict,
+    inc_fields: dict | None = None,
+) -> None:
+    """Persist progress and extend the lease of a running job."""
+    now = time.time()
+    update: dict = {
+        "$set": {
+            **set_fields,
+            "lease_until": now + get_settings().jobs.lease_secs,
+            "updated_at": now,
+        }
+    }
+    if inc_fields:
+        update["$inc"] = inc_fields
+    await collection.update_one({"_id": job["_id"]}, update)
+
+
+async def finish_job(
+    collection: AsyncIOMotorCollection,
+    job: dict,
+    status: JobStatus,
+    error: str | None = None,
+) -> None:
+    await collection.update_one(
+        {"_id": job["_id"]},
+        {
+            "$set": {
+                "status": status.value,
+                "error": error,
+                "updated_at": time.time(),
+            },
+            "$unset": {"lease_until": ""},
+        },
+    )
+
+
+async def run_job_worker(
+    collection: AsyncIOMotorCollection,
+    handler: Callable[[dict], Awaitable[None]],
+) -> None:
+    """Claim and run jobs from `collection` until cancelled."""
+    settings = get_settings()
+
+    while True:
+        try:
+            job = await claim_job(collection)
+        except Exception:
+            logger.exception(f"Failed to claim job from {collection.name}")
+            job = None
+
+        if job is None:
+            await asyncio.sleep(settings.jobs.poll_interval_secs)
+            continue
+
+        try:
+            await handler(job)
+        except asyncio.CancelledError:
+            # The lease runs out and another worker resumes the job
+            raise
+        except Exception as e:
+            logger.exception(f"Job {job['_id']} in {collection.name} failed")
+            if job.get("attempts", 1) >= settings.jobs.max_attempts:
+                await finish_job(collection, job, JobStatus.FAILED, error=str(e))
+            else:
+                await collection.update_one(
+                    {"_id": job["_id"]},
+                    {
+                        "$set": {
+                            "status": JobStatus.PENDING.value,
+                            "error": str(e),
+                            "updated_at": time.time(),
+                        },
+                        "$unset": {"lease_until": ""},
+                    },
+                )
+
+
+async def acquire_lease(
+    db: AsyncIOMotorDatabase, lease_id: str, owner: ObjectId, lease_secs: float
+) -> bool:
+    """
+    Take or extend the lease `lease_id` in `metadata`, False while another holds it.
+
+    Keeps periodic tasks that every worker starts to one worker at a time.
+    """
+    now = time.time()
+    try:
+        await db[METADATA_COLLECTION].update_one(
+            {"_id": lease_id, "$or": [{"owner": owner}, {"lease_until": {"$lt": now}}]},
+            {"$set": {"owner": owner, "lease_until": now + lease_secs}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # The lease exists and belongs to someone else
+        return False
+    return True
@@ -0,0 +1,138 @@
+import time
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+from app.core.config import get_settings
+from app.core.player_matches import PLAYER_MATCHES_COLLECTION, summoner_puuids
+from app.core.retention import MATCHES_ARCHIVE_COLLECTION
+from app.core.roster import bump_roster_version
+from app.jobs.base import JobStatus, finish_job, save_job_progress
+
+SUMMONER_DELETION_JOBS_COLLECTION = "summoner_deletion_jobs"
+
+
+async def create_summoner_deletion_job(
+    db: AsyncIOMotorDatabase, summoner_doc: dict
+) -> dict:
+    now = time.time()
+    job = {
+        "summoner_id": summoner_doc["_id"],
+        "puuid": summoner_doc["puuid"],
+        "puuids": sorted(summoner_puuids(summoner_doc)),
+        "status": JobStatus.PENDING.value,
+        "attempts": 0,
+        "last_match_id": None,
+        "last_archived_match_id": None,
+        "matches_processed": 0,
+        "matches_deleted": 0,
+        "league_entries_deleted": 0,
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+    result = await db[SUMMONER_DELETION_JOBS_COLLECTION].insert_one(job)
+    job["_id"] = result.inserted_id
+    return job
+
+
+async def _detach_matches(
+    db: AsyncIOMotorDatabase,
+    job: dict,
+    matches: AsyncIOMotorCollection,
+    progress_field: str,
+) -> None:
+    """Detach the summoner from the matches of one tier, resuming at `progress_field`."""
+    jobs = db[SUMMONER_DELETION_JOBS_COLLECTION]
+    batch_size = get_settings().jobs.summoner_deletion_batch_size
+    summoner_id: ObjectId = job["summoner_id"]
+    last_match_id: ObjectId | None = job.get(progress_field)
+
+    while True:
+        query: dict = {"ref_summoners": summoner_id}
+        if last_match_id is not None:
+            query["_id"] = {"$gt": last_match_id}
+
+        batch = (
+            await matches.find(query, {"_id": 1})
+            .sort("_id", 1)
+            .limit(batch_size)
+            .to_list(length=None)
+        )
+        if not batch:
+            break
+
+        match_ids = [match["_id"] for match in batch]
+
+        # Detach the summoner and drop its league snapshot from the participant
+        await matches.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": match_id},
+                    {
+                        "$pull": {"ref_summoners": summoner_id},
+                        "$unset": {"info.participants.$[participant].league": ""},
+                    },
+                    # Jobs created before puuids were kept per key only have `puuid`
+                    array_filters=[
+                        {
+                            "participant.puuid": {
+                                "$in": job.get("puuids") or [job["puuid"]]
+                            }
+                        }
+                    ],
+                )
+                for match_id in match_ids
+            ],
+            ordered=False,
+        )
+
+        # Delete the matches no other tracked summoner references anymore
+        delete_result = await matches.delete_many(
+            {"_id": {"$in": match_ids}, "ref_summoners": {"$size": 0}}
+        )
+
+        last_match_id = match_ids[-1]
+        await save_job_progress(
+            jobs,
+            job,
+            {progress_field: last_match_id},
+            {
+                "matches_processed": len(match_ids),
+                "matches_deleted": delete_result.deleted_count,
+            },
+        )
+
+
+async def process_summoner_deletion(db: AsyncIOMotorDatabase, job: dict) -> None:
+    """
+    Remove a summoner and every reference to it, one batch of matches at a time.
+
+    Matches are walked in `_id` order and the last processed id is saved after
+    each batch, so a resumed job continues where the previous attempt stopped.
+    Every step is idempotent, re-running a partially applied batch is safe.
+    """
+    jobs = db[SUMMONER_DELETION_JOBS_COLLECTION]
+    summoner_id: ObjectId = job["summoner_id"]
+
+    # Stop the watcher from picking the summoner up again, no-op when resumed
+    result = await db.summoners.delete_one({"_id": summoner_id})
+    if result.deleted_count:
+        await bump_roster_version(db)
+
+    # Archived matches after the hot ones, a match archived meanwhile is still seen
+    for collection, progress_field in (
+        ("matches", "last_match_id"),
+        (MATCHES_ARCHIVE_COLLECTION, "last_archived_match_id"),
+    ):
+        await _detach_matches(db, job, db[collection], progress_field)
+
+    await db[PLAYER_MATCHES_COLLECTION].delete_many(
+        {"puuid": job["puuid"], "ref_summoner": summoner_id}
+    )
+    league_result = await db.league_entries.delete_many({"ref_summoner": summoner_id})
+    await save_job_progress(
+        jobs, job, {"league_entries_deleted": league_result.deleted_count}
+    )
+    await finish_job(jobs, job, JobStatus.DONE)
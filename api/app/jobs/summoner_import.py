@@ -0,0 +1,183 @@
+import asyncio
+import time
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pulsefire.clients import RiotAPIClient
+from pymongo.errors import BulkWriteError
+
+from app.core.config import get_settings
+from app.core.events import publish_event, summoner_added_event
+from app.core.riot_client import fetch_new_summoner
+from app.core.roster import bump_roster_version, riot_id_key
+from app.jobs.base import JobStatus, finish_job, save_job_progress
+
+SUMMONER_IMPORT_JOBS_COLLECTION = "summoner_import_jobs"
+
+# Per-entry outcomes
+ENTRY_PENDING = "pending"
+ENTRY_ADDED = "added"
+ENTRY_EXISTS = "exists"
+ENTRY_DUPLICATE = "duplicate"
+ENTRY_FAILED = "failed"
+
+
+def _riot_id_key(entry: dict) -> tuple[str, str]:
+    return riot_id_key(entry["game_name"], entry["tag_line"]), entry["platform"]
+
+
+async def create_summoner_import_job(
+    db: AsyncIOMotorDatabase, entries: list[dict]
+) -> dict:
+    """
+    Store an import job, marking repeated Riot IDs within the request as duplicates.
+
+    `entries` are dicts with `game_name`, `tag_line` and `platform`.
+    """
+    seen: set[tuple[str, str]] = set()
+    results = []
+    for entry in entries:
+        key = _riot_id_key(entry)
+        results.append(
+            {
+                **entry,
+                "status": ENTRY_DUPLICATE if key in seen else ENTRY_PENDING,
+                "puuid": None,
+                "error": None,
+            }
+        )
+        seen.add(key)
+
+    now = time.time()
+    job = {
+        "status": JobStatus.PENDING.value,
+        "attempts": 0,
+        "results": results,
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+    result = await db[SUMMONER_IMPORT_JOBS_COLLECTION].insert_one(job)
+    job["_id"] = result.inserted_id
+    return job
+
+
+async def _mark_existing(db: AsyncIOMotorDatabase, entries: list[dict]) -> None:
+    """Flag entries already tracked, with a single case-insensitive query."""
+    keys = [_riot_id_key(entry) for entry in entries]
+    existing = await db.summoners.find(
+        {"$or": [{"riot_id_key": key, "platform": platform} for key, platform in keys]},
+        {"riot_id_key": 1, "platform": 1, "puuid": 1},
+    ).to_list(length=None)
+
+    existing_keys = {(doc["riot_id_key"], doc["platform"]): doc for doc in existing}
+    for entry, key in zip(entries, keys, strict=True):
+        doc = existing_keys.get(key)
+        if doc is not None:
+            entry["status"] = ENTRY_EXISTS
+            entry["puuid"] = doc["puuid"]
+
+
+async def _resolve_entries(
+    riot_client: RiotAPIClient, entries: list[dict]
+) -> list[dict]:
+    """Resolve entries concurrently, bounded so the rate limiter queue stays short."""
+    semaphore = asyncio.Semaphore(get_settings().jobs.summoner_import_concurrency)
+
+    async def resolve(entry: dict) -> dict | None:
+        async with semaphore:
+            try:
+                return await fetch_new_summoner(
+                    riot_client,
+                    game_name=entry["game_name"],
+                    tag_line=entry["tag_line"],
+                    platform=entry["platform"],
+                )
+            except Exception as e:
+                entry["status"] = ENTRY_FAILED
+                entry["error"] = str(e)
+                return None
+
+    return await asyncio.gather(*(resolve(entry) for entry in entries))
+
+
+async def _insert_resolved(
+    db: AsyncIOMotorDatabase, entries: list[dict], summoners: list[dict | None]
+) -> None:
+    resolved = [
+        (entry, summoner)
+        for entry, summoner in zip(entries, summoners, strict=True)
+        if summoner is not None
+    ]
+    if not resolved:
+        return
+
+    # Riot IDs may differ in spelling but resolve to an already tracked puuid
+    puuids = [summoner["puuid"] for _, summoner in resolved]
+    tracked_puuids = {
+        doc["puuid"]
+        for doc in await db.summoners.find(
+            {"puuid": {"$in": puuids}}, {"puuid": 1}
+        ).to_list(length=None)
+    }
+
+    to_insert = []
+    seen_puuids: set[str] = set()
+    for entry, summoner in resolved:
+        entry["puuid"] = summoner["puuid"]
+        if summoner["puuid"] in tracked_puuids:
+            entry["status"] = ENTRY_EXISTS
+        elif summoner["puuid"] in seen_puuids:
+            entry["status"] = ENTRY_DUPLICATE
+        else:
+            entry["status"] = ENTRY_ADDED
+            seen_puuids.add(summoner["puuid"])
+            to_insert.append((entry, summoner))
+
+    if not to_insert:
+        return
+
+    try:
+        await db.summoners.insert_many(
+            [summoner for _, summoner in to_insert], ordered=False
+        )
+    except BulkWriteError as e:
+        for write_error in e.details.get("writeErrors", []):
+            entry = to_insert[write_error["index"]][0]
+            entry["status"] = ENTRY_FAILED
+            entry["error"] = write_error.get("errmsg")
+
+    await bump_roster_version(db)
+    for entry, summoner in to_insert:
+        if entry["status"] == ENTRY_ADDED:
+            await publish_event(db, summoner_added_event(summoner))
+
+
+async def process_summoner_import(
+    db: AsyncIOMotorDatabase, riot_client: RiotAPIClient, job: dict
+) -> None:
+    """
+    Resolve and insert the pending entries of an import job chunk by chunk.
+
+    Outcomes are saved after every chunk, a resumed job only handles the
+    entries still pending.
+    """
+    jobs = db[SUMMONER_IMPORT_JOBS_COLLECTION]
+    chunk_size = get_settings().jobs.summoner_import_chunk_size
+    results: list[dict] = job["results"]
+    pending = [i for i, entry in enumerate(results) if entry["status"] == ENTRY_PENDING]
+
+    for start in range(0, len(pending), chunk_size):
+        indexes = pending[start : start + chunk_size]
+        entries = [results[i] for i in indexes]
+
+        await _mark_existing(db, entries)
+        to_resolve = [entry for entry in entries if entry["status"] == ENTRY_PENDING]
+        if to_resolve:
+            summoners = await _resolve_entries(riot_client, to_resolve)
+            await _insert_resolved(db, to_resolve, summoners)
+
+        await save_job_progress(
+            jobs, job, {f"results.{i}": results[i] for i in indexes}
+        )
+
+    await finish_job(jobs, job, JobStatus.DONE)
@@ -1,4 +1,6 @@
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from functools import partial
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -6,14 +8,87 @@ from fastapi.middleware.trustedhost import TrustedHostMiddleware
 
 from app.api.api_router import api_router, auth_router
 from app.core.config import get_settings
-from app.core.database import close_mongo_connection, init_db
+from app.core.database import close_mongo_connection, get_database, init_db
+from app.core.events import get_event_broker, init_events_outbox
+from app.core.leaderboard_snapshots import (
+    init_leaderboard_snapshots,
+    run_leaderboard_snapshotter,
+)
+from app.core.profiling import ProfilingMiddleware, init_request_profiles
+from app.core.rate_limit import RateLimitMiddleware, init_rate_limit_buckets
+from app.core.retention import init_matches_archive, run_match_archiver
+from app.core.riot_client import (
+    close_riot_client,
+    get_shared_riot_client,
+    init_riot_client,
+)
+from app.core.security.password import shutdown_password_executor
+from app.core.security.principal_cache import (
+    init_principal_invalidations,
+    watch_principal_invalidations,
+)
+from app.core.timing import ServerTimingMiddleware
+from app.jobs.base import run_job_worker
+from app.jobs.summoner_deletion import (
+    SUMMONER_DELETION_JOBS_COLLECTION,
+    process_summoner_deletion,
+)
+from app.jobs.summoner_import import (
+    SUMMONER_IMPORT_JOBS_COLLECTION,
+    process_summoner_import,
+)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    await init_riot_client()
+
+    db = get_database()
+    if get_settings().events.source == "outbox":
+        await init_events_outbox(db)
+    if get_settings().rate_limit.store == "mongodb":
+        await init_rate_limit_buckets(db)
+    if get_settings().profiling.enabled:
+        await init_request_profiles(db)
+    if get_settings().retention.enabled:
+        await init_matches_archive(db)
+    if get_settings().leaderboard_snapshots.enabled:
+        await init_leaderboard_snapshots(db)
+
+    background_tasks = [
+        asyncio.create_task(
+            run_job_worker(
+                db[SUMMONER_DELETION_JOBS_COLLECTION],
+                partial(process_summoner_deletion, db),
+            )
+        ),
+        asyncio.create_task(
+            run_job_worker(
+                db[SUMMONER_IMPORT_JOBS_COLLECTION],
+                partial(process_summoner_import, db, get_shared_riot_client()),
+            )
+        ),
+        asyncio.create_task(get_event_broker().run()),
+    ]
+    if get_settings().security.principal_cache_shared_invalidation:
+        await init_principal_invalidations(db)
+        background_tasks.append(asyncio.create_task(watch_principal_invalidations(db)))
+    if get_settings().retention.enabled:
+        background_tasks.append(asyncio.create_task(run_match_archiver(db)))
+    if get_settings().leaderboard_snapshots.enabled:
+        background_tasks.append(asyncio.create_task(run_leaderboard_snapshotter(db)))
+
     yield
+
+    for task in background_tasks:
+        task.cancel()
+    for task in background_tasks:
+        with suppress(asyncio.CancelledError):
+            await task
+    await close_riot_client()
     await close_mongo_connection()
+    shutdown_password_executor()
 
 
 app = FastAPI(
@@ -28,6 +103,13 @@ app = FastAPI(
 app.include_router(auth_router)
 app.include_router(api_router)
 
+# Profiles and timings only cover requests that passed the rate limits
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(ServerTimingMiddleware)
+
+# Inside CORS, so rejections still get CORS headers
+app.add_middleware(RateLimitMiddleware)
+
 # Sets all CORS enabled origins
 app.add_middleware(
     CORSMiddleware,
@@ -38,6 +120,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After", "Server-Timing", "X-Profile-Id"],
 )
 
 # Guards against HTTP Host Header attacks
@@ -1,6 +1,6 @@
 from enum import Enum
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 
 
 class Platform(str, Enum):
@@ -32,6 +32,11 @@ class QueueId(int, Enum):
     FLEX = 440
 
 
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    PARQUET = "parquet"
+
+
 class BaseRequest(BaseModel):
     pass
 
@@ -53,3 +58,24 @@ class AddSummonerRequest(BaseModel):
     game_name: str
     tag_line: str
     platform: Platform
+
+
+class ImportSummonersRequest(BaseRequest):
+    summoners: list[AddSummonerRequest]
+
+
+class LookupSummonersRequest(BaseRequest):
+    puuids: list[str] = Field(min_length=1, max_length=1000)
+
+
+class MatchExportQuery(BaseRequest):
+    format: ExportFormat = ExportFormat.NDJSON
+    columns: str | None = Field(
+        default=None,
+        description="Comma separated columns, participant fields may be dotted like `league.tier`",
+    )
+    start: int | None = Field(default=None, description="Min gameEndTimestamp (ms)")
+    end: int | None = Field(default=None, description="Max gameEndTimestamp (ms)")
+    queues: list[int] = []
+    tracked_only: bool = False
+    watermark: str | None = None
@@ -26,3 +26,70 @@ class SummonerResponse(BaseModel):
     profileIconId: int
     summonerLevel: int
     revisionDate: int
+
+
+class SummonerDeletionJobResponse(BaseResponse):
+    job_id: str
+    puuid: str
+    status: str
+    matches_processed: int
+    matches_deleted: int
+    league_entries_deleted: int
+    error: str | None = None
+    created_at: float
+    updated_at: float
+
+
+class SummonerImportEntryResponse(BaseResponse):
+    game_name: str
+    tag_line: str
+    platform: str
+    status: str
+    puuid: str | None = None
+    error: str | None = None
+
+
+class SummonerImportJobResponse(BaseResponse):
+    job_id: str
+    status: str
+    total: int
+    counts: dict[str, int]
+    results: list[SummonerImportEntryResponse]
+    error: str | None = None
+    created_at: float
+    updated_at: float
+
+
+class IngestionLagResponse(BaseResponse):
+    window: str
+    # None for the row covering every platform
+    platform: str | None = None
+    count: int
+    p50_ms: float
+    p90_ms: float
+    p99_ms: float
+    max_ms: int
+
+
+class StaleSummonerResponse(BaseResponse):
+    gameName: str
+    tagLine: str
+    platform: str
+    puuid: str
+    last_checked_at: float | None = None
+
+
+class FreshnessResponse(BaseResponse):
+    lag: list[IngestionLagResponse]
+    stalest_summoners: list[StaleSummonerResponse]
+
+
+class RequestProfileResponse(BaseResponse):
+    profile_id: str
+    method: str
+    path: str
+    query_string: str
+    duration_ms: float
+    interval_ms: float
+    samples: int
+    created_at: float
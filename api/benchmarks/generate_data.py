@@ -0,0 +1,244 @@
+"""
+Bulk-load a synthetic roster into the local MongoDB.
+
+Usage (from the `api` directory):
+    uv run python -m benchmarks.generate_data --summoners 200 --matches 20000 --drop
+
+Creates tracked summoners, their solo/flex `league_entries`, match-v5 shaped
+`matches` referencing them and the `player_matches` of every tracked
+participant, the same shape the watcher writes.
+"""
+
+import argparse
+import asyncio
+import random
+import secrets
+import time
+
+from app.core.config import get_settings
+from app.core.database import close_mongo_connection, get_database, init_db
+from app.core.player_matches import PLAYER_MATCHES_COLLECTION, player_match_doc
+from app.schemas.requests import Platform
+
+TIERS = [
+    "IRON",
+    "BRONZE",
+    "SILVER",
+    "GOLD",
+    "PLATINUM",
+    "EMERALD",
+    "DIAMOND",
+    "MASTER",
+    "GRANDMASTER",
+    "CHALLENGER",
+]
+RANKS = ["IV", "III", "II", "I"]
+POSITIONS = ["TOP", "JUNGLE", "MIDDLE", "BOTTOM", "UTILITY"]
+QUEUES = {
+    420: "RANKED_SOLO_5x5",
+    440: "RANKED_FLEX_SR",
+    400: None,  # Normal draft, not enriched with league info
+}
+
+BATCH_SIZE = 1000
+TEAM_SIZE = len(POSITIONS)
+
+
+def random_puuid() -> str:
+    return secrets.token_urlsafe(58)[:78]
+
+
+def make_summoner(index: int) -> dict:
+    return {
+        "gameName": f"Bench{index}",
+        "tagLine": "BENCH",
+        "platform": Platform.euw1.value,
+        "puuid": random_puuid(),
+        "id": secrets.token_urlsafe(36)[:47],
+        "accountId": secrets.token_urlsafe(42)[:56],
+        "profileIconId": random.randint(1, 6000),
+        "summonerLevel": random.randint(30, 800),
+        "revisionDate": int(time.time() * 1000),
+        "initial_rank_fetched": True,
+    }
+
+
+def make_league(queue_type: str) -> dict:
+    tier = random.choice(TIERS)
+    return {
+        "leagueId": secrets.token_hex(16),
+        "queueType": queue_type,
+        "tier": tier,
+        "rank": "I"
+        if tier in ("MASTER", "GRANDMASTER", "CHALLENGER")
+        else random.choice(RANKS),
+        "leaguePoints": random.randint(0, 100),
+        "wins": random.randint(0, 300),
+        "losses": random.randint(0, 300),
+        "hotStreak": False,
+        "veteran": False,
+        "freshBlood": False,
+        "inactive": False,
+    }
+
+
+def make_participant(puuid: str, index: int, win: bool, padding: int) -> dict:
+    participant = {
+        "puuid": puuid,
+        "participantId": index + 1,
+        "teamId": 100 if index < TEAM_SIZE else 200,
+        "championId": random.randint(1, 950),
+        "win": win,
+        "kills": random.randint(0, 20),
+        "deaths": random.randint(0, 15),
+        "assists": random.randint(0, 30),
+        "teamPosition": POSITIONS[index % TEAM_SIZE],
+        "individualPosition": POSITIONS[index % TEAM_SIZE],
+        "gameEndedInEarlySurrender": False,
+        "goldEarned": random.randint(5000, 20000),
+        "totalDamageDealtToChampions": random.randint(5000, 60000),
+        "visionScore": random.randint(0, 100),
+    }
+    # Real payloads carry hundreds of stats per participant
+    participant["challenges"] = {f"stat{i}": random.random() for i in range(padding)}
+    return participant
+
+
+def make_match(summoners: list[dict], padding: int, max_age_days: int) -> dict:
+    queue_id = random.choice(list(QUEUES))
+    tracked = random.sample(summoners, k=min(len(summoners), random.randint(1, 3)))
+    puuids = [s["puuid"] for s in tracked] + [
+        random_puuid() for _ in range(2 * TEAM_SIZE - len(tracked))
+    ]
+    random.shuffle(puuids)
+
+    game_end = int((time.time() - random.uniform(0, max_age_days * 86400)) * 1000)
+    duration = random.randint(900, 2400)
+    winning_team = random.choice((100, 200))
+    participants = [
+        make_participant(
+            puuid, i, (100 if i < TEAM_SIZE else 200) == winning_team, padding
+        )
+        for i, puuid in enumerate(puuids)
+    ]
+
+    tracked_puuids = {s["puuid"] for s in tracked}
+    if QUEUES[queue_id] is not None:
+        for participant in participants:
+            if participant["puuid"] in tracked_puuids:
+                league = make_league(QUEUES[queue_id])
+                participant["league"] = {
+                    "leaguePoints": league["leaguePoints"],
+                    "tier": league["tier"],
+                    "rank": league["rank"],
+                }
+
+    match_id = f"EUW1_{random.randint(10**9, 10**10)}"
+    return {
+        "metadata": {
+            "dataVersion": "2",
+            "matchId": match_id,
+            "participants": puuids,
+        },
+        "info": {
+            "gameId": int(match_id.split("_")[1]),
+            "queueId": queue_id,
+            "platformId": "EUW1",
+            "gameCreation": game_end - duration * 1000 - 60000,
+            "gameStartTimestamp": game_end - duration * 1000,
+            "gameEndTimestamp": game_end,
+            "gameDuration": duration,
+            "gameMode": "CLASSIC",
+            "gameType": "MATCHED_GAME",
+            "mapId": 11,
+            "participants": participants,
+        },
+        "ref_summoners": [s["_id"] for s in tracked],
+    }
+
+
+async def generate(args: argparse.Namespace) -> None:
+    await init_db()
+    db = get_database()
+
+    if args.drop:
+        for name in (
+            "summoners",
+            "league_entries",
+            "matches",
+            PLAYER_MATCHES_COLLECTION,
+        ):
+            await db[name].delete_many({})
+        await init_db()
+
+    summoners = [make_summoner(i) for i in range(args.summoners)]
+    result = await db.summoners.insert_many(summoners)
+    for summoner, inserted_id in zip(summoners, result.inserted_ids, strict=True):
+        summoner["_id"] = inserted_id
+
+    league_entries = [
+        {**make_league(queue_type), "ref_summoner": summoner["_id"]}
+        for summoner in summoners
+        for queue_type in ("RANKED_SOLO_5x5", "RANKED_FLEX_SR")
+    ]
+    await db.league_entries.insert_many(league_entries)
+
+    puuids = {summoner["_id"]: summoner["puuid"] for summoner in summoners}
+    player_matches = 0
+    started = time.perf_counter()
+    for start in range(0, args.matches, BATCH_SIZE):
+        batch = [
+            make_match(summoners, args.participant_stats, args.max_age_days)
+            for _ in range(min(BATCH_SIZE, args.matches - start))
+        ]
+        await db.matches.insert_many(batch, ordered=False)
+        # The leaderboard's recent games are joined from player_matches
+        player_match_docs = [
+            player_match_doc(
+                match, summoner_id, puuids[summoner_id], {puuids[summoner_id]}
+            )
+            for match in batch
+            for summoner_id in match["ref_summoners"]
+        ]
+        await db[PLAYER_MATCHES_COLLECTION].insert_many(
+            player_match_docs, ordered=False
+        )
+        player_matches += len(player_match_docs)
+        print(f"\r{start + len(batch)}/{args.matches} matches", end="", flush=True)
+
+    print(
+        f"\nInserted {len(summoners)} summoners, {len(league_entries)} league entries, "
+        f"{args.matches} matches and {player_matches} player matches "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+    await close_mongo_connection()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic dataset")
+    parser.add_argument("--summoners", type=int, default=100)
+    parser.add_argument("--matches", type=int, default=10000)
+    parser.add_argument(
+        "--participant-stats",
+        type=int,
+        default=120,
+        help="Padding stats per participant to mimic real document sizes",
+    )
+    parser.add_argument("--max-age-days", type=int, default=60)
+    parser.add_argument(
+        "--drop",
+        action="store_true",
+        help="Remove summoners, leagues, matches and player matches first",
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    if get_settings().env == "PROD":
+        parser.error("Refusing to generate synthetic data with ENV=PROD")
+
+    random.seed(args.seed)
+    asyncio.run(generate(args))
+
+
+if __name__ == "__main__":
+    main()
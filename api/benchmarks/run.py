@@ -0,0 +1,383 @@
+"""
+Drive API endpoints at fixed concurrency levels and report latency percentiles.
+
+Usage (from the `api` directory, after `benchmarks.generate_data`):
+    uv run python -m benchmarks.run --concurrency 1,10,50 --requests 500
+    uv run python -m benchmarks.run --url http://localhost:8000 --scenarios leaderboard
+    uv run python -m benchmarks.run --save baseline.json
+    uv run python -m benchmarks.run --baseline baseline.json --max-regression 0.2
+    uv run python -m benchmarks.run --scenarios leaderboard,leaderboard_during_login
+
+Without `--url` the app runs in-process through its ASGI interface, so the
+numbers exclude uvicorn and the network. Mongo ops per request are taken from
+the `serverStatus` opcounters delta, which includes the watcher if it runs.
+
+The in-process app runs without rate limiting unless `--rate-limit` is given,
+all requests come from one token and would be limited and shed. Start a server
+given with `--url` with `RATE_LIMIT__ENABLED=false`. Rate limited (429) and
+shed (503) requests are counted apart from errors.
+
+Mixed scenarios run a background scenario at the same concurrency while the
+measured one runs, e.g. `leaderboard_during_login` reports the leaderboard's
+latency during a burst of bcrypt logins, to compare with plain `leaderboard`.
+Their Mongo ops per request include the background requests.
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass
+from http import HTTPStatus
+from urllib.parse import urlencode, urlsplit
+
+import aiohttp
+import orjson
+
+from app.core.config import get_settings
+from app.core.database import get_database
+from app.main import app
+
+# (status, body) of a single request
+Sender = Callable[[str, str, dict[str, str], bytes], Awaitable[tuple[int, bytes]]]
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: str
+    authenticated: bool = True
+    form: dict[str, str] | None = None
+
+
+@dataclass
+class Result:
+    scenario: str
+    concurrency: int
+    requests: int
+    errors: int
+    limited: int
+    shed: int
+    throughput_rps: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    mongo_ops_per_request: float
+
+
+@dataclass
+class MixedScenario:
+    name: str
+    # Reported
+    measured: str
+    # Runs alongside, its results are dropped
+    background: str
+
+
+MIXED_SCENARIOS = {
+    scenario.name: scenario
+    for scenario in [MixedScenario("leaderboard_during_login", "leaderboard", "login")]
+}
+
+
+def get_scenarios() -> dict[str, Scenario]:
+    security = get_settings().security
+    return {
+        scenario.name: scenario
+        for scenario in [
+            Scenario("leaderboard", "GET", "/leaderboard?queue_type=RANKED_SOLO_5x5"),
+            Scenario(
+                "leaderboard_flex", "GET", "/leaderboard?queue_type=RANKED_FLEX_SR"
+            ),
+            Scenario("summoners", "GET", "/summoners"),
+            Scenario("users_me", "GET", "/users/me"),
+            Scenario(
+                "login",
+                "POST",
+                "/auth/access-token",
+                authenticated=False,
+                form={
+                    "username": security.root_username,
+                    "password": security.root_password.get_secret_value(),
+                },
+            ),
+        ]
+    }
+
+
+def asgi_sender(app) -> Sender:
+    async def send_request(
+        method: str, path: str, headers: dict[str, str], body: bytes
+    ) -> tuple[int, bytes]:
+        url = urlsplit(path)
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": url.path,
+            "raw_path": url.path.encode(),
+            "root_path": "",
+            "query_string": url.query.encode(),
+            "headers": [(b"host", b"localhost")]
+            + [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+            "client": ("127.0.0.1", 0),
+            "server": ("localhost", 80),
+        }
+        request_sent = False
+        response: dict = {"status": 0, "body": b""}
+
+        async def receive() -> dict:
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await asyncio.Event().wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message: dict) -> None:
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["body"] += message.get("body", b"")
+
+        await app(scope, receive, send)
+        return response["status"], response["body"]
+
+    return send_request
+
+
+def http_sender(session: aiohttp.ClientSession, base_url: str) -> Sender:
+    async def send_request(
+        method: str, path: str, headers: dict[str, str], body: bytes
+    ) -> tuple[int, bytes]:
+        async with session.request(
+            method, base_url.rstrip("/") + path, headers=headers, data=body
+        ) as response:
+            return response.status, await response.read()
+
+    return send_request
+
+
+async def login(send: Sender) -> str:
+    security = get_settings().security
+    status, body = await send(
+        "POST",
+        "/auth/access-token",
+        {"content-type": "application/x-www-form-urlencoded"},
+        urlencode(
+            {
+                "username": security.root_username,
+                "password": security.root_password.get_secret_value(),
+            }
+        ).encode(),
+    )
+    if status != HTTPStatus.OK:
+        raise RuntimeError(f"Login failed with {status}: {body[:200]!r}")
+    return orjson.loads(body)["access_token"]
+
+
+async def mongo_opcounters() -> int:
+    status = await get_database().client.admin.command("serverStatus")
+    return sum(status["opcounters"].values())
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run_scenario(
+    send: Sender, scenario: Scenario, token: str, concurrency: int, total: int
+) -> Result:
+    headers: dict[str, str] = {}
+    body = b""
+    if scenario.authenticated:
+        headers["authorization"] = f"Bearer {token}"
+    if scenario.form is not None:
+        headers["content-type"] = "application/x-www-form-urlencoded"
+        body = urlencode(scenario.form).encode()
+
+    latencies: list[float] = []
+    errors = limited = shed = 0
+    remaining = total
+
+    async def worker() -> None:
+        nonlocal remaining, errors, limited, shed
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                status, _ = await send(scenario.method, scenario.path, headers, body)
+            except Exception:
+                status = 0
+            latencies.append((time.perf_counter() - started) * 1000)
+            if status == HTTPStatus.TOO_MANY_REQUESTS:
+                limited += 1
+            elif status == HTTPStatus.SERVICE_UNAVAILABLE:
+                shed += 1
+            elif status >= HTTPStatus.BAD_REQUEST or status == 0:
+                errors += 1
+
+    ops_before = await mongo_opcounters()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    # The opcounters query itself counts as one command
+    ops = await mongo_opcounters() - ops_before - 1
+
+    latencies.sort()
+    return Result(
+        scenario=scenario.name,
+        concurrency=concurrency,
+        requests=total,
+        errors=errors,
+        limited=limited,
+        shed=shed,
+        throughput_rps=round(total / elapsed, 2),
+        p50_ms=round(statistics.median(latencies), 2),
+        p95_ms=round(percentile(latencies, 0.95), 2),
+        p99_ms=round(percentile(latencies, 0.99), 2),
+        mongo_ops_per_request=round(ops / total, 2),
+    )
+
+
+async def run_mixed_scenario(
+    send: Sender,
+    mixed: MixedScenario,
+    token: str,
+    concurrency: int,
+    total: int,
+) -> Result:
+    scenarios = get_scenarios()
+    result, _ = await asyncio.gather(
+        run_scenario(send, scenarios[mixed.measured], token, concurrency, total),
+        run_scenario(send, scenarios[mixed.background], token, concurrency, total),
+    )
+    result.scenario = mixed.name
+    return result
+
+
+def print_results(results: list[Result]) -> None:
+    header = f"{'scenario':<18}{'conc':>6}{'req':>7}{'err':>6}{'429':>6}{'503':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'mongo/req':>11}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r.scenario:<18}{r.concurrency:>6}{r.requests:>7}{r.errors:>6}"
+            f"{r.limited:>6}{r.shed:>6}"
+            f"{r.throughput_rps:>10.1f}{r.p50_ms:>10.1f}{r.p95_ms:>10.1f}"
+            f"{r.p99_ms:>10.1f}{r.mongo_ops_per_request:>11.2f}"
+        )
+
+
+def find_regressions(
+    results: list[Result], baseline_path: str, max_regression: float
+) -> list[str]:
+    with open(baseline_path, "rb") as f:
+        baseline = {
+            (r["scenario"], r["concurrency"]): r for r in orjson.loads(f.read())
+        }
+
+    regressions = []
+    for r in results:
+        base = baseline.get((r.scenario, r.concurrency))
+        if base is None:
+            continue
+        if r.p95_ms > base["p95_ms"] * (1 + max_regression):
+            regressions.append(
+                f"{r.scenario} @ {r.concurrency}: p95 {base['p95_ms']} -> {r.p95_ms} ms"
+            )
+        if r.mongo_ops_per_request > base["mongo_ops_per_request"] + 0.5:
+            regressions.append(
+                f"{r.scenario} @ {r.concurrency}: mongo ops/request "
+                f"{base['mongo_ops_per_request']} -> {r.mongo_ops_per_request}"
+            )
+    return regressions
+
+
+async def benchmark(args: argparse.Namespace) -> list[Result]:
+    scenarios = get_scenarios()
+    selected = args.scenarios.split(",")
+    levels = [int(level) for level in args.concurrency.split(",")]
+    results = []
+
+    async def run_all(send: Sender) -> None:
+        token = await login(send)
+        for name in selected:
+            mixed = MIXED_SCENARIOS.get(name)
+            # Warm up caches and connection pools before measuring
+            for warm_up in [mixed.measured, mixed.background] if mixed else [name]:
+                await run_scenario(
+                    send, scenarios[warm_up], token, 1, min(5, args.requests)
+                )
+            for concurrency in levels:
+                if mixed:
+                    result = await run_mixed_scenario(
+                        send, mixed, token, concurrency, args.requests
+                    )
+                else:
+                    result = await run_scenario(
+                        send, scenarios[name], token, concurrency, args.requests
+                    )
+                results.append(result)
+
+    if args.url:
+        async with aiohttp.ClientSession() as session:
+            await run_all(http_sender(session, args.url))
+    else:
+        # Read per request, so setting it after the app is imported still applies
+        get_settings().rate_limit.enabled = args.rate_limit
+
+        async with app.router.lifespan_context(app):
+            await run_all(asgi_sender(app))
+
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark API endpoints")
+    parser.add_argument(
+        "--url", help="Base URL of a running API, in-process if omitted"
+    )
+    parser.add_argument(
+        "--scenarios",
+        default="leaderboard,summoners,users_me,login,leaderboard_during_login",
+    )
+    parser.add_argument("--concurrency", default="1,10,50")
+    parser.add_argument("--requests", type=int, default=200, help="Per level")
+    parser.add_argument("--save", help="Write results as JSON to this path")
+    parser.add_argument("--baseline", help="Compare against a saved JSON result")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    parser.add_argument(
+        "--rate-limit",
+        action="store_true",
+        help="Keep rate limiting of the in-process app enabled",
+    )
+    args = parser.parse_args()
+
+    results = asyncio.run(benchmark(args))
+    print_results(results)
+
+    if args.save:
+        with open(args.save, "wb") as f:
+            f.write(
+                orjson.dumps([asdict(r) for r in results], option=orjson.OPT_INDENT_2)
+            )
+
+    if args.baseline:
+        regressions = find_regressions(results, args.baseline, args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,52 @@
-from pulsefire.ratelimiters import RiotAPIRateLimiter
+import logging
+import os
+import signal
+from multiprocessing import Process
+from pathlib import Path
+
+from persistent import PersistentRiotAPIRateLimiter
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+
+# One instance per Riot API key of the watcher's pool, each tracks its own
+# buckets. Instance `i` listens on `RATE_LIMITER__PORT + i`.
+RATE_LIMITER__INSTANCES = int(os.getenv("RATE_LIMITER__INSTANCES", "1"))
+RATE_LIMITER__PORT = int(os.getenv("RATE_LIMITER__PORT", "12227"))
+RATE_LIMITER__STATE_DIR = Path(os.getenv("RATE_LIMITER__STATE_DIR", "state"))
+RATE_LIMITER__SNAPSHOT_INTERVAL_SECS = float(
+    os.getenv("RATE_LIMITER__SNAPSHOT_INTERVAL_SECS", "1")
+)
+RATE_LIMITER__WARMUP_FACTOR = float(os.getenv("RATE_LIMITER__WARMUP_FACTOR", "0.5"))
+
+
+def serve(port: int) -> None:
+    PersistentRiotAPIRateLimiter(
+        state_path=RATE_LIMITER__STATE_DIR / f"state-{port}.json",
+        snapshot_interval_secs=RATE_LIMITER__SNAPSHOT_INTERVAL_SECS,
+        warmup_factor=RATE_LIMITER__WARMUP_FACTOR,
+    ).serve(host="0.0.0.0", port=port)
+
 
 if __name__ == "__main__":
-    RiotAPIRateLimiter().serve(host="0.0.0.0", port=12227)
+    if RATE_LIMITER__INSTANCES == 1:
+        serve(RATE_LIMITER__PORT)
+    else:
+        processes = [
+            Process(target=serve, args=(RATE_LIMITER__PORT + index,), daemon=True)
+            for index in range(RATE_LIMITER__INSTANCES)
+        ]
+        for process in processes:
+            process.start()
+
+        # Let every instance write its final snapshot before exiting
+        def stop(signum, frame):
+            for process in processes:
+                process.terminate()
+
+        signal.signal(signal.SIGTERM, stop)
+        for process in processes:
+            process.join()
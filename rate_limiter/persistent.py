@@ -0,0 +1,93 @@
+import collections
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from pulsefire.ratelimiters import RiotAPIRateLimiter
+
+logger = logging.getLogger(__name__)
+
+
+class PersistentRiotAPIRateLimiter(RiotAPIRateLimiter):
+    """
+    Rate limiter that survives restarts.
+
+    Window counters and reset times are snapshotted to `state_path` and loaded
+    again at startup. Restored limits are scaled down by `warmup_factor` until
+    their window ends, then the regular ping against Riot's headers takes over.
+    """
+
+    def __init__(
+        self,
+        state_path: Path,
+        snapshot_interval_secs: float = 1.0,
+        warmup_factor: float = 0.5,
+    ) -> None:
+        super().__init__()
+        # pulsefire keeps the index on the class, every instance needs its own
+        self._index = collections.defaultdict(lambda: (0, 0, 0, 0, 0))
+        self.state_path = state_path
+        self.snapshot_interval_secs = snapshot_interval_secs
+        self.warmup_factor = warmup_factor
+
+    def restore(self) -> int:
+        """Load unexpired windows from the last snapshot, returns how many."""
+        try:
+            entries = json.loads(self.state_path.read_text())
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError):
+            logger.exception(
+                f"Ignoring unreadable rate limiter state {self.state_path}"
+            )
+            return 0
+
+        now = time.time()
+        restored = 0
+        for key, (count, limit, expire, latency, _pinged) in entries:
+            if expire <= now:
+                continue
+            # Requests sent after the last snapshot are unknown, stay below the limit
+            self._index[tuple(key)] = (
+                count,
+                max(1, int(limit * self.warmup_factor)),
+                expire,
+                latency,
+                0,
+            )
+            restored += 1
+        return restored
+
+    def snapshot(self) -> None:
+        now = time.time()
+        # Copying the dict is atomic under the GIL, the server thread keeps running
+        entries = [
+            [list(key), list(value)]
+            for key, value in list(self._index.items())
+            if value[2] > now
+        ]
+        tmp_path = self.state_path.with_suffix(".tmp")
+        try:
+            tmp_path.write_text(json.dumps(entries))
+            os.replace(tmp_path, self.state_path)
+        except OSError:
+            logger.exception(f"Could not write rate limiter state {self.state_path}")
+
+    def _snapshot_loop(self) -> None:
+        while True:
+            time.sleep(self.snapshot_interval_secs)
+            self.snapshot()
+
+    def serve(self, host="127.0.0.1", port=12227, *, secret: str | None = None):
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        restored = self.restore()
+        logger.info(f"Restored {restored} rate limit windows from {self.state_path}")
+
+        threading.Thread(target=self._snapshot_loop, daemon=True).start()
+        try:
+            super().serve(host, port, secret=secret)
+        finally:
+            self.snapshot()
@@ -0,0 +1,188 @@
+"""
+Restart check for the persistent rate limiter.
+
+Starts a fake Riot upstream that enforces an app rate limit and answers 429
+above it, drives requests through a rate limiter instance, restarts that
+instance mid-window and reports how many 429s the upstream handed out.
+
+    uv run restart_check.py
+    uv run restart_check.py --kill --restarts 3
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from aiohttp import web
+from pulsefire.clients import BaseClient
+from pulsefire.middlewares import (
+    http_error_middleware,
+    json_response_middleware,
+    rate_limiter_middleware,
+)
+from pulsefire.ratelimiters import RiotAPIRateLimiter
+
+
+class FakeRiotUpstream:
+    """Fixed window app limit, reports limits and counts like Riot does."""
+
+    def __init__(self, limit: int, window_secs: int) -> None:
+        self.limit = limit
+        self.window_secs = window_secs
+        self.window_start = 0.0
+        self.count = 0
+        self.ok = 0
+        self.rejected = 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        now = time.time()
+        if now - self.window_start >= self.window_secs:
+            self.window_start = now
+            self.count = 0
+        self.count += 1
+
+        headers = {
+            "X-App-Rate-Limit": f"{self.limit}:{self.window_secs}",
+            "X-App-Rate-Limit-Count": f"{self.count}:{self.window_secs}",
+            "X-Method-Rate-Limit": f"{self.limit * 10}:{self.window_secs}",
+            "X-Method-Rate-Limit-Count": f"{self.count}:{self.window_secs}",
+        }
+        if self.count > self.limit:
+            self.rejected += 1
+            retry_after = int(self.window_start + self.window_secs - now) + 1
+            headers["Retry-After"] = str(retry_after)
+            return web.json_response({}, status=429, headers=headers)
+        self.ok += 1
+        return web.json_response({}, headers=headers)
+
+
+class FakeRiotClient(BaseClient):
+    def __init__(self, base_url: str, rate_limiter_port: int) -> None:
+        super().__init__(
+            base_url=base_url,
+            middlewares=[
+                json_response_middleware(),
+                http_error_middleware(0),
+                rate_limiter_middleware(
+                    RiotAPIRateLimiter(proxy=f"http://127.0.0.1:{rate_limiter_port}")
+                ),
+            ],
+        )
+
+    async def get_status(self, *, region: str = "euw1"):
+        return await self.invoke("GET", "/lol/status/v4/platform-data")
+
+
+def start_rate_limiter(port: int, state_dir: Path) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "RATE_LIMITER__PORT": str(port),
+        "RATE_LIMITER__STATE_DIR": str(state_dir),
+    }
+    return subprocess.Popen(
+        [sys.executable, "main.py"],
+        cwd=Path(__file__).parent,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_until_listening(port: int) -> None:
+    for _ in range(100):
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            await asyncio.sleep(0.05)
+            continue
+        writer.close()
+        await writer.wait_closed()
+        return
+    raise RuntimeError(f"Rate limiter did not start on port {port}")
+
+
+async def drive(client: FakeRiotClient, until: float, concurrency: int) -> None:
+    async def worker():
+        while time.time() < until:
+            try:
+                await client.get_status()
+            except Exception:
+                # Counted by the upstream, keep going like the watcher does
+                await asyncio.sleep(0.1)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--window", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--restarts", type=int, default=2)
+    parser.add_argument("--upstream-port", type=int, default=12300)
+    parser.add_argument("--rate-limiter-port", type=int, default=12301)
+    parser.add_argument(
+        "--kill",
+        action="store_true",
+        help="SIGKILL instead of SIGTERM, skips the final snapshot",
+    )
+    parser.add_argument(
+        "--no-state",
+        action="store_true",
+        help="Start every instance without a snapshot",
+    )
+    args = parser.parse_args()
+
+    upstream = FakeRiotUpstream(args.limit, args.window)
+    app = web.Application()
+    app.router.add_get("/lol/status/v4/platform-data", upstream.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.upstream_port).start()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+
+        def state_dir(restart: int) -> Path:
+            return Path(tmp_dir) / str(restart if args.no_state else 0)
+
+        process = start_rate_limiter(args.rate_limiter_port, state_dir(0))
+        try:
+            await wait_until_listening(args.rate_limiter_port)
+            client = FakeRiotClient(
+                f"http://127.0.0.1:{args.upstream_port}", args.rate_limiter_port
+            )
+            async with client:
+                # Use up part of the first window, then restart mid-window
+                for restart in range(args.restarts + 1):
+                    before = upstream.rejected
+                    await drive(
+                        client, time.time() + args.window * 0.6, args.concurrency
+                    )
+                    print(
+                        f"run {restart}: {upstream.rejected - before} answered with 429"
+                    )
+                    if restart == args.restarts:
+                        break
+                    process.send_signal(signal.SIGKILL if args.kill else signal.SIGTERM)
+                    process.wait()
+                    process = start_rate_limiter(
+                        args.rate_limiter_port, state_dir(restart + 1)
+                    )
+                    await wait_until_listening(args.rate_limiter_port)
+        finally:
+            process.terminate()
+            process.wait()
+            await runner.cleanup()
+
+    print(f"{upstream.ok} requests ok, {upstream.rejected} answered with 429")
+    return 1 if upstream.rejected else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
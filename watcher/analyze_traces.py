@@ -0,0 +1,129 @@
+"""
+Summarize spans written by `tracing.py`.
+
+Usage:
+    uv run analyze_traces.py [path] [--since 30m] [--until 5m] [--top 20]
+
+Prints the slowest spans, the time per span name and the critical path of
+the slowest summoner checks in the window. Works on `jsonl` and `otlp` files.
+"""
+
+import argparse
+import re
+import time
+from collections import defaultdict
+
+import orjson
+
+from tracing import TRACING__EXPORT_PATH
+
+DURATION_PATTERN = re.compile(r"^(\d+(?:\.\d+)?)([smhd])$")
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_ago(value: str) -> float:
+    """`30m` -> timestamp 30 minutes ago"""
+    match = DURATION_PATTERN.match(value)
+    if not match:
+        raise argparse.ArgumentTypeError(f"Invalid duration {value!r}, e.g. 30m")
+    return time.time() - float(match[1]) * DURATION_UNITS[match[2]]
+
+
+def _from_otlp(line: dict) -> list[dict]:
+    spans = []
+    for resource_spans in line["resourceSpans"]:
+        for scope_spans in resource_spans["scopeSpans"]:
+            for otlp_span in scope_spans["spans"]:
+                start = int(otlp_span["startTimeUnixNano"]) / 1e9
+                end = int(otlp_span["endTimeUnixNano"]) / 1e9
+                spans.append(
+                    {
+                        "trace_id": otlp_span["traceId"],
+                        "span_id": otlp_span["spanId"],
+                        "parent_id": otlp_span["parentSpanId"] or None,
+                        "name": otlp_span["name"],
+                        "start": start,
+                        "duration_ms": (end - start) * 1000,
+                        "attributes": {
+                            a["key"]: a["value"]["stringValue"]
+                            for a in otlp_span["attributes"]
+                        },
+                        "error": otlp_span.get("status", {}).get("message"),
+                    }
+                )
+    return spans
+
+
+def load_spans(path: str, since: float, until: float) -> list[dict]:
+    spans = []
+    with open(path, "rb") as f:
+        for raw in f:
+            if not raw.strip():
+                continue
+            line = orjson.loads(raw)
+            for s in _from_otlp(line) if "resourceSpans" in line else [line]:
+                if since <= s["start"] <= until:
+                    spans.append(s)
+    return spans
+
+
+def critical_path(root: dict, children: dict[str, list[dict]]) -> list[dict]:
+    """Follow the child that finished last at every level."""
+    path = [root]
+    node = root
+    while children.get(node["span_id"]):
+        node = max(
+            children[node["span_id"]],
+            key=lambda s: s["start"] + s["duration_ms"] / 1000,
+        )
+        path.append(node)
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path", nargs="?", default=TRACING__EXPORT_PATH)
+    parser.add_argument("--since", type=parse_ago, default=0.0)
+    parser.add_argument("--until", type=parse_ago, default=None)
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    spans = load_spans(args.path, args.since, args.until or time.time())
+    if not spans:
+        print("No spans in the selected window")
+        return
+
+    print(f"Top {args.top} slowest spans")
+    for s in sorted(spans, key=lambda s: s["duration_ms"], reverse=True)[: args.top]:
+        error = f" ERROR {s['error']}" if s["error"] else ""
+        print(f"  {s['duration_ms']:10.1f} ms  {s['name']}  {s['attributes']}{error}")
+
+    totals: dict[str, list[float]] = defaultdict(list)
+    for s in spans:
+        totals[s["name"]].append(s["duration_ms"])
+    print("\nTime per span name")
+    for name, durations in sorted(
+        totals.items(), key=lambda item: sum(item[1]), reverse=True
+    ):
+        print(
+            f"  {sum(durations):12.1f} ms total  {len(durations):6d} calls  "
+            f"{max(durations):10.1f} ms max  {name}"
+        )
+
+    children: dict[str, list[dict]] = defaultdict(list)
+    for s in spans:
+        if s["parent_id"]:
+            children[s["parent_id"]].append(s)
+    roots = sorted(
+        (s for s in spans if s["parent_id"] is None),
+        key=lambda s: s["duration_ms"],
+        reverse=True,
+    )
+    for root in roots[:3]:
+        print(f"\nCritical path of {root['name']} {root['attributes']}")
+        for depth, s in enumerate(critical_path(root, children)):
+            print(f"  {'  ' * depth}{s['duration_ms']:10.1f} ms  {s['name']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Pool of Riot API keys for the watcher.
+
+Puuids and summoner ids are encrypted per key, so every summoner is pinned to
+one key through its `api_key_id` and never checked with another. Each key gets
+its own rate limiter instance, listening on `RIOT__RATE_LIMITER_PORT + index`.
+"""
+
+import hashlib
+
+from bson import ObjectId
+
+
+def parse_api_keys(api_key: str | None, api_keys: str | None) -> list[str]:
+    """
+    Keys from `RIOT__API_KEYS`, with `RIOT__API_KEY` always first.
+
+    The first key is the one the API resolves new summoners with, summoners
+    stored before the pool existed belong to it.
+    """
+    keys = [key.strip() for key in (api_keys or "").split(",") if key.strip()]
+    if api_key:
+        keys = [api_key] + [key for key in keys if key != api_key]
+    if not keys:
+        raise ValueError("RIOT__API_KEY or RIOT__API_KEYS must be set")
+    return keys
+
+
+def get_api_key_id(api_key: str) -> str:
+    """Stable identifier stored on summoners, never the key itself."""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:12]
+
+
+def choose_api_key_id(summoner_id: ObjectId, key_ids: list[str]) -> str:
+    """Deterministic spread of new summoners over the pool."""
+    digest = hashlib.sha256(str(summoner_id).encode()).digest()
+    return key_ids[int.from_bytes(digest[:8], "big") % len(key_ids)]
@@ -0,0 +1,135 @@
+"""
+Singleflight coalescing for Riot API calls.
+
+Identical in-flight requests share one upstream call, and successful results
+are memoized for a short window. Every caller receives its own copy because
+the watcher mutates response dicts before saving them.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+COALESCE__ENABLED = os.getenv("COALESCE__ENABLED", "true").lower() == "true"
+COALESCE__TTL_SECS = float(os.getenv("COALESCE__TTL_SECS", "5"))
+COALESCE__MAX_ENTRIES = int(os.getenv("COALESCE__MAX_ENTRIES", "10000"))
+
+
+@dataclass
+class CoalescingStats:
+    calls: int = 0
+    upstream: int = 0
+    coalesced: int = 0
+    memo_hits: int = 0
+
+    @property
+    def saved(self) -> int:
+        return self.coalesced + self.memo_hits
+
+
+class LeaderCancelled(Exception):
+    """The call every waiter was sharing was cancelled, not the waiters."""
+
+
+def _clone(value):
+    return orjson.loads(orjson.dumps(value))
+
+
+def _invocation_key(invocation) -> tuple:
+    # `url` is the resolved URL including the query string
+    return (invocation.method, invocation.url)
+
+
+class RequestCoalescer:
+    def __init__(self, ttl_secs: float, max_entries: int) -> None:
+        self.ttl_secs = ttl_secs
+        self.max_entries = max_entries
+        self.stats = CoalescingStats()
+        self._in_flight: dict[tuple, asyncio.Future] = {}
+        self._memo: dict[tuple, tuple[float, object]] = {}
+
+    def _evict_expired(self, now: float) -> None:
+        if len(self._memo) <= self.max_entries:
+            return
+        for key in [k for k, (expires_at, _) in self._memo.items() if expires_at < now]:
+            del self._memo[key]
+        # Still too large, drop the oldest insertions
+        while len(self._memo) > self.max_entries:
+            del self._memo[next(iter(self._memo))]
+
+    async def call(self, key: tuple, fetch):
+        self.stats.calls += 1
+        now = time.monotonic()
+
+        memo = self._memo.get(key)
+        if memo is not None and memo[0] >= now:
+            self.stats.memo_hits += 1
+            return _clone(memo[1])
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self.stats.coalesced += 1
+        while in_flight is not None:
+            try:
+                return _clone(await asyncio.shield(in_flight))
+            except LeaderCancelled:
+                # The first waiter to wake up takes over the fetch
+                in_flight = self._in_flight.get(key)
+
+        self.stats.upstream += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await fetch()
+        except asyncio.CancelledError:
+            # Only the leader was cancelled, its waiters retry
+            future.set_exception(LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so the loop does not log "exception never retrieved"
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+        future.set_result(result)
+        if self.ttl_secs > 0:
+            self._memo[key] = (time.monotonic() + self.ttl_secs, result)
+            self._evict_expired(time.monotonic())
+        return _clone(result)
+
+    def middleware(self, namespace: str = ""):
+        """
+        Pulsefire middleware, register outside `json_response_middleware`.
+
+        `namespace` separates clients whose identical URLs return different
+        data, such as clients for different API keys.
+        """
+
+        def constructor(next):
+            async def middleware(invocation):
+                if invocation.method != "GET":
+                    return await next(invocation)
+                return await self.call(
+                    (namespace, *_invocation_key(invocation)),
+                    lambda: next(invocation),
+                )
+
+            return middleware
+
+        return constructor
+
+    def log_stats(self) -> None:
+        stats = self.stats
+        logger.info(
+            f"Riot calls: {stats.calls} requested, {stats.upstream} sent, "
+            f"{stats.saved} saved ({stats.coalesced} coalesced, {stats.memo_hits} memoized)"
+        )
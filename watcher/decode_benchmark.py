@@ -0,0 +1,218 @@
+"""
+Compare orjson and typed (msgspec) decoding of match-v5 payloads.
+
+Every mode runs in its own process on synthetic payloads shaped like real
+match-v5 responses (10 participants with ~150 stats, `challenges`, `perks`,
+teams). It reports the per-match decode time, the BSON encode time of the
+decoded match (what motor does on write) and the peak RSS while ingesting
+with `--in-flight` decoded matches held at once, as the coalescer memo and the
+enrichment queue do.
+
+    uv run --extra typed decode_benchmark.py
+    uv run --extra typed decode_benchmark.py --matches 5000 --in-flight 500
+"""
+
+import argparse
+import gc
+import json
+import random
+import resource
+import statistics
+import string
+import subprocess
+import sys
+import time
+from collections import deque
+
+import bson
+import orjson
+
+from decoding import decode_typed, typed_decoding_available
+
+MATCH_PATH = "/lol/match/v5/matches/{id}"
+MODES = ["orjson", "typed"]
+TEAM_SIZE = 5
+BLUE_TEAM_ID = 100
+
+
+def random_puuid() -> str:
+    return "".join(random.choices(string.ascii_letters + string.digits + "-_", k=78))
+
+
+def make_participant(index: int) -> dict:
+    participant = {
+        "puuid": random_puuid(),
+        "participantId": index + 1,
+        "teamId": BLUE_TEAM_ID if index < TEAM_SIZE else 200,
+        "riotIdGameName": "".join(random.choices(string.ascii_letters, k=10)),
+        "riotIdTagline": "EUW",
+        "championId": random.randint(1, 950),
+        "championName": "Yasuo",
+        "champLevel": random.randint(1, 18),
+        "win": index < TEAM_SIZE,
+        "kills": random.randint(0, 20),
+        "deaths": random.randint(0, 15),
+        "assists": random.randint(0, 30),
+        "teamPosition": "MIDDLE",
+        "individualPosition": "MIDDLE",
+        "gameEndedInEarlySurrender": False,
+        "goldEarned": random.randint(5000, 20000),
+        "totalMinionsKilled": random.randint(0, 300),
+        "neutralMinionsKilled": random.randint(0, 100),
+        "totalDamageDealtToChampions": random.randint(5000, 60000),
+        "visionScore": random.randint(0, 100),
+        "summoner1Id": 4,
+        "summoner2Id": 14,
+        **{f"item{i}": random.randint(1000, 8000) for i in range(7)},
+        # Stats nothing reads, real payloads carry about this many
+        **{f"stat{i}": random.randint(0, 10000) for i in range(120)},
+        "challenges": {f"challenge{i}": random.random() * 100 for i in range(125)},
+        "missions": {f"playerScore{i}": 0 for i in range(12)},
+        "perks": {
+            "statPerks": {"defense": 5001, "flex": 5008, "offense": 5005},
+            "styles": [
+                {
+                    "description": "primaryStyle",
+                    "selections": [
+                        {"perk": 8000 + i, "var1": 1, "var2": 2, "var3": 3}
+                        for i in range(4)
+                    ],
+                    "style": 8000,
+                },
+                {
+                    "description": "subStyle",
+                    "selections": [
+                        {"perk": 8100 + i, "var1": 1, "var2": 2, "var3": 3}
+                        for i in range(2)
+                    ],
+                    "style": 8100,
+                },
+            ],
+        },
+    }
+    return participant
+
+
+def make_match_payload(index: int) -> bytes:
+    participants = [make_participant(i) for i in range(10)]
+    match = {
+        "metadata": {
+            "dataVersion": "2",
+            "matchId": f"EUW1_{7000000000 + index}",
+            "participants": [p["puuid"] for p in participants],
+        },
+        "info": {
+            "endOfGameResult": "GameComplete",
+            "gameCreation": 1711660000000,
+            "gameDuration": 1834,
+            "gameEndTimestamp": 1711662000000,
+            "gameId": 7000000000 + index,
+            "gameMode": "CLASSIC",
+            "gameName": "teambuilder-match",
+            "gameStartTimestamp": 1711660100000,
+            "gameType": "MATCHED_GAME",
+            "gameVersion": "14.6.567.2837",
+            "mapId": 11,
+            "participants": participants,
+            "platformId": "EUW1",
+            "queueId": 420,
+            "teams": [
+                {
+                    "bans": [{"championId": 1, "pickTurn": i} for i in range(5)],
+                    "objectives": {
+                        name: {"first": False, "kills": 1}
+                        for name in ["baron", "champion", "dragon", "inhibitor"]
+                    },
+                    "teamId": team_id,
+                    "win": team_id == BLUE_TEAM_ID,
+                }
+                for team_id in (BLUE_TEAM_ID, 200)
+            ],
+            "tournamentCode": "",
+        },
+    }
+    return orjson.dumps(match)
+
+
+def current_rss_kb() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize() // 1024
+
+
+def run_mode(mode: str, matches: int, in_flight: int, variants: int) -> dict:
+    decode = (
+        orjson.loads
+        if mode == "orjson"
+        else lambda body: decode_typed(MATCH_PATH, body)
+    )
+    payloads = [make_match_payload(i) for i in range(variants)]
+    gc.collect()
+    baseline_kb = current_rss_kb()
+
+    decode_us: list[float] = []
+    encode_us: list[float] = []
+    held: deque = deque(maxlen=in_flight)
+    for i in range(matches):
+        body = payloads[i % variants]
+        started = time.perf_counter()
+        match = decode(body)
+        decode_us.append((time.perf_counter() - started) * 1e6)
+
+        match["ref_summoners"] = [bson.ObjectId()]
+        started = time.perf_counter()
+        bson.encode(match)
+        encode_us.append((time.perf_counter() - started) * 1e6)
+        held.append(match)
+
+    return {
+        "mode": mode,
+        "payload_kb": round(statistics.mean(len(p) for p in payloads) / 1024, 1),
+        "decode_us_p50": round(statistics.median(decode_us), 1),
+        "bson_encode_us_p50": round(statistics.median(encode_us), 1),
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+        "ingest_rss_mb": round(
+            (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_kb) / 1024,
+            1,
+        ),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--matches", type=int, default=2000)
+    parser.add_argument("--in-flight", type=int, default=200)
+    parser.add_argument("--variants", type=int, default=20)
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        result = run_mode(args.mode, args.matches, args.in_flight, args.variants)
+        print(json.dumps(result))
+        return 0
+
+    if not typed_decoding_available():
+        print("msgspec is not installed, run with `uv run --extra typed`")
+        return 1
+
+    results = []
+    for mode in MODES:
+        # A fresh process per mode, the peak RSS of a process never goes down
+        output = subprocess.run(
+            [sys.executable, __file__, *sys.argv[1:], "--mode", mode],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout
+        results.append(json.loads(output))
+
+    columns = list(results[0])
+    print("  ".join(f"{column:>18}" for column in columns))
+    for result in results:
+        print("  ".join(f"{result[column]!s:>18}" for column in columns))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
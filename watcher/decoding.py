@@ -0,0 +1,153 @@
+"""
+Optional typed decoding of Riot responses.
+
+With DECODE__TYPED=true the account, summoner and match responses are decoded
+by msgspec into structs of the fields Realm-Warp persists and queries, every
+other field is skipped by the parser without being allocated. The structs are
+turned back into plain dicts, so the rest of the watcher is unchanged, but a
+stored match drops everything not listed here (e.g. `challenges`, `perks`),
+which also limits the participant columns of the API's match export.
+
+Needs the optional `msgspec` package (`uv sync --extra typed`).
+"""
+
+import hashlib
+import os
+from typing import Any
+
+import orjson
+
+DECODE__TYPED = os.getenv("DECODE__TYPED", "false").lower() == "true"
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+if msgspec is not None:
+    # Missing fields default to None and are left out again by to_builtins
+
+    class Account(msgspec.Struct, omit_defaults=True, gc=False):
+        puuid: str
+        gameName: str | None = None
+        tagLine: str | None = None
+
+    class Summoner(msgspec.Struct, omit_defaults=True, gc=False):
+        puuid: str
+        profileIconId: int | None = None
+        revisionDate: int | None = None
+        summonerLevel: int | None = None
+        id: str | None = None
+        accountId: str | None = None
+
+    class Participant(msgspec.Struct, omit_defaults=True, gc=False):
+        puuid: str
+        participantId: int | None = None
+        teamId: int | None = None
+        riotIdGameName: str | None = None
+        riotIdTagline: str | None = None
+        championId: int | None = None
+        championName: str | None = None
+        champLevel: int | None = None
+        win: bool | None = None
+        kills: int | None = None
+        deaths: int | None = None
+        assists: int | None = None
+        teamPosition: str | None = None
+        individualPosition: str | None = None
+        gameEndedInEarlySurrender: bool | None = None
+        goldEarned: int | None = None
+        totalMinionsKilled: int | None = None
+        neutralMinionsKilled: int | None = None
+        totalDamageDealtToChampions: int | None = None
+        visionScore: int | None = None
+        summoner1Id: int | None = None
+        summoner2Id: int | None = None
+        item0: int | None = None
+        item1: int | None = None
+        item2: int | None = None
+        item3: int | None = None
+        item4: int | None = None
+        item5: int | None = None
+        item6: int | None = None
+
+    class MatchInfo(msgspec.Struct, omit_defaults=True, gc=False):
+        participants: list[Participant]
+        queueId: int
+        gameCreation: int | None = None
+        gameStartTimestamp: int | None = None
+        gameEndTimestamp: int | None = None
+        gameDuration: int | None = None
+        gameMode: str | None = None
+        gameVersion: str | None = None
+        mapId: int | None = None
+        platformId: str | None = None
+
+    class MatchMetadata(msgspec.Struct, omit_defaults=True, gc=False):
+        matchId: str
+        dataVersion: str | None = None
+        participants: list[str] = []
+
+    class Match(msgspec.Struct, omit_defaults=True, gc=False):
+        metadata: MatchMetadata
+        info: MatchInfo
+
+    # Path of the Riot endpoint -> decoder of its response
+    TYPED_DECODERS = {
+        "/riot/account/v1/accounts/by-puuid/{puuid}": msgspec.json.Decoder(Account),
+        "/riot/account/v1/accounts/by-riot-id/{game_name}/{tag_line}": (
+            msgspec.json.Decoder(Account)
+        ),
+        "/lol/summoner/v4/summoners/by-puuid/{puuid}": msgspec.json.Decoder(Summoner),
+        "/lol/match/v5/matches/{id}": msgspec.json.Decoder(Match),
+    }
+
+
+def typed_decoding_available() -> bool:
+    return msgspec is not None
+
+
+def decode_typed(path: str, body: bytes) -> Any:
+    """Decode `body` of the endpoint `path`, untyped endpoints use orjson."""
+    decoder = TYPED_DECODERS.get(path)
+    if decoder is None:
+        return orjson.loads(body)
+    return msgspec.to_builtins(decoder.decode(body))
+
+
+def typed_json_response_middleware():
+    """Drop-in for pulsefire's `json_response_middleware` using `decode_typed`."""
+
+    def constructor(next):
+        async def middleware(invocation):
+            response = await next(invocation)
+            body = await response.read()
+            try:
+                return decode_typed(endpoint_path(invocation.urlformat), body)
+            except msgspec.ValidationError:
+                # Not the documented shape, keep it whole rather than fail
+                return orjson.loads(body)
+            except (msgspec.DecodeError, orjson.JSONDecodeError):
+                # Same as pulsefire, bodies that aren't JSON are returned as bytes
+                return body
+
+        return middleware
+
+    return constructor
+
+
+def endpoint_path(urlformat: str) -> str:
+    """Endpoint path of a pulsefire url format, without the `{region}` host."""
+    return urlformat.split(".api.riotgames.com", 1)[-1]
+
+
+def profile_hash(summoner: dict) -> str:
+    """Stable hash of a summoner profile, compared instead of the stored fields."""
+    return hashlib.blake2b(
+        orjson.dumps(
+            {key: value for key, value in summoner.items() if key != "profile_hash"},
+            option=orjson.OPT_SORT_KEYS,
+            default=str,
+        ),
+        digest_size=16,
+    ).hexdigest()
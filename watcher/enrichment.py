@@ -0,0 +1,250 @@
+"""
+Optional league enrichment for every participant of a ranked match.
+
+Ranks of untracked players come from a TTL cache keyed by (puuid, queueType).
+Concurrent lookups of the same puuid share one league-v4 request. Enrichment
+runs in a background task that yields to the core polling loop.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pulsefire.clients import RiotAPIClient
+
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+ENRICHMENT__ENABLED = os.getenv("ENRICHMENT__ENABLED", "false").lower() == "true"
+ENRICHMENT__LEAGUE_CACHE_TTL_SECS = float(
+    os.getenv("ENRICHMENT__LEAGUE_CACHE_TTL_SECS", "3600")
+)
+ENRICHMENT__LEAGUE_CACHE_SIZE = int(os.getenv("ENRICHMENT__LEAGUE_CACHE_SIZE", "50000"))
+ENRICHMENT__CONCURRENCY = int(os.getenv("ENRICHMENT__CONCURRENCY", "2"))
+# Longest time enrichment waits for the core loop to go idle before running anyway
+ENRICHMENT__MAX_WAIT_SECS = float(os.getenv("ENRICHMENT__MAX_WAIT_SECS", "60"))
+ENRICHMENT__QUEUE_SIZE = int(os.getenv("ENRICHMENT__QUEUE_SIZE", "1000"))
+
+TIER_SCORES = {
+    "IRON": 0,
+    "BRONZE": 400,
+    "SILVER": 800,
+    "GOLD": 1200,
+    "PLATINUM": 1600,
+    "EMERALD": 2000,
+    "DIAMOND": 2400,
+    "MASTER": 2800,
+    "GRANDMASTER": 2800,
+    "CHALLENGER": 2800,
+}
+RANK_SCORES = {"IV": 0, "III": 100, "II": 200, "I": 300}
+# Tiers below master, in the order an average score maps back to
+DIVISION_TIERS = ["IRON", "BRONZE", "SILVER", "GOLD", "PLATINUM", "EMERALD", "DIAMOND"]
+DIVISION_RANKS = ["IV", "III", "II", "I"]
+
+
+def league_score(league: dict) -> int:
+    """Same scale as the API leaderboard: tier + division + LP."""
+    return (
+        TIER_SCORES.get(league["tier"], 0)
+        + RANK_SCORES.get(league["rank"], 0)
+        + (league.get("leaguePoints") or 0)
+    )
+
+
+def score_to_league(score: float) -> dict:
+    score = round(score)
+    if score >= TIER_SCORES["MASTER"]:
+        return {"tier": "MASTER", "rank": "I", "leaguePoints": score - 2800}
+    tier_index, remainder = divmod(score, 400)
+    rank_index, league_points = divmod(remainder, 100)
+    return {
+        "tier": DIVISION_TIERS[tier_index],
+        "rank": DIVISION_RANKS[rank_index],
+        "leaguePoints": league_points,
+    }
+
+
+class LeagueCache:
+    """TTL/LRU cache of league snapshots with per-puuid request coalescing."""
+
+    def __init__(self, client: RiotAPIClient, ttl_secs: float, max_size: int) -> None:
+        self.client = client
+        self.ttl_secs = ttl_secs
+        self.max_size = max_size
+        self._entries: OrderedDict[tuple[str, str], tuple[float, dict | None]] = (
+            OrderedDict()
+        )
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _get_cached(self, puuid: str, queue_type: str) -> tuple[bool, dict | None]:
+        entry = self._entries.get((puuid, queue_type))
+        if entry is None or time.monotonic() > entry[0]:
+            return False, None
+        self._entries.move_to_end((puuid, queue_type))
+        return True, entry[1]
+
+    def put(self, puuid: str, leagues: list[dict]) -> None:
+        """Store every queue of a league-v4 response, unranked queues as None."""
+        expires_at = time.monotonic() + self.ttl_secs
+        by_queue = {league["queueType"]: league for league in leagues}
+        for queue_type in ("RANKED_SOLO_5x5", "RANKED_FLEX_SR"):
+            league = by_queue.get(queue_type)
+            self._entries[(puuid, queue_type)] = (
+                expires_at,
+                {
+                    "leaguePoints": league["leaguePoints"],
+                    "tier": league["tier"],
+                    "rank": league["rank"],
+                }
+                if league
+                else None,
+            )
+            self._entries.move_to_end((puuid, queue_type))
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def needs_request(self, puuid: str, queue_type: str) -> bool:
+        """Whether `get` would call league-v4, not cached nor already requested."""
+        return (
+            puuid not in self._in_flight and not self._get_cached(puuid, queue_type)[0]
+        )
+
+    async def get(self, platform: str, puuid: str, queue_type: str) -> dict | None:
+        cached, league = self._get_cached(puuid, queue_type)
+        if cached:
+            self.hits += 1
+            return league
+
+        in_flight = self._in_flight.get(puuid)
+        if in_flight is not None:
+            self.coalesced += 1
+            await in_flight
+            return self._get_cached(puuid, queue_type)[1]
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[puuid] = future
+        try:
+            leagues = await self.client.get_lol_league_v4_entries_by_puuid(
+                region=platform, puuid=puuid
+            )
+            self.put(puuid, leagues)
+            future.set_result(None)
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so the loop does not log "exception never retrieved"
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[puuid]
+        return self._get_cached(puuid, queue_type)[1]
+
+
+class MatchEnricher:
+    """Background stage adding league and lobby averages to stored matches."""
+
+    def __init__(
+        self,
+        matches_col: AsyncIOMotorCollection,
+        league_caches: dict[str, LeagueCache],
+    ) -> None:
+        self.matches_col = matches_col
+        # One cache per API key, participant puuids are scoped to the key
+        self.league_caches = league_caches
+        self.queue: asyncio.Queue[tuple[str, str, str, str]] = asyncio.Queue(
+            maxsize=ENRICHMENT__QUEUE_SIZE
+        )
+        # Set while the core loop sleeps between cycles
+        self.core_idle = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def enqueue(
+        self, match_id: str, platform: str, queue_type: str, api_key_id: str
+    ) -> None:
+        try:
+            self.queue.put_nowait((match_id, platform, queue_type, api_key_id))
+        except asyncio.QueueFull:
+            logger.warning(f"Enrichment queue full, skipping match {match_id}")
+
+    async def _yield_to_core(self) -> None:
+        try:
+            await asyncio.wait_for(self.core_idle.wait(), ENRICHMENT__MAX_WAIT_SECS)
+        except TimeoutError:
+            pass
+
+    async def enrich(
+        self, match_id: str, platform: str, queue_type: str, api_key_id: str
+    ) -> None:
+        with span("mongo matches.find_one enrichment"):
+            match = await self.matches_col.find_one(
+                {"metadata.matchId": match_id},
+                {"info.participants.puuid": 1, "info.participants.league": 1},
+            )
+        if match is None:
+            return
+
+        league_cache = self.league_caches[api_key_id]
+        participants = match["info"]["participants"]
+        leagues: list[dict | None] = []
+        for participant in participants:
+            if participant.get("league"):
+                # Snapshot of a tracked summoner, taken right after the match
+                leagues.append(participant["league"])
+                continue
+            # Only a league-v4 request competes with the core loop, cache hits don't
+            if league_cache.needs_request(participant["puuid"], queue_type):
+                await self._yield_to_core()
+            try:
+                leagues.append(
+                    await league_cache.get(platform, participant["puuid"], queue_type)
+                )
+            except Exception:
+                logger.exception(f"League lookup failed in match {match_id}")
+                leagues.append(None)
+
+        update: dict = {}
+        for index, (participant, league) in enumerate(
+            zip(participants, leagues, strict=True)
+        ):
+            if league is not None and not participant.get("league"):
+                update[f"info.participants.{index}.league"] = league
+
+        ranked = [league for league in leagues if league and league.get("tier")]
+        if ranked:
+            average = sum(league_score(league) for league in ranked) / len(ranked)
+            update["info.lobbyAverage"] = {
+                **score_to_league(average),
+                "score": round(average, 1),
+                "rankedParticipants": len(ranked),
+            }
+
+        if update:
+            with span("mongo matches.update_one enrichment"):
+                await self.matches_col.update_one(
+                    {"metadata.matchId": match_id}, {"$set": update}
+                )
+
+    async def _worker(self) -> None:
+        while True:
+            match_id, platform, queue_type, api_key_id = await self.queue.get()
+            try:
+                with span("match.enrich", match_id=match_id):
+                    await self.enrich(match_id, platform, queue_type, api_key_id)
+            except Exception:
+                logger.exception(f"Enrichment of match {match_id} failed")
+            finally:
+                self.queue.task_done()
+
+    async def run(self) -> None:
+        await asyncio.gather(*(self._worker() for _ in range(ENRICHMENT__CONCURRENCY)))
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.run())
@@ -0,0 +1,73 @@
+"""
+Outbox of ingestion events for the API's live feed.
+
+With EVENTS__SOURCE=outbox (works on a standalone MongoDB) events are written
+to the capped `events_outbox` collection, which the API tails. With
+`change_stream` the API reads the writes themselves and nothing is written
+here. Event shapes match `app.core.events` of the API.
+"""
+
+import os
+
+from bson import Timestamp
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo.errors import CollectionInvalid
+
+from tracing import span
+
+EVENTS__SOURCE = os.getenv("EVENTS__SOURCE", "outbox")
+EVENTS__OUTBOX_SIZE_BYTES = int(
+    os.getenv("EVENTS__OUTBOX_SIZE_BYTES", str(16 * 1024 * 1024))
+)
+
+EVENTS_OUTBOX_COLLECTION = "events_outbox"
+
+
+async def init_events_outbox(db: AsyncIOMotorDatabase) -> None:
+    """Create the capped outbox, inserts would create a plain collection."""
+    if EVENTS__SOURCE != "outbox":
+        return
+    if EVENTS_OUTBOX_COLLECTION in await db.list_collection_names():
+        return
+    try:
+        await db.create_collection(
+            EVENTS_OUTBOX_COLLECTION, capped=True, size=EVENTS__OUTBOX_SIZE_BYTES
+        )
+    except CollectionInvalid:
+        # Created concurrently
+        return
+    # A tailable cursor dies on an empty capped collection, seed it once
+    await db[EVENTS_OUTBOX_COLLECTION].insert_one(
+        {"ts": Timestamp(0, 0), "event": None}
+    )
+
+
+async def publish_event(outbox_col: AsyncIOMotorCollection, event: dict) -> None:
+    if EVENTS__SOURCE != "outbox":
+        return
+    # An empty timestamp is replaced by a unique, increasing one by the server
+    with span("mongo events_outbox.insert_one"):
+        await outbox_col.insert_one({"ts": Timestamp(0, 0), "event": event})
+
+
+def match_event(match: dict) -> dict:
+    return {
+        "type": "match",
+        "matchId": match["metadata"]["matchId"],
+        "queueId": match["info"].get("queueId"),
+        "gameEndTimestamp": match["info"].get("gameEndTimestamp"),
+        "summoners": [str(summoner_id) for summoner_id in match["ref_summoners"]],
+    }
+
+
+def league_event(entry: dict) -> dict:
+    return {
+        "type": "league",
+        "summoner": str(entry["ref_summoner"]),
+        "queueType": entry["queueType"],
+        "tier": entry.get("tier"),
+        "rank": entry.get("rank"),
+        "leaguePoints": entry.get("leaguePoints"),
+        "wins": entry.get("wins"),
+        "losses": entry.get("losses"),
+    }
@@ -0,0 +1,51 @@
+"""
+Ingestion freshness.
+
+Every match the watcher writes first records its lag, the time between
+`info.gameEndTimestamp` and the write, in the `ingestion_lag` time series
+collection. Samples are bucketed per platform by MongoDB and expire after
+FRESHNESS__RETENTION_DAYS. Successful checks set `last_checked_at` on the
+summoner.
+"""
+
+import os
+from datetime import UTC, datetime
+
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo.errors import CollectionInvalid
+
+from tracing import span
+
+FRESHNESS__RETENTION_DAYS = int(os.getenv("FRESHNESS__RETENTION_DAYS", "30"))
+
+INGESTION_LAG_COLLECTION = "ingestion_lag"
+
+
+async def init_ingestion_lag(db: AsyncIOMotorDatabase) -> None:
+    """Create the time series collection, inserts would create a plain one."""
+    if INGESTION_LAG_COLLECTION in await db.list_collection_names():
+        return
+    try:
+        await db.create_collection(
+            INGESTION_LAG_COLLECTION,
+            timeseries={
+                "timeField": "ts",
+                "metaField": "platform",
+                "granularity": "minutes",
+            },
+            expireAfterSeconds=FRESHNESS__RETENTION_DAYS * 24 * 3600,
+        )
+    except CollectionInvalid:
+        # Created concurrently
+        pass
+
+
+async def record_match_lag(
+    ingestion_lag_col: AsyncIOMotorCollection, platform: str, match: dict
+) -> None:
+    now = datetime.now(UTC)
+    lag_ms = int(now.timestamp() * 1000) - match["info"]["gameEndTimestamp"]
+    with span("mongo ingestion_lag.insert_one"):
+        await ingestion_lag_col.insert_one(
+            {"ts": now, "platform": platform, "lag_ms": max(lag_ms, 0)}
+        )
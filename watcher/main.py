@@ -1,6 +1,8 @@
 import asyncio
 import logging
 import os
+from contextlib import AsyncExitStack
+from datetime import UTC, datetime
 
 import orjson
 import sentry_sdk
@@ -19,6 +21,62 @@ from pulsefire.middlewares import (
 from pulsefire.ratelimiters import RiotAPIRateLimiter
 from pulsefire.schemas import RiotAPISchema
 
+from api_keys import (
+    choose_api_key_id,
+    get_api_key_id,
+    parse_api_keys,
+)
+from coalescing import (
+    COALESCE__ENABLED,
+    COALESCE__MAX_ENTRIES,
+    COALESCE__TTL_SECS,
+    RequestCoalescer,
+)
+from decoding import (
+    DECODE__TYPED,
+    profile_hash,
+    typed_decoding_available,
+    typed_json_response_middleware,
+)
+from enrichment import (
+    ENRICHMENT__CONCURRENCY,
+    ENRICHMENT__ENABLED,
+    ENRICHMENT__LEAGUE_CACHE_SIZE,
+    ENRICHMENT__LEAGUE_CACHE_TTL_SECS,
+    LeagueCache,
+    MatchEnricher,
+)
+from events import (
+    EVENTS_OUTBOX_COLLECTION,
+    init_events_outbox,
+    league_event,
+    match_event,
+    publish_event,
+)
+from freshness import (
+    INGESTION_LAG_COLLECTION,
+    init_ingestion_lag,
+    record_match_lag,
+)
+from player_matches import (
+    PLAYER_MATCHES_COLLECTION,
+    summoner_puuids,
+    upsert_player_match,
+)
+from tracing import span, tracing_middleware
+from work_queue import (
+    ENRICH_STAGE,
+    LEAGUE_STAGE,
+    MATCH_STAGE,
+    WORK_QUEUE__ENABLED,
+    WORK_QUEUE__LEAGUE_CONCURRENCY,
+    WORK_QUEUE__MATCH_CONCURRENCY,
+    WORK_QUEUE__STAGES,
+    WORK_QUEUE_COLLECTION,
+    WorkQueue,
+    init_work_queue,
+)
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -36,17 +94,19 @@ MONGODB__USERNAME = os.getenv("MONGODB__USERNAME")
 MONGODB__PASSWORD = os.getenv("MONGODB__PASSWORD")
 
 RIOT__API_KEY = os.getenv("RIOT__API_KEY")
+RIOT__API_KEYS = parse_api_keys(RIOT__API_KEY, os.getenv("RIOT__API_KEYS"))
 RIOT__RATE_LIMITER_HOST = os.getenv("RIOT__RATE_LIMITER_HOST")
-RIOT__RATE_LIMITER_PORT = os.getenv("RIOT__RATE_LIMITER_PORT")
+RIOT__RATE_LIMITER_PORT = int(os.getenv("RIOT__RATE_LIMITER_PORT", "12227"))
 
 SENTRY__DSN = os.getenv("SENTRY__DSN")
+SENTRY__TRACES_SAMPLE_RATE = float(os.getenv("SENTRY__TRACES_SAMPLE_RATE", "1.0"))
 
 # Initialize Sentry if DSN is provided
 if SENTRY__DSN:
     sentry_sdk.init(
         dsn=SENTRY__DSN,
         send_default_pii=True,
-        traces_sample_rate=1.0,
+        traces_sample_rate=SENTRY__TRACES_SAMPLE_RATE,
     )
     logger.info("Sentry initialized")
 else:
@@ -63,7 +123,14 @@ client: AsyncIOMotorClient = AsyncIOMotorClient(
 db: AsyncIOMotorDatabase = client["realm_warp"]
 summoners_col: AsyncIOMotorCollection = db["summoners"]
 matches_col: AsyncIOMotorCollection = db["matches"]
+# Written by the API's archiver, see `app.core.retention`
+matches_archive_col: AsyncIOMotorCollection = db["matches_archive"]
 league_entries_col: AsyncIOMotorCollection = db["league_entries"]
+metadata_col: AsyncIOMotorCollection = db["metadata"]
+ingestion_lag_col: AsyncIOMotorCollection = db[INGESTION_LAG_COLLECTION]
+events_outbox_col: AsyncIOMotorCollection = db[EVENTS_OUTBOX_COLLECTION]
+player_matches_col: AsyncIOMotorCollection = db[PLAYER_MATCHES_COLLECTION]
+work_queue_col: AsyncIOMotorCollection = db[WORK_QUEUE_COLLECTION]
 
 
 PLATFORM_TO_REGION = {
@@ -95,57 +162,76 @@ QUEUE_ID_TO_QUEUE_TYPE = {
     440: "RANKED_FLEX_SR",
 }
 
+# Set in main() when ENRICHMENT__ENABLED is true
+match_enricher: MatchEnricher | None = None
+# Set in main() when WORK_QUEUE__ENABLED is true
+work_queue: WorkQueue | None = None
+
 
 async def get_summoners_from_db() -> list[dict]:
     """Get all summoners from the db."""
-    cursor = summoners_col.find({})
-    summoners: list[dict] = await cursor.to_list(length=None)
+    with span("mongo summoners.find"):
+        cursor = summoners_col.find({})
+        summoners: list[dict] = await cursor.to_list(length=None)
     return summoners
 
 
-async def update_summoner_profile(summoner) -> bool:
+async def update_summoner_profile(summoner: dict, stored_hash: str | None) -> bool:
     """
     Check if the summoner profile has changed and update the db if necessary.
 
+    The profile is compared by hash with the one stored on the last update, so
+    an unchanged summoner costs no database round trip.
+
     Args:
     summoner (dict): The new summoner data to compare and potentially update.
+    stored_hash (str | None): `profile_hash` of the summoner in the db.
 
     Returns:
     bool: True if the summoner was updated, False otherwise.
     """
-    # Find the existing summoner in the database
-    existing_summoner: dict | None = await summoners_col.find_one(
-        {"_id": summoner["_id"]}
-    )
+    new_hash = profile_hash(summoner)
+    if new_hash == stored_hash:
+        return False
 
-    if not existing_summoner:
-        # If the summoner doesn't exist in the database, log an informational message and return False
+    with span("mongo summoners.update_one"):
+        update_result = await summoners_col.update_one(
+            {"_id": summoner["_id"]},
+            {"$set": {**summoner, "profile_hash": new_hash}},
+        )
+    if update_result.matched_count == 0:
         logger.info(
             f"Summoner with _id {summoner['_id']} (Name: {summoner.get('gameName', 'N/A')}#{summoner.get('tagLine', 'N/A')}) was not found. It might have been deleted during the watcher cycle. Skipping re-addition."
         )
         return False
-    # Check if any fields have changed
-    has_changed = any(
-        existing_summoner.get(key) != value for key, value in summoner.items()
-    )
+    if update_result.modified_count > 0:
+        # Invalidates the API's cached summoner listings
+        with span("mongo metadata.update_one"):
+            await metadata_col.update_one(
+                {"_id": "roster"}, {"$inc": {"version": 1}}, upsert=True
+            )
+        return True
+    return False
 
-    if has_changed:
-        # Update the summoner in the database
-        update_result = await summoners_col.update_one(
-            {"_id": summoner["_id"]}, {"$set": summoner}
-        )
-        return update_result.modified_count > 0
 
-    return False
+def riot_id_key(game_name: str, tag_line: str) -> str:
+    """Case-insensitive Riot ID, same as `app.core.roster.riot_id_key` of the API."""
+    return f"{game_name}#{tag_line}".casefold()
+
+
+def riot_puuid(summoner: dict) -> str:
+    """Puuid of the summoner scoped to the API key it is pinned to."""
+    return summoner.get("puuids", {}).get(summoner["api_key_id"], summoner["puuid"])
 
 
 async def get_summoner_from_api(client: RiotAPIClient, summoner: dict) -> dict:
     """Get the summoner data from the API."""
+    puuid = riot_puuid(summoner)
     api_account = await client.get_account_v1_by_puuid(
-        region=PLATFORM_TO_REGION[summoner["platform"]], puuid=summoner["puuid"]
+        region=PLATFORM_TO_REGION[summoner["platform"]], puuid=puuid
     )
     api_summoner = await client.get_lol_summoner_v4_by_puuid(
-        region=summoner["platform"], puuid=summoner["puuid"]
+        region=summoner["platform"], puuid=puuid
     )
 
     # Merge the account and summoner data
@@ -153,19 +239,24 @@ async def get_summoner_from_api(client: RiotAPIClient, summoner: dict) -> dict:
         **api_summoner,
         "gameName": api_account["gameName"],
         "tagLine": api_account["tagLine"],
+        # Kept in sync for the API's duplicate checks and search
+        "riot_id_key": riot_id_key(api_account["gameName"], api_account["tagLine"]),
         "platform": summoner["platform"],
         "_id": summoner["_id"],
     }
 
-    if api_summoner["puuid"] != summoner["puuid"]:
+    if api_summoner["puuid"] != puuid:
         logger.error(
             f"PUUID mismatch for summoner {summoner['gameName']}#{summoner['tagLine']}"
         )
-        logger.error(f"DB PUUID: {summoner['puuid']}")
+        logger.error(f"DB PUUID: {puuid}")
         logger.error(f"API PUUID: {api_summoner['puuid']}")
         logger.error(f"API Response: {api_summoner}")
         return summoner
 
+    # `puuid` stays the canonical one, the API resolves summoners with it
+    api_summoner["puuid"] = summoner["puuid"]
+    api_summoner["puuids"] = summoner.get("puuids", {})
     return api_summoner
 
 
@@ -175,11 +266,14 @@ async def update_summoner_leagues(
     """Update the summoner's leagues in the db."""
     for entry in leagie_entries:
         entry["ref_summoner"] = summoner["_id"]
-        result = await league_entries_col.update_one(
-            {"ref_summoner": summoner["_id"], "queueType": entry["queueType"]},
-            {"$set": entry},
-            upsert=True,
-        )
+        with span("mongo league_entries.update_one"):
+            result = await league_entries_col.update_one(
+                {"ref_summoner": summoner["_id"], "queueType": entry["queueType"]},
+                {"$set": entry},
+                upsert=True,
+            )
+        if result.modified_count > 0 or result.upserted_id is not None:
+            await publish_event(events_outbox_col, league_event(entry))
         if result.modified_count > 0:
             return True
     return False
@@ -190,7 +284,7 @@ async def get_leagues_from_api(
 ) -> list[RiotAPISchema.LolLeagueV4LeagueFullEntry]:
     """Get the summoner's leagues from the API."""
     leagues = await client.get_lol_league_v4_entries_by_puuid(
-        region=summoner["platform"], puuid=summoner["puuid"]
+        region=summoner["platform"], puuid=riot_puuid(summoner)
     )
     return leagues
 
@@ -214,115 +308,502 @@ async def transform_leagues(leagues: list[dict]) -> dict[str, dict[str, any]]:
 
 
 async def update_summoner_matches(client: RiotAPIClient, summoner):
-    """Update the summoner's matches in the db."""
+    """Find the summoner's latest match and ingest it, or queue it for ingestion."""
     last_api_match_id = await client.get_lol_match_v5_match_ids_by_puuid(
         region=PLATFORM_TO_REGION[summoner["platform"]],
-        puuid=summoner["puuid"],
+        puuid=riot_puuid(summoner),
         queries={"start": 0, "count": 1},
     )
-    last_db_match = await matches_col.find_one(
-        {"ref_summoners": {"$elemMatch": {"$eq": summoner["_id"]}}},
-        sort=[("info.gameEndTimestamp", -1)],
-    )
+    # player_matches stay when the API archives old matches, see `app.core.retention`
+    with span("mongo player_matches.find_one last_match"):
+        last_db_match = await player_matches_col.find_one(
+            {"puuid": summoner["puuid"]},
+            {"matchId": 1},
+            sort=[("gameEndTimestamp", -1)],
+        )
 
-    if last_db_match and last_api_match_id[0] == last_db_match["metadata"]["matchId"]:
+    if last_db_match and last_api_match_id[0] == last_db_match["matchId"]:
+        return
+    if last_db_match is None and await is_linked(summoner, last_api_match_id[0]):
+        # Linked without a player_match, e.g. before the backfill ran
         return
 
-    # Get the match details
-    match_data = await matches_col.find_one({"metadata.matchId": last_api_match_id[0]})
-    if not match_data:
+    # The first match of a new summoner can be arbitrarily old, it isn't lag
+    record_lag = last_db_match is not None
+    if work_queue is not None:
+        await work_queue.enqueue(
+            MATCH_STAGE,
+            f"{last_api_match_id[0]}:{summoner['_id']}",
+            {
+                "summoner": task_summoner(summoner),
+                "match_id": last_api_match_id[0],
+                "record_lag": record_lag,
+            },
+        )
+        return
+    return await ingest_match(client, summoner, last_api_match_id[0], record_lag)
+
+
+async def is_linked(summoner: dict, match_id: str) -> bool:
+    """Whether a stored match, archived or not, references the summoner."""
+    for collection in (matches_col, matches_archive_col):
+        with span(f"mongo {collection.name}.count_documents linked"):
+            if await collection.count_documents(
+                {"ref_summoners": summoner["_id"], "metadata.matchId": match_id},
+                limit=1,
+            ):
+                return True
+    return False
+
+
+def task_summoner(summoner: dict) -> dict:
+    """Fields of a summoner the pipeline stages need."""
+    return {
+        key: summoner[key]
+        for key in ("_id", "puuid", "puuids", "platform", "api_key_id")
+        if key in summoner
+    }
+
+
+def match_api_key_id(match: dict, summoner: dict) -> str | None:
+    """
+    Key the match was fetched with, found through the summoner's puuid in it.
+
+    Another summoner's check may have stored the match with a different key,
+    its participant puuids are then scoped to that key. None if none of the
+    summoner's puuids is a participant.
+    """
+    participant_puuids = {p["puuid"] for p in match["info"]["participants"]}
+    if riot_puuid(summoner) in participant_puuids:
+        return summoner["api_key_id"]
+    for api_key_id, puuid in summoner.get("puuids", {}).items():
+        if puuid in participant_puuids:
+            return api_key_id
+    return None
+
+
+async def ingest_match(
+    client: RiotAPIClient, summoner: dict, match_id: str, record_lag: bool
+) -> bool:
+    """
+    Store a match of the summoner, fetched unless another summoner's check did.
+
+    A match the API already archived is linked in `matches_archive` instead
+    of being stored again. Ranked matches that aren't archived continue with
+    the league snapshot of the summoner.
+    """
+    collection = matches_col
+    with span("mongo matches.find_one by_match_id"):
+        match_data = await matches_col.find_one({"metadata.matchId": match_id})
+    if match_data is None:
+        with span("mongo matches_archive.find_one by_match_id"):
+            match_data = await matches_archive_col.find_one(
+                {"metadata.matchId": match_id}
+            )
+        if match_data:
+            collection = matches_archive_col
+    if match_data:
+        record_lag = False
+    else:
         match_data = await client.get_lol_match_v5_match(
-            region=PLATFORM_TO_REGION[summoner["platform"]],
-            id=last_api_match_id[0],
+            region=PLATFORM_TO_REGION[summoner["platform"]], id=match_id
         )
+    api_key_id = match_api_key_id(match_data, summoner)
+    if api_key_id is None:
+        logger.warning(
+            f"[{summoner['platform']}] No puuid of summoner {summoner['_id']} in match {match_id}, skipping"
+        )
+        return False
+    ref_summoners = match_data.pop("ref_summoners", [])
+    match_data.pop("_id", None)
+
+    # Link the match to the summoner, stages of other summoners may run concurrently
+    with span(f"mongo {collection.name}.update_one"):
+        await collection.update_one(
+            {"metadata.matchId": match_id},
+            {
+                "$setOnInsert": match_data,
+                "$addToSet": {"ref_summoners": summoner["_id"]},
+            },
+            upsert=True,
+        )
+    if summoner["_id"] not in ref_summoners:
+        ref_summoners.append(summoner["_id"])
+    match_data["ref_summoners"] = ref_summoners
 
-    # Link the match to the summoner
-    if "ref_summoners" not in match_data:
-        match_data["ref_summoners"] = []
-    match_data["ref_summoners"].append(summoner["_id"])
+    await upsert_player_match(player_matches_col, match_data, summoner)
+    if record_lag:
+        await record_match_lag(ingestion_lag_col, summoner["platform"], match_data)
+    await publish_event(events_outbox_col, match_event(match_data))
 
     # Check if the match is a ranked match
-    if match_data["info"]["queueId"] not in RANKED_QUEUE_IDS:
-        # Save or update the match in the db
-        await matches_col.update_one(
-            {"metadata.matchId": match_data["metadata"]["matchId"]},
-            {"$set": match_data},
-            upsert=True,
+    queue_id = match_data["info"]["queueId"]
+    if queue_id not in RANKED_QUEUE_IDS:
+        return True
+    if collection is matches_archive_col:
+        # Ended past the retention age, today's league doesn't describe it
+        return True
+
+    if work_queue is not None:
+        await work_queue.enqueue(
+            LEAGUE_STAGE,
+            f"{match_id}:{summoner['_id']}",
+            {
+                "summoner": task_summoner(summoner),
+                "match_id": match_id,
+                "queue_type": QUEUE_ID_TO_QUEUE_TYPE[queue_id],
+                "match_api_key_id": api_key_id,
+            },
         )
-        return False
+    else:
+        await snapshot_league(
+            client, summoner, match_id, QUEUE_ID_TO_QUEUE_TYPE[queue_id], api_key_id
+        )
+    return True
+
 
-    # Get the summoner's leagues
+async def snapshot_league(
+    client: RiotAPIClient,
+    summoner: dict,
+    match_id: str,
+    queue_type: str,
+    match_api_key_id: str,
+) -> None:
+    """
+    Store the summoner's leagues and add them to its participant of the match.
+
+    `match_api_key_id` is the key the match was fetched with, enrichment looks
+    up the other participants' puuids with it.
+    """
     leagues = await get_leagues_from_api(client, summoner)
 
     # Update the summoner's leagues in the db
     await update_summoner_leagues(summoner, leagues)
+    if match_enricher is not None:
+        match_enricher.league_caches[summoner["api_key_id"]].put(
+            riot_puuid(summoner), leagues
+        )
 
     # Transform the leagues data for easier access
-    leagues = await transform_leagues(leagues)
+    league_info = (await transform_leagues(leagues)).get(queue_type, {})
+    league = {
+        "leaguePoints": league_info.get("leaguePoints", None),
+        "tier": league_info.get("tier", None),
+        "rank": league_info.get("rank", None),
+    }
 
     # Enhance the match with the league info
-    for participant in match_data["info"]["participants"]:
-        if participant["puuid"] == summoner["puuid"]:
-            queue_type = QUEUE_ID_TO_QUEUE_TYPE[match_data["info"]["queueId"]]
-            league_info = leagues.get(queue_type, {})
-
-            participant["league"] = {
-                "leaguePoints": league_info.get("leaguePoints", None),
-                "tier": league_info.get("tier", None),
-                "rank": league_info.get("rank", None),
-            }
-            break
-
-    # Save or update the match in the db
-    await matches_col.update_one(
-        {"metadata.matchId": match_data["metadata"]["matchId"]},
-        {"$set": match_data},
-        upsert=True,
+    with span("mongo matches.update_one league"):
+        await matches_col.update_one(
+            {
+                "metadata.matchId": match_id,
+                "info.participants.puuid": {"$in": list(summoner_puuids(summoner))},
+            },
+            {"$set": {"info.participants.$.league": league}},
+        )
+    with span("mongo player_matches.update_one league"):
+        await player_matches_col.update_one(
+            {"matchId": match_id, "puuid": summoner["puuid"]},
+            {"$set": {"league": league}},
+        )
+
+    if match_enricher is None:
+        return
+    enrichment = {
+        "match_id": match_id,
+        "platform": summoner["platform"],
+        "queue_type": queue_type,
+        "api_key_id": match_api_key_id,
+    }
+    if work_queue is not None:
+        await work_queue.enqueue(ENRICH_STAGE, match_id, enrichment)
+    else:
+        match_enricher.enqueue(**enrichment)
+
+
+async def is_tracked(summoner: dict) -> bool:
+    with span("mongo summoners.count_documents"):
+        return (
+            await summoners_col.count_documents({"_id": summoner["_id"]}, limit=1) > 0
+        )
+
+
+def start_work_queue_consumers(clients: dict[str, RiotAPIClient]) -> None:
+    """Start the consumers of the stages listed in WORK_QUEUE__STAGES."""
+
+    async def run_match_task(payload: dict) -> None:
+        summoner = payload["summoner"]
+        # Queued before the summoner was deleted
+        if await is_tracked(summoner):
+            await ingest_match(
+                clients[summoner["api_key_id"]],
+                summoner,
+                payload["match_id"],
+                payload["record_lag"],
+            )
+
+    async def run_league_task(payload: dict) -> None:
+        summoner = payload["summoner"]
+        if await is_tracked(summoner):
+            await snapshot_league(
+                clients[summoner["api_key_id"]],
+                summoner,
+                payload["match_id"],
+                payload["queue_type"],
+                # Tasks queued before the key was part of the payload
+                payload.get("match_api_key_id", summoner["api_key_id"]),
+            )
+
+    async def run_enrich_task(payload: dict) -> None:
+        await match_enricher.enrich(**payload)
+
+    consumers = [
+        (MATCH_STAGE, run_match_task, WORK_QUEUE__MATCH_CONCURRENCY),
+        (LEAGUE_STAGE, run_league_task, WORK_QUEUE__LEAGUE_CONCURRENCY),
+    ]
+    if match_enricher is not None:
+        consumers.append((ENRICH_STAGE, run_enrich_task, ENRICHMENT__CONCURRENCY))
+    for stage, handler, concurrency in consumers:
+        if stage in WORK_QUEUE__STAGES:
+            work_queue.start(stage, handler, concurrency)
+            logger.info(f"Consuming {stage} tasks with concurrency {concurrency}")
+
+
+async def resolve_puuid(client: RiotAPIClient, summoner: dict) -> str:
+    account = await client.get_account_v1_by_riot_id(
+        region=PLATFORM_TO_REGION[summoner["platform"]],
+        game_name=summoner["gameName"],
+        tag_line=summoner["tagLine"],
     )
+    return account["puuid"]
 
 
-async def main():
-    async with RiotAPIClient(
-        default_headers={"X-Riot-Token": RIOT__API_KEY},
+async def assign_api_key(
+    clients: dict[str, RiotAPIClient], summoner: dict
+) -> dict | None:
+    """
+    Pin a summoner to a key of the pool, returns None if its key is unavailable.
+
+    Summoners tracked before the pool existed stay on the first key. New
+    summoners without matches are spread over the pool.
+
+    `puuid` stays the one of the first key, the API resolves and dedupes
+    summoners with it. The puuid of every key of the pool is resolved once
+    from the Riot ID and kept in `puuids.<key_id>`, a match stored by a
+    summoner on another key carries the puuids of that key.
+    """
+    key_ids = list(clients)
+    api_key_id = summoner.get("api_key_id")
+    puuid = summoner["puuid"]
+    puuids = dict(summoner.get("puuids", {}))
+
+    if not puuids and api_key_id not in (None, key_ids[0]):
+        # Pinned before puuids were kept per key, `puuid` is the one of its key
+        puuids[api_key_id] = puuid
+        puuid = await resolve_puuid(clients[key_ids[0]], summoner)
+    puuids[key_ids[0]] = puuid
+    for key_id in key_ids:
+        if key_id not in puuids:
+            puuids[key_id] = await resolve_puuid(clients[key_id], summoner)
+
+    if api_key_id is None:
+        api_key_id = key_ids[0]
+        if not summoner.get("initial_rank_fetched", False):
+            api_key_id = choose_api_key_id(summoner["_id"], key_ids)
+
+    update = {"api_key_id": api_key_id, "puuid": puuid, "puuids": puuids}
+    if any(summoner.get(field) != value for field, value in update.items()):
+        with span("mongo summoners.update_one"):
+            await summoners_col.update_one({"_id": summoner["_id"]}, {"$set": update})
+        with span("mongo metadata.update_one"):
+            await metadata_col.update_one(
+                {"_id": "roster"}, {"$inc": {"version": 1}}, upsert=True
+            )
+        if puuid != summoner["puuid"]:
+            # Rows of the key-scoped puuid, the leaderboard joins on `puuid`
+            with span("mongo player_matches.update_many"):
+                await player_matches_col.update_many(
+                    {"ref_summoner": summoner["_id"], "puuid": summoner["puuid"]},
+                    {"$set": {"puuid": puuid}},
+                )
+        summoner = {**summoner, **update}
+
+    if api_key_id not in clients:
+        logger.error(
+            f"[{summoner['platform']}] Key {api_key_id} of {summoner['gameName']}#{summoner['tagLine']} is not in RIOT__API_KEYS, skipping"
+        )
+        return None
+    return summoner
+
+
+async def check_summoner(client: RiotAPIClient, db_summoner: dict) -> None:
+    api_summoner = await get_summoner_from_api(client, db_summoner)
+    api_summoner["api_key_id"] = db_summoner["api_key_id"]
+    logger.info(
+        f"[{api_summoner['platform']}] Checking summoner {api_summoner['gameName']}#{api_summoner['tagLine']}"
+    )
+
+    # Fetch initial rank if not already fetched
+    initial_rank_fetched = db_summoner.get("initial_rank_fetched", False)
+    if not initial_rank_fetched:
+        leagues = await get_leagues_from_api(client, api_summoner)
+        await update_summoner_leagues(api_summoner, leagues)
+        logger.info(
+            f"[{api_summoner['platform']}] Initial rank fetched for {api_summoner['gameName']}#{api_summoner['tagLine']}"
+        )
+        with span("mongo summoners.update_one"):
+            await summoners_col.update_one(
+                {"_id": api_summoner["_id"]},
+                {"$set": {"initial_rank_fetched": True}},
+            )
+
+    if await update_summoner_profile(api_summoner, db_summoner.get("profile_hash")):
+        logger.info(
+            f"[{api_summoner['platform']}] Profile updated for {api_summoner['gameName']}#{api_summoner['tagLine']}"
+        )
+    with span("summoner.matches"):
+        matches_updated = await update_summoner_matches(client, api_summoner)
+    if matches_updated:
+        logger.info(
+            f"[{api_summoner['platform']}] Matches updated for {api_summoner['gameName']}#{api_summoner['tagLine']}"
+        )
+
+    with span("mongo summoners.update_one"):
+        await summoners_col.update_one(
+            {"_id": api_summoner["_id"]},
+            {"$set": {"last_checked_at": datetime.now(UTC)}},
+        )
+
+
+async def check_summoners(
+    clients: dict[str, RiotAPIClient], api_key_id: str, summoners: list[dict]
+) -> None:
+    """Check the summoners pinned to one key, keys run concurrently."""
+    for db_summoner in summoners:
+        with span(
+            "summoner.check",
+            platform=db_summoner["platform"],
+            puuid=db_summoner["puuid"],
+            api_key_id=api_key_id,
+        ):
+            await check_summoner(clients[api_key_id], db_summoner)
+
+
+def build_riot_client(
+    api_key: str, index: int, coalescer: RequestCoalescer | None
+) -> RiotAPIClient:
+    api_key_id = get_api_key_id(api_key)
+    return RiotAPIClient(
+        default_headers={"X-Riot-Token": api_key},
         middlewares=[
-            json_response_middleware(orjson.loads),
+            tracing_middleware("riot"),
+            *([coalescer.middleware(namespace=api_key_id)] if coalescer else []),
+            typed_json_response_middleware()
+            if DECODE__TYPED
+            else json_response_middleware(orjson.loads),
             http_error_middleware(3),
             rate_limiter_middleware(
                 RiotAPIRateLimiter(
-                    proxy=f"http://{RIOT__RATE_LIMITER_HOST}:{RIOT__RATE_LIMITER_PORT}"
+                    # One rate limiter instance per key keeps the buckets apart
+                    proxy=f"http://{RIOT__RATE_LIMITER_HOST}:{RIOT__RATE_LIMITER_PORT + index}"
                 )
             ),
+            tracing_middleware("riot.http"),
         ],
-    ) as client:
-        while True:
-            summoners = await get_summoners_from_db()
-            for db_summoner in summoners:
-                api_summoner = await get_summoner_from_api(client, db_summoner)
-                logger.info(
-                    f"[{api_summoner['platform']}] Checking summoner {api_summoner['gameName']}#{api_summoner['tagLine']}"
+    )
+
+
+async def build_riot_clients(
+    stack: AsyncExitStack, coalescer: RequestCoalescer | None
+) -> dict[str, RiotAPIClient]:
+    """One client per key of the pool, by `api_key_id`, first key first."""
+    clients: dict[str, RiotAPIClient] = {}
+    for index, api_key in enumerate(RIOT__API_KEYS):
+        clients[get_api_key_id(api_key)] = await stack.enter_async_context(
+            build_riot_client(api_key, index, coalescer)
+        )
+    logger.info(f"Using {len(clients)} Riot API key(s)")
+    return clients
+
+
+def start_pipeline(clients: dict[str, RiotAPIClient]) -> None:
+    """Start enrichment and the work queue consumers, as far as they are enabled."""
+    global match_enricher
+
+    if ENRICHMENT__ENABLED:
+        match_enricher = MatchEnricher(
+            matches_col,
+            {
+                api_key_id: LeagueCache(
+                    client,
+                    ttl_secs=ENRICHMENT__LEAGUE_CACHE_TTL_SECS,
+                    max_size=ENRICHMENT__LEAGUE_CACHE_SIZE,
                 )
+                for api_key_id, client in clients.items()
+            },
+        )
+        # Otherwise enrichment is a stage of the work queue
+        if work_queue is None:
+            match_enricher.start()
+        logger.info("Participant league enrichment enabled")
+
+    if work_queue is not None:
+        start_work_queue_consumers(clients)
+
+
+async def discover_matches(clients: dict[str, RiotAPIClient]) -> None:
+    """Check every tracked summoner, the summoners of each key concurrently."""
+    summoners_by_key: dict[str, list[dict]] = {key: [] for key in clients}
+    for db_summoner in await get_summoners_from_db():
+        summoner = await assign_api_key(clients, db_summoner)
+        if summoner is not None:
+            summoners_by_key[summoner["api_key_id"]].append(summoner)
+
+    await asyncio.gather(
+        *(
+            check_summoners(clients, api_key_id, summoners)
+            for api_key_id, summoners in summoners_by_key.items()
+            if summoners
+        )
+    )
+
+
+async def main():
+    global work_queue
+
+    if DECODE__TYPED and not typed_decoding_available():
+        raise RuntimeError("DECODE__TYPED requires the optional msgspec package")
 
-                # Fetch initial rank if not already fetched
-                initial_rank_fetched = db_summoner.get("initial_rank_fetched", False)
-                if not initial_rank_fetched:
-                    leagues = await get_leagues_from_api(client, api_summoner)
-                    await update_summoner_leagues(api_summoner, leagues)
-                    logger.info(
-                        f"[{api_summoner['platform']}] Initial rank fetched for {api_summoner['gameName']}#{api_summoner['tagLine']}"
-                    )
-                    await summoners_col.update_one(
-                        {"_id": api_summoner["_id"]},
-                        {"$set": {"initial_rank_fetched": True}},
-                    )
-
-                if await update_summoner_profile(api_summoner):
-                    logger.info(
-                        f"[{api_summoner['platform']}] Profile updated for {api_summoner['gameName']}#{api_summoner['tagLine']}"
-                    )
-                if await update_summoner_matches(client, api_summoner):
-                    logger.info(
-                        f"[{api_summoner['platform']}] Matches updated for {api_summoner['gameName']}#{api_summoner['tagLine']}"
-                    )
+    await init_ingestion_lag(db)
+    await init_events_outbox(db)
+    if WORK_QUEUE__ENABLED:
+        await init_work_queue(db)
+        work_queue = WorkQueue(work_queue_col)
+
+    coalescer = None
+    if COALESCE__ENABLED:
+        coalescer = RequestCoalescer(
+            ttl_secs=COALESCE__TTL_SECS, max_entries=COALESCE__MAX_ENTRIES
+        )
+
+    async with AsyncExitStack() as stack:
+        clients = await build_riot_clients(stack, coalescer)
+        start_pipeline(clients)
+        # A process can run only consumers, see WORK_QUEUE__STAGES
+        discover = work_queue is None or "discover" in WORK_QUEUE__STAGES
+
+        while True:
+            if discover:
+                if match_enricher is not None:
+                    match_enricher.core_idle.clear()
+                await discover_matches(clients)
+
+            if coalescer is not None:
+                coalescer.log_stats()
+            if work_queue is not None:
+                await work_queue.log_stats()
+            if match_enricher is not None:
+                match_enricher.core_idle.set()
             await asyncio.sleep(10)
 
 
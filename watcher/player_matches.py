@@ -0,0 +1,83 @@
+"""
+One slim document per (match, tracked participant) in `player_matches`.
+
+Per-player reads (leaderboard history, profiles) use these instead of opening
+full match documents and filtering `info.participants`. The API creates the
+indexes and backfills existing matches, see `app.core.player_matches`.
+"""
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from tracing import span
+
+PLAYER_MATCHES_COLLECTION = "player_matches"
+
+# Participant fields copied to the slim document
+PARTICIPANT_FIELDS = [
+    "championId",
+    "win",
+    "kills",
+    "deaths",
+    "assists",
+    "teamPosition",
+    "individualPosition",
+    "gameEndedInEarlySurrender",
+    "goldEarned",
+    "totalMinionsKilled",
+    "totalDamageDealtToChampions",
+    "visionScore",
+]
+
+
+def summoner_puuids(summoner: dict) -> set[str]:
+    """
+    Every puuid of a summoner, the canonical `puuid` and the ones per API key.
+
+    Puuids are encrypted per key and a match carries the ones of the key it
+    was fetched with, which may not be the key the summoner is pinned to.
+    """
+    return {summoner["puuid"], *summoner.get("puuids", {}).values()}
+
+
+def player_match_doc(
+    match: dict, summoner_id: ObjectId, puuid: str, puuids: set[str]
+) -> dict | None:
+    """
+    Slim document of a tracked participant, None if the summoner didn't play.
+
+    The participant is found by any of `puuids`, the document always carries
+    the canonical `puuid` the API resolves summoners with.
+    """
+    for participant in match["info"]["participants"]:
+        if participant["puuid"] in puuids:
+            break
+    else:
+        return None
+
+    return {
+        "matchId": match["metadata"]["matchId"],
+        "puuid": puuid,
+        "ref_summoner": summoner_id,
+        "queueId": match["info"]["queueId"],
+        "gameEndTimestamp": match["info"].get("gameEndTimestamp"),
+        "gameDuration": match["info"].get("gameDuration"),
+        **{field: participant.get(field) for field in PARTICIPANT_FIELDS},
+        "league": participant.get("league"),
+    }
+
+
+async def upsert_player_match(
+    player_matches_col: AsyncIOMotorCollection, match: dict, summoner: dict
+) -> None:
+    doc = player_match_doc(
+        match, summoner["_id"], summoner["puuid"], summoner_puuids(summoner)
+    )
+    if doc is None:
+        return
+    with span("mongo player_matches.update_one"):
+        await player_matches_col.update_one(
+            {"matchId": doc["matchId"], "puuid": doc["puuid"]},
+            {"$set": doc},
+            upsert=True,
+        )
@@ -0,0 +1,204 @@
+"""
+Lightweight tracing for the watcher cycle.
+
+Spans are sampled per root span (one summoner check) and written to a local
+file once the root finishes, either as one JSON object per span (`jsonl`) or
+as OTLP/JSON `resourceSpans` lines (`otlp`) that OpenTelemetry tooling reads.
+"""
+
+import logging
+import os
+import random
+import re
+import secrets
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+TRACING__SAMPLE_RATE = float(os.getenv("TRACING__SAMPLE_RATE", "0"))
+TRACING__EXPORT_PATH = os.getenv("TRACING__EXPORT_PATH", "traces/spans.jsonl")
+TRACING__FORMAT = os.getenv("TRACING__FORMAT", "jsonl")
+
+RIOT_API_NAME_PATTERN = re.compile(r"/(?:riot|lol)/([a-z-]+)/(v\d+)/")
+
+
+@dataclass
+class Span:
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    name: str
+    attributes: dict
+    start: float = field(default_factory=time.time)
+    end: float | None = None
+    error: str | None = None
+    # Finished spans of the trace, shared by all spans of the same trace
+    finished: list["Span"] = field(default_factory=list, repr=False)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(((self.end or self.start) - self.start) * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+# Current span while a root that lost the sample draw is open, its children skip
+NOT_SAMPLED = object()
+
+_current_span: ContextVar[Span | object | None] = ContextVar(
+    "current_span", default=None
+)
+
+
+def _otlp_span(span: Span) -> dict:
+    return {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "parentSpanId": span.parent_id or "",
+        "name": span.name,
+        "startTimeUnixNano": str(int(span.start * 1e9)),
+        "endTimeUnixNano": str(int((span.end or span.start) * 1e9)),
+        "attributes": [
+            {"key": key, "value": {"stringValue": str(value)}}
+            for key, value in span.attributes.items()
+        ],
+        "status": {"code": 2, "message": span.error} if span.error else {},
+    }
+
+
+def export(spans: list[Span]) -> None:
+    path = Path(TRACING__EXPORT_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    if TRACING__FORMAT == "otlp":
+        lines = [
+            orjson.dumps(
+                {
+                    "resourceSpans": [
+                        {
+                            "resource": {
+                                "attributes": [
+                                    {
+                                        "key": "service.name",
+                                        "value": {"stringValue": "watcher"},
+                                    }
+                                ]
+                            },
+                            "scopeSpans": [
+                                {
+                                    "scope": {"name": "watcher"},
+                                    "spans": [_otlp_span(span) for span in spans],
+                                }
+                            ],
+                        }
+                    ]
+                }
+            )
+        ]
+    else:
+        lines = [orjson.dumps(span.to_dict()) for span in spans]
+
+    try:
+        with path.open("ab") as f:
+            f.write(b"\n".join(lines) + b"\n")
+    except OSError:
+        logger.exception(f"Could not write traces to {path}")
+
+
+class span:
+    """
+    Context manager that records a span under the current one.
+
+    Outside of a sampled trace it does nothing. A span started without a
+    parent becomes a root and decides sampling for everything below it.
+    """
+
+    def __init__(self, name: str, **attributes) -> None:
+        self.name = name
+        self.attributes = attributes
+        self._span: Span | None = None
+        self._token = None
+
+    def __enter__(self) -> "span":
+        parent = _current_span.get()
+        if parent is NOT_SAMPLED:
+            return self
+        if parent is None:
+            if TRACING__SAMPLE_RATE <= 0 or random.random() >= TRACING__SAMPLE_RATE:
+                self._token = _current_span.set(NOT_SAMPLED)
+                return self
+            self._span = Span(
+                trace_id=secrets.token_hex(16),
+                span_id=secrets.token_hex(8),
+                parent_id=None,
+                name=self.name,
+                attributes=self.attributes,
+            )
+        else:
+            self._span = Span(
+                trace_id=parent.trace_id,
+                span_id=secrets.token_hex(8),
+                parent_id=parent.span_id,
+                name=self.name,
+                attributes=self.attributes,
+                finished=parent.finished,
+            )
+        self._token = _current_span.set(self._span)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self._span is None:
+            if self._token is not None:
+                _current_span.reset(self._token)
+            return
+        self._span.end = time.time()
+        if exc is not None:
+            self._span.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+
+        self._span.finished.append(self._span)
+        if self._span.parent_id is None:
+            export(self._span.finished)
+
+    def set(self, **attributes) -> None:
+        if self._span is not None:
+            self._span.attributes.update(attributes)
+
+
+def riot_api_name(urlformat: str) -> str:
+    """`https://{region}.api.riotgames.com/lol/league/v4/...` -> `league-v4`"""
+    match = RIOT_API_NAME_PATTERN.search(urlformat)
+    return f"{match[1]}-{match[2]}" if match else urlformat
+
+
+def tracing_middleware(name: str):
+    """
+    Pulsefire middleware recording a span per Riot call.
+
+    Registered twice, outermost as `riot` and innermost as `riot.http`, the
+    difference between the two is the time spent waiting on the rate limiter.
+    """
+
+    def constructor(next):
+        async def middleware(invocation):
+            with span(
+                f"{name} {riot_api_name(invocation.urlformat)}",
+                url=invocation.urlformat,
+                region=invocation.params.get("region"),
+            ):
+                return await next(invocation)
+
+        return middleware
+
+    return constructor
@@ -0,0 +1,240 @@
+"""
+Durable work queue of the match pipeline in the `work_queue` collection.
+
+With WORK_QUEUE__ENABLED=true match discovery only enqueues tasks, and
+consumers drain them per stage at their own concurrency:
+
+- `match`: fetch the match (unless already stored) and store it
+- `league`: fetch the summoner's leagues and snapshot them into the match
+- `enrich`: league enrichment of the other participants (ENRICHMENT__ENABLED)
+
+A task id is derived from its stage and key, enqueueing a task that already
+exists is a no-op. A claimed task is hidden for
+WORK_QUEUE__VISIBILITY_TIMEOUT_SECS; if the consumer crashes or is redeployed
+it becomes visible again and is retried. Failed tasks are retried with
+exponential backoff until WORK_QUEUE__MAX_ATTEMPTS. Finished tasks are kept
+for WORK_QUEUE__RETENTION_SECS so the same work isn't queued again meanwhile.
+
+Every stage writes idempotently, a task that runs twice does no harm.
+WORK_QUEUE__STAGES picks what a process runs, e.g. a second watcher with
+`WORK_QUEUE__STAGES=enrich` scales enrichment on its own.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections.abc import Awaitable, Callable
+from datetime import UTC, datetime, timedelta
+
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import ASCENDING, IndexModel, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+WORK_QUEUE__ENABLED = os.getenv("WORK_QUEUE__ENABLED", "false").lower() == "true"
+# `discover` is the polling loop, the others are consumers of the stage
+WORK_QUEUE__STAGES = set(
+    os.getenv("WORK_QUEUE__STAGES", "discover,match,league,enrich").split(",")
+)
+WORK_QUEUE__MATCH_CONCURRENCY = int(os.getenv("WORK_QUEUE__MATCH_CONCURRENCY", "4"))
+WORK_QUEUE__LEAGUE_CONCURRENCY = int(os.getenv("WORK_QUEUE__LEAGUE_CONCURRENCY", "2"))
+WORK_QUEUE__VISIBILITY_TIMEOUT_SECS = float(
+    os.getenv("WORK_QUEUE__VISIBILITY_TIMEOUT_SECS", "300")
+)
+WORK_QUEUE__MAX_ATTEMPTS = int(os.getenv("WORK_QUEUE__MAX_ATTEMPTS", "5"))
+WORK_QUEUE__BACKOFF_SECS = float(os.getenv("WORK_QUEUE__BACKOFF_SECS", "10"))
+WORK_QUEUE__MAX_BACKOFF_SECS = float(os.getenv("WORK_QUEUE__MAX_BACKOFF_SECS", "900"))
+WORK_QUEUE__POLL_INTERVAL_SECS = float(os.getenv("WORK_QUEUE__POLL_INTERVAL_SECS", "1"))
+WORK_QUEUE__RETENTION_SECS = int(os.getenv("WORK_QUEUE__RETENTION_SECS", "86400"))
+
+WORK_QUEUE_COLLECTION = "work_queue"
+
+MATCH_STAGE = "match"
+LEAGUE_STAGE = "league"
+ENRICH_STAGE = "enrich"
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+async def init_work_queue(db: AsyncIOMotorDatabase) -> None:
+    await db[WORK_QUEUE_COLLECTION].create_indexes(
+        [
+            IndexModel(
+                [
+                    ("stage", ASCENDING),
+                    ("status", ASCENDING),
+                    ("visible_at", ASCENDING),
+                ],
+                name="work_queue_claim_idx",
+            ),
+            # Set once a task is done or failed for good
+            IndexModel(
+                [("expires_at", ASCENDING)],
+                expireAfterSeconds=0,
+                name="work_queue_ttl_idx",
+            ),
+        ]
+    )
+
+
+def backoff_secs(attempts: int) -> float:
+    return min(
+        WORK_QUEUE__BACKOFF_SECS * 2 ** max(attempts - 1, 0),
+        WORK_QUEUE__MAX_BACKOFF_SECS,
+    )
+
+
+class WorkQueue:
+    def __init__(self, collection: AsyncIOMotorCollection) -> None:
+        self.collection = collection
+        self._tasks: list[asyncio.Task] = []
+
+    async def enqueue(self, stage: str, key: str, payload: dict) -> bool:
+        """Add a task unless one with the same stage and key exists."""
+        now = time.time()
+        try:
+            with span(f"mongo {WORK_QUEUE_COLLECTION}.update_one enqueue"):
+                result = await self.collection.update_one(
+                    {"_id": f"{stage}:{key}"},
+                    {
+                        "$setOnInsert": {
+                            "stage": stage,
+                            "payload": payload,
+                            "status": PENDING,
+                            "attempts": 0,
+                            "visible_at": now,
+                            "created_at": now,
+                            "updated_at": now,
+                        }
+                    },
+                    upsert=True,
+                )
+        except DuplicateKeyError:
+            # Upserted concurrently
+            return False
+        return result.upserted_id is not None
+
+    async def claim(self, stage: str) -> dict | None:
+        """
+        Claim the next visible task of `stage` and hide it for the visibility timeout.
+
+        A running task becomes visible again once its timeout passed, the
+        consumer that claimed it crashed or was redeployed.
+        """
+        now = time.time()
+        return await self.collection.find_one_and_update(
+            {
+                "stage": stage,
+                "status": {"$in": [PENDING, RUNNING]},
+                "visible_at": {"$lte": now},
+            },
+            {
+                "$set": {
+                    "status": RUNNING,
+                    "visible_at": now + WORK_QUEUE__VISIBILITY_TIMEOUT_SECS,
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("visible_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _finish(self, task: dict, update: dict) -> None:
+        # Matching `attempts` fences off a consumer whose claim timed out
+        await self.collection.update_one(
+            {"_id": task["_id"], "attempts": task["attempts"]}, update
+        )
+
+    async def complete(self, task: dict) -> None:
+        now = datetime.now(UTC)
+        await self._finish(
+            task,
+            {
+                "$set": {
+                    "status": DONE,
+                    "updated_at": now.timestamp(),
+                    "expires_at": now + timedelta(seconds=WORK_QUEUE__RETENTION_SECS),
+                },
+                "$unset": {"error": ""},
+            },
+        )
+
+    async def fail(self, task: dict, error: str) -> None:
+        now = datetime.now(UTC)
+        if task["attempts"] >= WORK_QUEUE__MAX_ATTEMPTS:
+            update = {
+                "status": FAILED,
+                "expires_at": now + timedelta(seconds=WORK_QUEUE__RETENTION_SECS),
+            }
+        else:
+            update = {
+                "status": PENDING,
+                "visible_at": now.timestamp() + backoff_secs(task["attempts"]),
+            }
+        await self._finish(
+            task,
+            {"$set": {**update, "error": error, "updated_at": now.timestamp()}},
+        )
+
+    async def _consume(
+        self, stage: str, handler: Callable[[dict], Awaitable[None]]
+    ) -> None:
+        while True:
+            try:
+                task = await self.claim(stage)
+            except Exception:
+                logger.exception(f"Failed to claim a {stage} task")
+                task = None
+
+            if task is None:
+                await asyncio.sleep(WORK_QUEUE__POLL_INTERVAL_SECS)
+                continue
+
+            try:
+                with span(f"work_queue.{stage}", task_id=task["_id"]):
+                    await handler(task["payload"])
+            except asyncio.CancelledError:
+                # Visible again after the timeout
+                raise
+            except Exception as e:
+                logger.exception(f"Task {task['_id']} failed")
+                await self.fail(task, str(e))
+            else:
+                await self.complete(task)
+
+    def start(
+        self, stage: str, handler: Callable[[dict], Awaitable[None]], concurrency: int
+    ) -> None:
+        self._tasks.extend(
+            asyncio.create_task(self._consume(stage, handler))
+            for _ in range(concurrency)
+        )
+
+    async def log_stats(self) -> None:
+        counts = await self.collection.aggregate(
+            [
+                {"$match": {"status": {"$in": [PENDING, RUNNING, FAILED]}}},
+                {
+                    "$group": {
+                        "_id": {"stage": "$stage", "status": "$status"},
+                        "n": {"$sum": 1},
+                    }
+                },
+            ]
+        ).to_list(length=None)
+        if counts:
+            logger.info(
+                "Work queue: "
+                + ", ".join(
+                    f"{c['_id']['stage']} {c['_id']['status']} {c['n']}"
+                    for c in sorted(counts, key=lambda c: str(c["_id"]))
+                )
+            )